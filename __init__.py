@@ -12,6 +12,7 @@ from .models import (
 )
 from .scheduler import start_scheduler
 from .ai_module import generate_personalized_message, analyze_expenses
+from .category_registry import DEFAULT_TASK_CATEGORIES
 
 __version__ = '1.0.0'
 __author__ = 'Your Name'
@@ -32,19 +33,6 @@ MESSAGE_TYPES = {
     'financial_report': 'Финансовый отчет'
 }
 
-# Категории задач по умолчанию
-DEFAULT_TASK_CATEGORIES = [
-    ('Срочное', 100, '#FF4444'),
-    ('Работа', 90, '#4444FF'),
-    ('Учёба', 80, '#44FF44'),
-    ('Здоровье', 85, '#44FFFF'),
-    ('Финансы', 75, '#FFFF44'),
-    ('Личное', 70, '#FF44FF'),
-    ('Покупки', 60, '#FFA500'),
-    ('Дом', 65, '#8B4513'),
-    ('Хобби', 50, '#9370DB'),
-    ('Разное', 0, '#808080')
-]
 
 def get_version():
     """Возвращает текущую версию бота"""
@@ -1,7 +1,9 @@
 # ai_module.py
 
-from openai import OpenAI
-from config import OPENAI_API_KEY
+from llm_gateway import create_chat_completion
+from quick_parser import quick_parse, record_result, get_stats
+from config import QUICK_PARSE_THRESHOLD
+from task_scheduler import schedule_plan
 from datetime import datetime, timedelta
 import logging
 import json
@@ -11,8 +13,6 @@ import re
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 def parse_date(date_string):
     date_formats = ['%Y-%m-%d', '%d.%m.%Y', '%m/%d/%Y', '%Y/%m/%d', '%Y-%m-%dT%H:%M:%S']
     for fmt in date_formats:
@@ -23,6 +23,18 @@ def parse_date(date_string):
     raise ValueError(f"Неподдерживаемый формат даты: {date_string}")
 
 async def parse_message(message_text: str):
+    # Простые сообщения разбираем локально, без обращения к LLM
+    quick_result = quick_parse(message_text)
+    hit = quick_result['confidence'] >= QUICK_PARSE_THRESHOLD
+    record_result(hit)
+    stats = get_stats()
+    if stats['total'] % 100 == 0:
+        logger.info(f"Быстрый разбор: {stats['hits']} из {stats['total']} сообщений "
+                    f"({stats['hit_rate']:.0%}) без обращения к LLM")
+    if hit:
+        logger.info(f"Parsed message locally: {quick_result}")
+        return quick_result
+
     current_time = datetime.now().isoformat()
     prompt = f"""
     Проанализируй следующий текст и извлеки из него информацию о задачах, финансах или целях. 
@@ -70,7 +82,8 @@ async def parse_message(message_text: str):
     """
 
     try:
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            call_site="parse_message",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that parses text and extracts structured information."},
@@ -122,15 +135,16 @@ async def parse_message(message_text: str):
         return {"type": "unknown", "data": {}}
     
     
-async def analyze_expenses(expense_data, income_data):
+async def analyze_expenses(summary: str):
+    """
+    Анализ финансов за неделю по сводке finance_analysis.format_summary:
+    итоги по валютам и категориям вместо списка всех операций
+    """
     prompt = f"""
-    Проанализируй следующие данные о расходах и доходах за последнюю неделю:
-
-    Расходы:
-    {json.dumps(expense_data, indent=2)}
+    Проанализируй сводку доходов и расходов за последнюю неделю
+    (в скобках - количество операций):
 
-    Доходы:
-    {json.dumps(income_data, indent=2)}
+    {summary}
 
     Предоставь анализ финансов, фокусируясь на следующих аспектах:
     1. Общая сумма доходов и расходов
@@ -151,7 +165,8 @@ async def analyze_expenses(expense_data, income_data):
     """
 
     try:
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            call_site="analyze_expenses",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful financial advisor."},
@@ -191,7 +206,7 @@ async def generate_goal_steps(goal_title: str, deadline: datetime, user_experien
                 "can_parallel": true/false,
                 "deliverables": ["конкретные результаты"],
                 "resources": ["материалы и инструменты"],
-                "dependencies": []
+                "dependencies": ["названия задач, которые нужно выполнить до этой"]
             }}
         ],
         "milestones": [
@@ -205,7 +220,8 @@ async def generate_goal_steps(goal_title: str, deadline: datetime, user_experien
     """
 
     try:
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            call_site="generate_goal_steps",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a professional learning path designer."},
@@ -216,29 +232,21 @@ async def generate_goal_steps(goal_title: str, deadline: datetime, user_experien
         
         plan_data = json.loads(response.choices[0].message.content)
         
-        # Распределяем задачи по времени
-        current_date = datetime.now()
-        scheduled_tasks = []
-        
-        for task in plan_data['tasks']:
-            duration = task['duration']
-            end_date = current_date + timedelta(days=duration)
-            
-            scheduled_task = {
+        # Сроки задач: критический путь по зависимостям и доступное время пользователя
+        scheduled_tasks = [
+            {
                 'title': task['title'],
-                'description': task['description'],
-                'start_date': current_date,
-                'end_date': end_date,
+                'description': task.get('description', ''),
+                'duration': task.get('duration', 1),
                 'deliverables': task.get('deliverables', []),
                 'resources': task.get('resources', []),
                 'dependencies': task.get('dependencies', []),
                 'can_parallel': task.get('can_parallel', False)
             }
-            
-            scheduled_tasks.append(scheduled_task)
-            if not task.get('can_parallel', False):
-                current_date = end_date
-        
+            for task in plan_data['tasks']
+        ]
+        schedule_plan(scheduled_tasks, deadline, available_time)
+
         return {
             'tasks': scheduled_tasks,
             'milestones': [
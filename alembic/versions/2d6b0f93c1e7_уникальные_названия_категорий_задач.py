@@ -0,0 +1,40 @@
+"""Уникальные названия категорий задач
+
+Revision ID: 2d6b0f93c1e7
+Revises: 7a4c9e3f1b58
+Create Date: 2026-10-16 15:08:27.413906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d6b0f93c1e7'
+down_revision: Union[str, None] = '7a4c9e3f1b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Одноименные категории, созданные параллельными запросами, сливаем в самую раннюю
+    op.execute("""
+        WITH duplicates AS (
+            SELECT id, min(id) OVER (PARTITION BY name) AS keep_id
+            FROM task_categories
+        )
+        UPDATE tasks SET category_id = duplicates.keep_id
+        FROM duplicates
+        WHERE tasks.category_id = duplicates.id AND duplicates.id <> duplicates.keep_id
+    """)
+    op.execute("""
+        DELETE FROM task_categories
+        WHERE id NOT IN (SELECT min(id) FROM task_categories GROUP BY name)
+    """)
+    op.create_index('ix_task_categories_name', 'task_categories', ['name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_task_categories_name', table_name='task_categories')
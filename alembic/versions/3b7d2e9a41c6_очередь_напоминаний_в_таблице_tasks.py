@@ -0,0 +1,40 @@
+"""Очередь напоминаний в таблице tasks
+
+Revision ID: 3b7d2e9a41c6
+Revises: f834d296bf25
+Create Date: 2026-10-16 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7d2e9a41c6'
+down_revision: Union[str, None] = 'f834d296bf25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('next_reminder', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_tasks_next_reminder', 'tasks', ['next_reminder'],
+        unique=False, postgresql_where=sa.text('next_reminder IS NOT NULL')
+    )
+    # Напоминания раньше жили только в памяти планировщика - восстанавливаем
+    # их для всех незавершенных задач со сроком в будущем
+    op.execute("""
+        UPDATE tasks
+        SET next_reminder = due_date, scheduler_job_id = NULL
+        WHERE NOT coalesce(is_completed, false)
+          AND NOT coalesce(is_cancelled, false)
+          AND due_date > now()
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_next_reminder', table_name='tasks')
+    op.drop_column('tasks', 'next_reminder')
@@ -0,0 +1,44 @@
+"""Метрики эффективности напоминаний
+
+Revision ID: 4f9a2c6e8b31
+Revises: e58c3a1f7d92
+Create Date: 2026-10-16 17:24:18.660135
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f9a2c6e8b31'
+down_revision: Union[str, None] = 'e58c3a1f7d92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reminder_effectiveness', sa.Column('on_time_rate', sa.Float(), nullable=True))
+    op.add_column('reminder_effectiveness', sa.Column('average_completion_time', sa.Interval(), nullable=True))
+
+    # Оставляем по одной, самой свежей записи на пользователя
+    op.execute("""
+        DELETE FROM reminder_effectiveness
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY user_id ORDER BY updated_at DESC NULLS LAST, id DESC
+                ) AS position
+                FROM reminder_effectiveness
+            ) ranked
+            WHERE position > 1
+        )
+    """)
+    op.create_index(op.f('ix_reminder_effectiveness_user_id'), 'reminder_effectiveness', ['user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_reminder_effectiveness_user_id'), table_name='reminder_effectiveness')
+    op.drop_column('reminder_effectiveness', 'average_completion_time')
+    op.drop_column('reminder_effectiveness', 'on_time_rate')
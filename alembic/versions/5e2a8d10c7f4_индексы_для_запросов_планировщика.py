@@ -0,0 +1,48 @@
+"""Индексы для запросов планировщика
+
+Revision ID: 5e2a8d10c7f4
+Revises: 9c1f4a7be203
+Create Date: 2026-10-16 12:20:47.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a8d10c7f4'
+down_revision: Union[str, None] = '9c1f4a7be203'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_TASK = sa.text('NOT is_completed AND NOT is_cancelled')
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = [
+    ('ix_tasks_open_due_date', 'tasks', ['due_date'], OPEN_TASK),
+    ('ix_tasks_open_user_id_due_date', 'tasks', ['user_id', 'due_date'], OPEN_TASK),
+    ('ix_tasks_completed_user_id_completion_date', 'tasks', ['user_id', 'completion_date'], sa.text('is_completed')),
+    ('ix_financial_records_user_id_date', 'financial_records', ['user_id', 'date'], None),
+    ('ix_user_interaction_metrics_user_id_date', 'user_interaction_metrics', ['user_id', 'date'], None),
+    ('ix_dialog_sessions_user_id', 'dialog_sessions', ['user_id'], None),
+    ('ix_dialog_emotional_states_session_id_timestamp', 'dialog_emotional_states', ['session_id', 'timestamp'], None),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=where, postgresql_concurrently=True, if_not_exists=True
+            )
+    op.execute('ANALYZE tasks')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,36 @@
+"""Кэш сгенерированных сообщений
+
+Revision ID: 9c1f4a7be203
+Revises: 3b7d2e9a41c6
+Create Date: 2026-10-16 11:05:13.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1f4a7be203'
+down_revision: Union[str, None] = '3b7d2e9a41c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'message_cache',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('message_type', sa.String(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_message_cache_expires_at'), 'message_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_message_cache_expires_at'), table_name='message_cache')
+    op.drop_table('message_cache')
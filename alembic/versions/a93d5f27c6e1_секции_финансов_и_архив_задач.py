@@ -0,0 +1,139 @@
+"""Секции финансов и архив задач
+
+Revision ID: a93d5f27c6e1
+Revises: c7e2f95a1d34
+Create Date: 2026-10-16 18:41:07.902364
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93d5f27c6e1'
+down_revision: Union[str, None] = 'c7e2f95a1d34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Секции создаются до текущего месяца плюс столько месяцев вперед; дальше - data_retention
+MONTHS_AHEAD = 2
+
+COLUMNS = ('id, user_id, amount, currency, category, description, date, type, '
+           'is_planned, is_savings, regular_payment_id, tags')
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _financial_records_columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('financial_records_id_seq')"), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Float(), nullable=True),
+        sa.Column('currency', sa.String(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('is_planned', sa.Boolean(), nullable=True),
+        sa.Column('is_savings', sa.Boolean(), nullable=True),
+        sa.Column('regular_payment_id', sa.Integer(), nullable=True),
+        sa.Column('tags', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+        sa.ForeignKeyConstraint(['regular_payment_id'], ['regular_payments.id'], ),
+    ]
+
+
+def _detach_financial_records(new_name: str) -> None:
+    """Переименовывает текущую таблицу, освобождая имена таблицы, ключа и индексов"""
+    op.execute("ALTER SEQUENCE financial_records_id_seq OWNED BY NONE")
+    op.execute(f"ALTER TABLE financial_records RENAME TO {new_name}")
+    op.execute(f"ALTER TABLE {new_name} RENAME CONSTRAINT financial_records_pkey TO {new_name}_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_financial_records_id")
+    op.execute("DROP INDEX IF EXISTS ix_financial_records_user_id_date")
+
+
+def _create_indexes() -> None:
+    op.execute("ALTER SEQUENCE financial_records_id_seq OWNED BY financial_records.id")
+    op.create_index('ix_financial_records_id', 'financial_records', ['id'], unique=False)
+    op.create_index('ix_financial_records_user_id_date', 'financial_records', ['user_id', 'date'], unique=False)
+
+
+def upgrade() -> None:
+    # Архив задач: поля, нужные для статистики по закрытым задачам
+    op.add_column('completed_tasks', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.add_column('completed_tasks', sa.Column('priority', sa.String(), nullable=True))
+    op.add_column('completed_tasks', sa.Column('is_cancelled', sa.Boolean(), server_default='false', nullable=False))
+    op.add_column('completed_tasks', sa.Column('cancellation_date', sa.DateTime(), nullable=True))
+    op.add_column('completed_tasks', sa.Column('cancellation_reason', sa.String(), nullable=True))
+    op.add_column('completed_tasks', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_completed_tasks_user_id_completion_date', 'completed_tasks',
+                    ['user_id', 'completion_date'], unique=False)
+
+    # financial_records -> таблица, секционированная по месяцам date.
+    # Ключ секционирования должен входить в первичный ключ: (id, date)
+    _detach_financial_records('financial_records_unpartitioned')
+    op.create_table(
+        'financial_records',
+        *_financial_records_columns(),
+        sa.PrimaryKeyConstraint('id', 'date', name='financial_records_pkey'),
+        postgresql_partition_by='RANGE (date)'
+    )
+    _create_indexes()
+    op.execute("CREATE TABLE financial_records_default PARTITION OF financial_records DEFAULT")
+
+    first = op.get_bind().execute(sa.text("SELECT min(date) FROM financial_records_unpartitioned")).scalar()
+    current = date.today().replace(day=1)
+    month = first.date().replace(day=1) if first else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        following = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE financial_records_{month:%Y_%m} PARTITION OF financial_records "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+
+    # У старых записей без даты ее не было и в ключе - берем момент миграции
+    op.execute(f"""
+        INSERT INTO financial_records ({COLUMNS})
+        SELECT {COLUMNS.replace('date,', 'coalesce(date, now()),')}
+        FROM financial_records_unpartitioned
+    """)
+    op.drop_table('financial_records_unpartitioned')
+    op.execute('ANALYZE financial_records')
+
+
+def downgrade() -> None:
+    _detach_financial_records('financial_records_partitioned')
+    op.create_table(
+        'financial_records',
+        *_financial_records_columns(),
+        sa.PrimaryKeyConstraint('id', name='financial_records_pkey')
+    )
+    _create_indexes()
+    op.execute(f"INSERT INTO financial_records ({COLUMNS}) SELECT {COLUMNS} FROM financial_records_partitioned")
+    op.execute("DROP TABLE financial_records_partitioned CASCADE")
+
+    # Архивные задачи возвращаются в tasks
+    op.execute("""
+        INSERT INTO tasks (id, user_id, title, description, due_date, is_completed, completion_date,
+                           created_at, priority, is_cancelled, cancellation_date, cancellation_reason)
+        SELECT id, user_id, title, description, original_due_date, NOT is_cancelled, completion_date,
+               created_at, priority, is_cancelled, cancellation_date, cancellation_reason
+        FROM completed_tasks
+        WHERE archived_at IS NOT NULL
+        ON CONFLICT (id) DO NOTHING
+    """)
+    op.execute("DELETE FROM completed_tasks WHERE archived_at IS NOT NULL")
+    op.drop_index('ix_completed_tasks_user_id_completion_date', table_name='completed_tasks')
+    op.drop_column('completed_tasks', 'archived_at')
+    op.drop_column('completed_tasks', 'cancellation_reason')
+    op.drop_column('completed_tasks', 'cancellation_date')
+    op.drop_column('completed_tasks', 'is_cancelled')
+    op.drop_column('completed_tasks', 'priority')
+    op.drop_column('completed_tasks', 'created_at')
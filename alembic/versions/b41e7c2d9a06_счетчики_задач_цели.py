@@ -0,0 +1,51 @@
+"""Счетчики задач цели
+
+Revision ID: b41e7c2d9a06
+Revises: 2d6b0f93c1e7
+Create Date: 2026-10-16 15:51:03.228417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e7c2d9a06'
+down_revision: Union[str, None] = '2d6b0f93c1e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('goals', sa.Column('tasks_total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('goals', sa.Column('tasks_completed', sa.Integer(), server_default='0', nullable=False))
+
+    # Заполняем счетчики по существующим задачам (отмененные не считаются)
+    op.execute("""
+        UPDATE goals SET
+            tasks_total = counts.total,
+            tasks_completed = counts.completed,
+            progress = CASE WHEN counts.total > 0 THEN counts.completed * 100 / counts.total ELSE 0 END
+        FROM (
+            SELECT goal_id,
+                   count(*) FILTER (WHERE NOT coalesce(is_cancelled, false)) AS total,
+                   count(*) FILTER (WHERE is_completed AND NOT coalesce(is_cancelled, false)) AS completed
+            FROM tasks
+            WHERE goal_id IS NOT NULL
+            GROUP BY goal_id
+        ) AS counts
+        WHERE goals.id = counts.goal_id
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_tasks_goal_id_order', 'tasks', ['goal_id', 'order'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tasks_goal_id_order', table_name='tasks', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('goals', 'tasks_completed')
+    op.drop_column('goals', 'tasks_total')
@@ -0,0 +1,58 @@
+"""Дневные суммы финансов
+
+Revision ID: c7e2f95a1d34
+Revises: 4f9a2c6e8b31
+Create Date: 2026-10-16 18:02:51.437216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e2f95a1d34'
+down_revision: Union[str, None] = '4f9a2c6e8b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'financial_daily_aggregates',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('currency', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('amount', sa.Float(), server_default='0', nullable=False),
+        sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('planned_amount', sa.Float(), server_default='0', nullable=False),
+        sa.Column('savings_amount', sa.Float(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'day', 'currency', 'category', 'type')
+    )
+
+    # Суммы по уже накопленным операциям; дальше таблица пополняется при записи
+    op.execute("""
+        INSERT INTO financial_daily_aggregates
+            (user_id, day, currency, category, type, amount, count, planned_amount, savings_amount)
+        SELECT
+            user_id,
+            date::date,
+            coalesce(currency, '?'),
+            coalesce(category, 'Без категории'),
+            type,
+            sum(coalesce(amount, 0)),
+            count(*),
+            sum(CASE WHEN is_planned THEN coalesce(amount, 0) ELSE 0 END),
+            sum(CASE WHEN is_savings THEN coalesce(amount, 0) ELSE 0 END)
+        FROM financial_records
+        WHERE user_id IS NOT NULL AND date IS NOT NULL AND type IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('financial_daily_aggregates')
@@ -0,0 +1,31 @@
+"""Ключевые слова архивных задач
+
+Revision ID: d5b8e3f2a917
+Revises: a93d5f27c6e1
+Create Date: 2026-10-16 20:12:31.518240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b8e3f2a917'
+down_revision: Union[str, None] = 'a93d5f27c6e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # task_id указывает на tasks или, после архивации, на completed_tasks: каскадное
+    # удаление стирало ключевые слова архивных задач. Удаленные ранее строки
+    # восстанавливаются при загрузке индекса пользователя (task_similarity.load_index)
+    op.drop_constraint('task_keywords_task_id_fkey', 'task_keywords', type_='foreignkey')
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM task_keywords WHERE task_id NOT IN (SELECT id FROM tasks)")
+    op.create_foreign_key('task_keywords_task_id_fkey', 'task_keywords', 'tasks',
+                          ['task_id'], ['id'], ondelete='CASCADE')
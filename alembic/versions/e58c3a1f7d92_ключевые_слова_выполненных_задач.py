@@ -0,0 +1,38 @@
+"""Ключевые слова выполненных задач
+
+Revision ID: e58c3a1f7d92
+Revises: b41e7c2d9a06
+Create Date: 2026-10-16 16:37:45.104228
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e58c3a1f7d92'
+down_revision: Union[str, None] = 'b41e7c2d9a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Заполняется при выполнении задач; старые задачи индексируются при первой загрузке индекса пользователя
+    op.create_table(
+        'task_keywords',
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('keywords', postgresql.ARRAY(sa.String()), nullable=False),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+        sa.PrimaryKeyConstraint('task_id')
+    )
+    op.create_index(op.f('ix_task_keywords_user_id'), 'task_keywords', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_task_keywords_user_id'), table_name='task_keywords')
+    op.drop_table('task_keywords')
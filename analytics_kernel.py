@@ -0,0 +1,269 @@
+# analytics_kernel.py
+
+"""
+Векторные расчеты метрик выполнения задач на NumPy.
+
+Нужные колонки задач выбираются одним запросом сразу для пачки пользователей
+и превращаются в массивы; все метрики (гистограмма часов выполнения, доля
+выполненных в срок, среднее время выполнения, распределение сложности)
+считаются через bincount по индексу пользователя, без цикла по задачам.
+
+recompute_user_metrics - ночной пересчет UserInteractionMetrics для всех
+пользователей пачками по ANALYTICS_BATCH_SIZE.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import Float, JSON, and_, case, cast, delete, func, insert, select
+from config import ANALYTICS_BATCH_SIZE, ANALYTICS_WINDOW_DAYS
+from database import get_db
+from models import Task, User, UserInteractionMetrics
+import json
+import logging
+import metrics
+import numpy as np
+import time
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Колонки матрицы задач, в порядке task_columns_query
+COLUMNS = ('user_id', 'created', 'due', 'completed_at', 'completion_hour',
+           'is_completed', 'description_length', 'dependency_count')
+
+
+class TaskArrays(NamedTuple):
+    """Задачи пачки пользователей в виде массивов; время - секунды от EPOCH, NaN - нет значения"""
+    user_ids: np.ndarray            # пользователи по возрастанию
+    group: np.ndarray               # индекс пользователя в user_ids для каждой задачи
+    created: np.ndarray
+    due: np.ndarray
+    completed_at: np.ndarray
+    completion_hour: np.ndarray
+    is_completed: np.ndarray        # bool
+    description_length: np.ndarray
+    dependency_count: np.ndarray
+
+    @property
+    def users(self) -> int:
+        return len(self.user_ids)
+
+
+def epoch_seconds(moment: datetime) -> float:
+    """Секунды от EPOCH для наивного datetime - как extract(epoch ...) в PostgreSQL"""
+    return (moment - EPOCH).total_seconds()
+
+
+def arrays_from_matrix(matrix: np.ndarray) -> TaskArrays:
+    matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(COLUMNS))
+    user_ids, group = np.unique(matrix[:, 0].astype(np.int64), return_inverse=True)
+    return TaskArrays(
+        user_ids=user_ids,
+        group=group,
+        created=matrix[:, 1],
+        due=matrix[:, 2],
+        completed_at=matrix[:, 3],
+        completion_hour=matrix[:, 4],
+        is_completed=matrix[:, 5] > 0,
+        description_length=matrix[:, 6],
+        dependency_count=matrix[:, 7]
+    )
+
+
+def arrays_from_tasks(tasks: Iterable[Task]) -> TaskArrays:
+    """Массивы из уже загруженных ORM-объектов (для функций task_analytics); все задачи - одна группа"""
+    def moment(value: Optional[datetime]) -> Optional[float]:
+        return epoch_seconds(value) if value else None
+
+    rows = [
+        (
+            0,
+            moment(task.created_at),
+            moment(task.due_date),
+            moment(task.completion_date),
+            task.completion_date.hour if task.completion_date else None,
+            1 if task.is_completed else 0,
+            len(task.description or ''),
+            len(json.loads(task.dependencies)) if task.dependencies else 0
+        )
+        for task in tasks
+    ]
+    return arrays_from_matrix(np.array(rows, dtype=np.float64))
+
+
+def task_columns_query(first_user_id: int, last_user_id: int, since: datetime):
+    """Колонки COLUMNS для задач пользователей из диапазона, созданных после since"""
+    def epoch(column):
+        return cast(func.extract('epoch', column), Float)
+
+    return (
+        select(
+            Task.user_id,
+            epoch(Task.created_at),
+            epoch(Task.due_date),
+            epoch(Task.completion_date),
+            cast(func.extract('hour', Task.completion_date), Float),
+            case((Task.is_completed == True, 1), else_=0),
+            func.coalesce(func.length(Task.description), 0),
+            case((Task.dependencies.like('[%'), func.json_array_length(cast(Task.dependencies, JSON))), else_=0)
+        )
+        .where(
+            Task.user_id.between(first_user_id, last_user_id),
+            Task.is_cancelled.isnot(True),
+            Task.created_at >= since
+        )
+    )
+
+
+# --- Метрики ---
+
+def hour_histogram(arrays: TaskArrays) -> np.ndarray:
+    """Выполненные задачи по часам: матрица (пользователи, 24)"""
+    mask = arrays.is_completed & ~np.isnan(arrays.completion_hour)
+    index = arrays.group[mask] * 24 + arrays.completion_hour[mask].astype(np.int64)
+    return np.bincount(index, minlength=arrays.users * 24).reshape(arrays.users, 24)
+
+
+def completion_patterns(histogram: np.ndarray) -> Dict[str, np.ndarray]:
+    """Пиковый час (-1, если выполненных нет) и доли утра, дня и вечера"""
+    totals = histogram.sum(axis=1)
+    safe_totals = np.maximum(totals, 1)
+    return {
+        'peak_hour': np.where(totals > 0, histogram.argmax(axis=1), -1),
+        'morning_rate': histogram[:, 5:12].sum(axis=1) / safe_totals,
+        'afternoon_rate': histogram[:, 12:17].sum(axis=1) / safe_totals,
+        'evening_rate': histogram[:, 17:22].sum(axis=1) / safe_totals
+    }
+
+
+def productive_hours(histogram: np.ndarray) -> List[List[int]]:
+    """Часы, в которые выполнено больше задач, чем в среднем по активным часам"""
+    active = np.count_nonzero(histogram, axis=1)
+    average = histogram.sum(axis=1) / np.maximum(active, 1)
+    mask = (histogram > average[:, None]) & (active[:, None] > 0)
+    return [np.flatnonzero(row).tolist() for row in mask]
+
+
+def completion_rate(arrays: TaskArrays) -> np.ndarray:
+    """Доля выполненных задач (0..1)"""
+    total = np.bincount(arrays.group, minlength=arrays.users)
+    completed = np.bincount(arrays.group[arrays.is_completed], minlength=arrays.users)
+    return completed / np.maximum(total, 1)
+
+
+def on_time_rate(arrays: TaskArrays) -> np.ndarray:
+    """Процент выполненных задач, закрытых не позже срока"""
+    completed = np.bincount(arrays.group[arrays.is_completed], minlength=arrays.users)
+    with np.errstate(invalid='ignore'):
+        on_time = arrays.is_completed & (arrays.completed_at <= arrays.due)
+    on_time = np.bincount(arrays.group[on_time], minlength=arrays.users)
+    return on_time / np.maximum(completed, 1) * 100
+
+
+def mean_duration(arrays: TaskArrays) -> np.ndarray:
+    """Среднее время от создания до выполнения в секундах (NaN, если данных нет)"""
+    duration = arrays.completed_at - arrays.created
+    mask = arrays.is_completed & ~np.isnan(duration)
+    counts = np.bincount(arrays.group[mask], minlength=arrays.users)
+    sums = np.bincount(arrays.group[mask], weights=duration[mask], minlength=arrays.users)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def mean_delay_hours(arrays: TaskArrays) -> np.ndarray:
+    """Средняя задержка выполнения относительно срока в часах (досрочное считается нулем)"""
+    delay = arrays.completed_at - arrays.due
+    mask = arrays.is_completed & ~np.isnan(delay)
+    counts = np.bincount(arrays.group[mask], minlength=arrays.users)
+    sums = np.bincount(arrays.group[mask], weights=np.maximum(delay[mask], 0), minlength=arrays.users)
+    return sums / np.maximum(counts, 1) / 3600
+
+
+def complexity_scores(arrays: TaskArrays, now: datetime) -> np.ndarray:
+    """Векторный вариант task_analytics.estimate_task_complexity"""
+    score = 1 + (arrays.description_length > 500) + (arrays.description_length > 1000)
+    days_until_due = np.floor((arrays.due - epoch_seconds(now)) / 86400)
+    with np.errstate(invalid='ignore'):
+        score = score + (days_until_due < 1) - (days_until_due > 7)
+    score = score + np.minimum(arrays.dependency_count, 2)
+    return np.clip(score, 1, 5).astype(np.int64)
+
+
+def complexity_distribution(arrays: TaskArrays, now: datetime) -> np.ndarray:
+    """Количество задач low/medium/high: матрица (пользователи, 3)"""
+    bucket = np.digitize(complexity_scores(arrays, now), [3, 5])  # 1-2 -> 0, 3-4 -> 1, 5 -> 2
+    index = arrays.group * 3 + bucket
+    return np.bincount(index, minlength=arrays.users * 3).reshape(arrays.users, 3)
+
+
+def metrics_rows(arrays: TaskArrays, now: datetime,
+                 styles: Optional[Dict[int, Optional[str]]] = None) -> List[dict]:
+    """Строки UserInteractionMetrics для всех пользователей пачки"""
+    styles = styles or {}
+    histogram = hour_histogram(arrays)
+    hours = productive_hours(histogram)
+    rates = completion_rate(arrays)
+    delays = mean_delay_hours(arrays)
+    complexity = complexity_distribution(arrays, now)
+    return [
+        {
+            'user_id': int(user_id),
+            'date': now,
+            'task_completion_rate': float(rates[i]),
+            'average_task_delay': int(round(delays[i])),
+            'task_complexity_preference': dict(zip(('low', 'medium', 'high'), complexity[i].tolist())),
+            'most_productive_hours': hours[i],
+            'preferred_interaction_style': styles.get(int(user_id))
+        }
+        for i, user_id in enumerate(arrays.user_ids)
+    ]
+
+
+async def recompute_user_metrics(batch_size: int = ANALYTICS_BATCH_SIZE,
+                                 window_days: int = ANALYTICS_WINDOW_DAYS):
+    """Пересчитывает метрики всех пользователей по задачам за последние window_days дней"""
+    started = time.perf_counter()
+    now = datetime.now()
+    since = now - timedelta(days=window_days)
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    last_user_id = None
+    written = 0
+
+    while True:
+        async with get_db() as session:
+            users = select(User.user_id).order_by(User.user_id).limit(batch_size)
+            if last_user_id is not None:
+                users = users.where(User.user_id > last_user_id)
+            batch = (await session.execute(users)).scalars().all()
+            if not batch:
+                break
+            first, last_user_id = batch[0], batch[-1]
+
+            rows = (await session.execute(task_columns_query(first, last_user_id, since))).all()
+            arrays = arrays_from_matrix(np.array(rows, dtype=np.float64))
+
+            # Стиль общения метрики не вычисляют - переносим из последней записи
+            styles = dict((await session.execute(
+                select(UserInteractionMetrics.user_id, UserInteractionMetrics.preferred_interaction_style)
+                .where(UserInteractionMetrics.user_id.between(first, last_user_id))
+                .order_by(UserInteractionMetrics.user_id, UserInteractionMetrics.date.desc())
+                .distinct(UserInteractionMetrics.user_id)
+            )).all())
+
+            values = metrics_rows(arrays, now, styles)
+            # Повторный запуск в тот же день заменяет записи, а не дублирует их
+            await session.execute(
+                delete(UserInteractionMetrics)
+                .where(and_(
+                    UserInteractionMetrics.user_id.between(first, last_user_id),
+                    UserInteractionMetrics.date >= day_start
+                ))
+            )
+            if values:
+                await session.execute(insert(UserInteractionMetrics), values)
+            await session.commit()
+            written += len(values)
+
+    metrics.add_job_rows(written)
+    logger.info(f"Метрики пересчитаны для {written} пользователей за {time.perf_counter() - started:.1f} с")
@@ -0,0 +1,55 @@
+# benchmarks/bench_daily_summary.py
+
+"""
+Замер ежедневной сводки: количество обращений к базе и время работы.
+
+Запускать только на тестовой базе (ENVIRONMENT=test), таблицы пересоздаются:
+    python -m benchmarks.bench_daily_summary --users 10000 --tasks-per-user 5
+"""
+
+import os
+
+# Отправка в замере ничего не стоит, ограничение скорости не нужно
+os.environ.setdefault('TELEGRAM_GLOBAL_RATE', '1000000')
+
+import argparse
+import asyncio
+import time
+from config import DATABASE_URL
+from database import engine
+from benchmarks.datagen import seed
+from benchmarks.harness import StatementCounter, reset_schema
+import scheduler
+
+
+class FakeBot:
+    """Бот, который только считает отправленные сообщения"""
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+async def main(args):
+    await reset_schema(engine, DATABASE_URL)
+    await seed(args.users, tasks_per_user=args.tasks_per_user, finance_per_user=0, goals_per_user=0)
+
+    bot = FakeBot()
+    started = time.perf_counter()
+    with StatementCounter(engine) as statements:
+        await scheduler.send_daily_summary(bot)
+    elapsed = time.perf_counter() - started
+
+    print(f"Пользователей: {args.users}, задач: {args.users * args.tasks_per_user}")
+    print(f"Запросов к базе: {statements.count}")
+    print(f"Отправлено сводок: {bot.sent}")
+    print(f"Время: {elapsed:.2f} с")
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--tasks-per-user', type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+# benchmarks/bench_task_scheduler.py
+
+"""
+Замер планировщика плана цели (task_scheduler) на больших случайных графах.
+
+База и сеть не нужны:
+    python -m benchmarks.bench_task_scheduler --nodes 10000 --edges-per-node 3
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import task_scheduler
+
+
+def random_plan(nodes: int, edges_per_node: int, parallel_share: float, seed: int) -> list:
+    """Случайный ациклический план: зависимости только на задачи с меньшим номером"""
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(nodes):
+        window = range(max(0, i - 50), i)
+        dependencies = rng.sample(window, min(len(window), rng.randint(0, edges_per_node)))
+        tasks.append({
+            'title': f"Задача {i}",
+            'duration': rng.randint(1, 10),
+            'can_parallel': rng.random() < parallel_share,
+            'dependencies': [f"Задача {j}" for j in dependencies]
+        })
+    return tasks
+
+
+def measure(name: str, func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    print(f"{name:<28} min {min(timings) * 1000:8.1f} мс   median {sorted(timings)[len(timings) // 2] * 1000:8.1f} мс")
+    return result
+
+
+def main(args):
+    tasks = random_plan(args.nodes, args.edges_per_node, args.parallel_share, args.seed)
+    edges = sum(len(task['dependencies']) for task in tasks)
+    print(f"Задач: {len(tasks)}, зависимостей: {edges}")
+
+    timings = measure('critical_path_analysis', lambda: task_scheduler.critical_path_analysis(tasks), args.repeat)
+    lanes = max(1, int(task_scheduler.weekly_hours(args.available_time) // task_scheduler.HOURS_PER_LANE))
+    measure(f'pack_schedule (потоков: {lanes})',
+            lambda: task_scheduler.pack_schedule(tasks, timings, lanes), args.repeat)
+    deadline = datetime.now() + timedelta(days=365)
+    measure('schedule_plan',
+            lambda: task_scheduler.schedule_plan([dict(task) for task in tasks], deadline, args.available_time),
+            args.repeat)
+
+    critical = sum(1 for timing in timings if timing.is_critical)
+    length = max(timing.earliest_finish for timing in timings)
+    print(f"Критический путь: {length:.0f} дн., критических задач: {critical}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=10000)
+    parser.add_argument('--edges-per-node', type=int, default=3)
+    parser.add_argument('--parallel-share', type=float, default=0.7)
+    parser.add_argument('--available-time', default='4')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+# benchmarks/bench_task_similarity.py
+
+"""
+Замер поиска похожих задач: обратный индекс task_similarity против прежнего
+перебора всей истории с подсчетом Жаккара.
+
+База не нужна:
+    python -m benchmarks.bench_task_similarity --history 5000 --queries 1000
+"""
+
+import argparse
+import random
+import time
+from benchmarks.harness import LatencyStats, percentile
+from task_similarity import SimilarityIndex, keywords, SIMILARITY_THRESHOLD
+
+VERBS = ['позвонить', 'оплатить', 'подготовить', 'купить', 'записаться', 'прочитать', 'починить',
+         'ответить', 'отправить', 'проверить', 'написать', 'заказать', 'обсудить', 'собрать']
+OBJECTS = ['врачу', 'интернет', 'отчет', 'продукты', 'спортзал', 'главу книги', 'кран', 'письма',
+           'презентацию', 'документы', 'счета', 'клиенту', 'план', 'подарок', 'квартиру', 'машину',
+           'маме', 'проекту', 'курсу', 'заявку']
+DETAILS = ['до пятницы', 'срочно', 'по работе', 'на неделе', 'для отпуска', 'с командой', 'вечером',
+           'к встрече', 'для налоговой', 'в банке']
+
+
+def random_title(rng: random.Random) -> str:
+    words = [rng.choice(VERBS), rng.choice(OBJECTS)]
+    if rng.random() < 0.6:
+        words.append(rng.choice(DETAILS))
+    if rng.random() < 0.3:
+        words.append(f"№{rng.randint(1, 500)}")
+    return ' '.join(words)
+
+
+def linear_scan(history: list, query: str):
+    """Прежний алгоритм: токенизация всей истории на каждый запрос"""
+    current = set(keywords(query))
+    scored = []
+    for task_id, title in history:
+        task_keywords = set(keywords(title))
+        union = current | task_keywords
+        similarity = len(current & task_keywords) / len(union) if union else 0
+        if similarity >= SIMILARITY_THRESHOLD:
+            scored.append((similarity, task_id))
+    scored.sort(reverse=True)
+    return scored[:3]
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    history = [(task_id, random_title(rng)) for task_id in range(args.history)]
+    queries = [random_title(rng) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    index = SimilarityIndex()
+    for task_id, title in history:
+        index.add(task_id, keywords(title))
+    print(f"Индекс на {len(index)} задач построен за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    indexed = LatencyStats()
+    for query in queries:
+        started = time.perf_counter()
+        index.query(keywords(query))
+        indexed.record(time.perf_counter() - started)
+
+    scanned = LatencyStats()
+    for query in queries[:args.scan_queries]:
+        started = time.perf_counter()
+        linear_scan(history, query)
+        scanned.record(time.perf_counter() - started)
+
+    for name, stats in (('обратный индекс', indexed), ('перебор истории', scanned)):
+        print(f"{name:<16} p50 {percentile(stats.values, 50) * 1000:8.3f} мс   p99 {percentile(stats.values, 99) * 1000:8.3f} мс")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--history', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--scan-queries', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
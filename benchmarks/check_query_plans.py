@@ -0,0 +1,168 @@
+# benchmarks/check_query_plans.py
+
+"""
+Проверка планов горячих запросов: каждый должен использовать свой индекс.
+
+Заполняет тестовую базу данными, похожими на боевые (большая часть задач
+выполнена, незавершенные раскиданы на месяц вокруг текущей даты), выполняет
+ANALYZE и EXPLAIN для запросов планировщика, очереди напоминаний и контекста
+пользователя. Завершается с кодом 1, если какой-то запрос не использует
+ожидаемый индекс или читает таблицу целиком.
+
+Запускать только на тестовой базе (ENVIRONMENT=test), таблицы пересоздаются:
+    python -m benchmarks.check_query_plans --users 5000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+from config import DATABASE_URL
+from database import engine, get_db
+from models import (
+    Base, User, Task, FinancialRecord, UserInteractionMetrics,
+    DialogSession, DialogEmotionalState, EmotionalState
+)
+from reminder_queue import due_reminders_query
+from scheduler import overdue_tasks_query, summary_tasks_query, completed_since_query, upcoming_tasks_query
+from user_context import _context_query
+from finance_analysis import totals_query
+import finance_aggregates
+
+INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+
+
+async def seed(users: int, chunk: int = 1000):
+    now = datetime.now()
+    async with get_db() as session:
+        for offset in range(0, users, chunk):
+            user_ids = range(offset + 1, min(offset + chunk, users) + 1)
+            await session.execute(insert(User), [{'user_id': user_id} for user_id in user_ids])
+
+            tasks = []
+            for user_id in user_ids:
+                for _ in range(40):
+                    if random.random() < 0.85:
+                        completed = now - timedelta(hours=random.randint(1, 24 * 90))
+                        tasks.append({
+                            'user_id': user_id, 'title': 'Выполненная задача', 'priority': 'medium',
+                            'due_date': completed + timedelta(hours=random.randint(-24, 24)),
+                            'is_completed': True, 'is_cancelled': False, 'completion_date': completed,
+                            'next_reminder': None
+                        })
+                    else:
+                        due = now + timedelta(hours=random.randint(-24 * 10, 24 * 30))
+                        tasks.append({
+                            'user_id': user_id, 'title': 'Открытая задача', 'priority': 'medium',
+                            'due_date': due, 'is_completed': False,
+                            'is_cancelled': random.random() < 0.05, 'completion_date': None,
+                            'next_reminder': due if due > now else None
+                        })
+            await session.execute(insert(Task), tasks)
+
+            await session.execute(insert(FinancialRecord), [
+                {
+                    'user_id': user_id, 'amount': random.randint(100, 5000), 'currency': 'RUB',
+                    'category': 'Продукты', 'type': 'expense',
+                    'date': now - timedelta(hours=random.randint(1, 24 * 180))
+                }
+                for user_id in user_ids for _ in range(20)
+            ])
+            await session.execute(insert(UserInteractionMetrics), [
+                {'user_id': user_id, 'date': now - timedelta(days=day)}
+                for user_id in user_ids for day in range(30)
+            ])
+            sessions = await session.execute(
+                insert(DialogSession).returning(DialogSession.id),
+                [{'user_id': user_id, 'topic': 'Планирование'} for user_id in user_ids for _ in range(2)]
+            )
+            await session.execute(insert(DialogEmotionalState), [
+                {
+                    'session_id': session_id, 'state': random.choice(list(EmotionalState)),
+                    'timestamp': now - timedelta(minutes=random.randint(1, 60 * 24 * 30))
+                }
+                for session_id in sessions.scalars().all() for _ in range(10)
+            ])
+        await session.execute(finance_aggregates.rebuild_query())
+        await session.commit()
+
+
+def collect_scans(plan: dict, scans: list):
+    """Собирает (тип узла, индекс, таблица) по всему дереву плана"""
+    scans.append((plan['Node Type'], plan.get('Index Name'), plan.get('Relation Name')))
+    for child in plan.get('Plans', []):
+        collect_scans(child, scans)
+    return scans
+
+
+async def explain(conn, query) -> list:
+    sql = str(query.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+    result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return collect_scans(plan[0]['Plan'], [])
+
+
+async def main(args):
+    if 'test' not in DATABASE_URL.lower():
+        raise RuntimeError("Проверка разрешена только на тестовой базе")
+
+    if not args.no_seed:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        await seed(args.users)
+        async with engine.begin() as conn:
+            await conn.execute(text('ANALYZE'))
+
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    sample_users = random.sample(range(1, args.users + 1), min(args.users, 1000))
+    user_id = sample_users[0]
+
+    # (название, запрос, индексы, которые должны быть в плане)
+    checks = [
+        ('Просроченные задачи', overdue_tasks_query(now), {'ix_tasks_open_due_date'}),
+        ('Предстоящие задачи и загруженность', upcoming_tasks_query(now),
+         {'ix_tasks_open_due_date', 'ix_tasks_open_user_id_due_date'}),
+        ('Сводка: задачи пачки пользователей', summary_tasks_query(sample_users, today_start + timedelta(days=3)),
+         {'ix_tasks_open_user_id_due_date'}),
+        ('Сводка: выполнено сегодня', completed_since_query(sample_users, today_start),
+         {'ix_tasks_completed_user_id_completion_date'}),
+        ('Очередь напоминаний', due_reminders_query(now, 100), {'ix_tasks_next_reminder'}),
+        ('Контекст пользователя', _context_query(user_id),
+         {'ix_tasks_open_user_id_due_date', 'ix_user_interaction_metrics_user_id_date',
+          'ix_dialog_sessions_user_id', 'ix_dialog_emotional_states_session_id_timestamp'}),
+        ('Финансы за неделю', totals_query(sample_users, (now - timedelta(days=6)).date()),
+         {'financial_daily_aggregates_pkey'}),
+        ('Финансовый совет', totals_query([user_id]), {'financial_daily_aggregates_pkey'}),
+    ]
+
+    failed = 0
+    async with engine.connect() as conn:
+        for name, query, expected in checks:
+            scans = await explain(conn, query)
+            used = {index for node, index, _ in scans if node in INDEX_SCANS}
+            seq_scans = {table for node, _, table in scans if node == 'Seq Scan' and table != 'users'}
+            missing = expected - used
+            ok = not missing and not seq_scans
+            failed += not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {name}: индексы {sorted(used)}")
+            if missing:
+                print(f"     не используются: {sorted(missing)}")
+            if seq_scans:
+                print(f"     полное чтение таблиц: {sorted(seq_scans)}")
+
+    await engine.dispose()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--no-seed', action='store_true', help='проверить планы на уже заполненной базе')
+    asyncio.run(main(parser.parse_args()))
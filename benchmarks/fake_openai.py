@@ -0,0 +1,91 @@
+# benchmarks/fake_openai.py
+
+"""
+Локальная замена OpenAI-совместимого API для замеров.
+
+Отвечает на /v1/chat/completions с настраиваемой задержкой. На запрос разбора
+сообщения возвращает JSON задачи, на запросы с response_format=json_object -
+пустой анализ, на остальные - короткий текст. Считает запросы и одновременную
+нагрузку и объем промптов, чтобы было видно, во что упирается бот.
+"""
+
+from aiohttp import web
+from datetime import datetime, timedelta
+import asyncio
+import json
+import random
+import time
+
+
+class FakeOpenAIServer:
+    def __init__(self, latency: float = 0.8, jitter: float = 0.3):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompt_chars = 0
+        self._runner = None
+        self.url = None
+
+    def reset(self):
+        self.requests = 0
+        self.max_in_flight = 0
+        self.prompt_chars = 0
+
+    def _content(self, body: dict) -> str:
+        prompt = body['messages'][-1]['content']
+        if 'Текст для анализа' in prompt:
+            text = prompt.rsplit("Текст для анализа: '", 1)[-1].rstrip("' \n")
+            return json.dumps({
+                'type': 'task',
+                'data': {
+                    'title': text[:100],
+                    'due_date': (datetime.now() + timedelta(days=1)).replace(microsecond=0).isoformat(),
+                    'priority': 'medium',
+                    'category': 'Работа'
+                }
+            }, ensure_ascii=False)
+        if body.get('response_format', {}).get('type') == 'json_object':
+            return json.dumps({'intent': 'unknown', 'emotion': 'neutral',
+                               'needs_support': False, 'action_items': []})
+        return "Не забудьте про задачу - у вас все получится!"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        self.prompt_chars += sum(len(message.get('content') or '') for message in body['messages'])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+            content = self._content(body)
+        finally:
+            self.in_flight -= 1
+        return web.json_response({
+            'id': f"chatcmpl-{self.requests}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4o-mini'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 30, 'total_tokens': 130}
+        })
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}/v1"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
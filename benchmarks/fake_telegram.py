@@ -0,0 +1,93 @@
+# benchmarks/fake_telegram.py
+
+"""
+Локальная замена Bot API для замеров.
+
+Отвечает на запросы aiogram так же, как api.telegram.org, с настраиваемой
+задержкой и долей ответов 429 (retry_after). Запоминает время прихода каждого
+сообщения, чтобы считать пропускную способность и задержку доставки.
+"""
+
+from aiohttp import web
+from datetime import datetime
+import asyncio
+import json
+import random
+import time
+
+
+class FakeTelegramServer:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02,
+                 flood_rate: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls = {}
+        self.sent_at = []       # time.monotonic() каждого принятого sendMessage
+        self.flood_errors = 0
+        self._message_id = 0
+        self._runner = None
+        self.url = None
+
+    def reset(self):
+        self.calls = {}
+        self.sent_at = []
+        self.flood_errors = 0
+
+    async def _delay(self):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _read_params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        form = await request.post()
+        return {key: value for key, value in form.items()}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = await self._read_params(request)
+        await self._delay()
+
+        if method == 'sendMessage' and random.random() < self.flood_rate:
+            self.flood_errors += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after}
+            }, status=429)
+
+        if method == 'sendMessage':
+            self.sent_at.append(time.monotonic())
+            self._message_id += 1
+            chat_id = int(params.get('chat_id'))
+            result = {
+                'message_id': self._message_id,
+                'date': int(datetime.now().timestamp()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', '')
+            }
+        elif method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        else:
+            result = True
+        return web.Response(text=json.dumps({'ok': True, 'result': result}), content_type='application/json')
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
@@ -0,0 +1,94 @@
+# benchmarks/harness.py
+
+"""
+Общие инструменты замеров: перцентили задержек, подсчет обращений к базе,
+пересоздание схемы тестовой базы и запуск операций с ограниченной конкурентностью.
+"""
+
+from typing import Awaitable, Callable, Iterable, List, Optional
+from sqlalchemy import event
+import asyncio
+import math
+import time
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyStats:
+    """Набор измеренных задержек, в секундах"""
+
+    def __init__(self, values: Optional[List[float]] = None):
+        self.values = list(values or [])
+
+    def record(self, seconds: float):
+        self.values.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def summary(self) -> str:
+        if not self.values:
+            return "нет данных"
+        return (f"p50 {percentile(self.values, 50) * 1000:.0f} мс, "
+                f"p95 {percentile(self.values, 95) * 1000:.0f} мс, "
+                f"p99 {percentile(self.values, 99) * 1000:.0f} мс")
+
+
+class StatementCounter:
+    """Считает SQL-запросы, отправленные через движок, внутри блока with"""
+
+    def __init__(self, engine):
+        self.engine = engine.sync_engine
+        self.count = 0
+
+    def _on_execute(self, *_):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *_):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+async def reset_schema(engine, database_url: str):
+    """Пересоздает все таблицы. Разрешено только на тестовой базе"""
+    from models import Base
+
+    if 'test' not in database_url.lower():
+        raise RuntimeError("Замеры разрешены только на тестовой базе")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def run_concurrently(items: Iterable, operation: Callable[..., Awaitable],
+                           concurrency: int) -> LatencyStats:
+    """Выполняет operation(item) для всех items, не более concurrency одновременно"""
+    stats = LatencyStats()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(item):
+        async with semaphore:
+            started = time.perf_counter()
+            await operation(item)
+            stats.record(time.perf_counter() - started)
+
+    await asyncio.gather(*(timed(item) for item in items))
+    return stats
+
+
+def print_report(name: str, rows: dict):
+    print(f"\n== {name} ==")
+    width = max(len(key) for key in rows)
+    for key, value in rows.items():
+        print(f"  {key.ljust(width)}  {value}")
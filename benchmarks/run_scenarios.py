@@ -0,0 +1,187 @@
+# benchmarks/run_scenarios.py
+
+"""
+Нагрузочные сценарии бота против локальных заглушек Telegram и OpenAI.
+
+Поднимает FakeTelegramServer и FakeOpenAIServer на свободных портах,
+направляет на них бота (TelegramAPIServer) и шлюз LLM (OPENAI_BASE_URL),
+пересоздает и заполняет тестовую базу, затем по очереди выполняет сценарии и
+печатает p50/p95/p99, число запросов к базе, обращений к LLM и сообщений/с.
+
+Нужен только локальный PostgreSQL с тестовой базой (в DATABASE_URL должно
+быть слово test), сеть не используется:
+    python -m benchmarks.run_scenarios --users 10000 --scenarios all
+    python -m benchmarks.run_scenarios --users 1000 --scenarios process_message --llm-latency 1.5
+    python -m benchmarks.run_scenarios --users 2000 --finance-per-user 300 --scenarios weekly_expense_analysis
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import time
+from datetime import datetime
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.harness import LatencyStats, StatementCounter, print_report, reset_schema, run_concurrently
+
+SCENARIOS = ['process_message', 'check_tasks', 'reminder_queue', 'daily_summary', 'weekly_expense_analysis']
+
+# Сообщения, которые разбираются локально, и те, что уходят в LLM
+QUICK_MESSAGES = [
+    'Купить молоко завтра в 10:00',
+    'Позвонить маме сегодня в 19:30',
+    'Потратил 500 руб на продукты',
+    'Оплатить интернет в пятницу',
+    'Получил зарплату 80000 рублей',
+]
+LLM_MESSAGES = [
+    'Надо бы как-нибудь разобраться с документами на квартиру',
+    'Хочу начать бегать по утрам, но не знаю с чего начать',
+    'Напомни, что у Пети скоро день рождения',
+]
+
+
+def _delivery(tg: FakeTelegramServer, started: float, elapsed: float) -> dict:
+    """Задержка доставки сообщений от старта задачи и пропускная способность"""
+    delivery = LatencyStats([sent - started for sent in tg.sent_at])
+    return {
+        'сообщений': len(tg.sent_at),
+        'сообщений/с': f"{len(tg.sent_at) / elapsed:.1f}" if elapsed > 0 else '-',
+        'доставка от старта': delivery.summary(),
+        'ответов 429': tg.flood_errors,
+    }
+
+
+async def scenario_process_message(ctx) -> dict:
+    handlers = importlib.import_module('handlers')
+    from aiogram import types
+
+    bot, args = ctx['bot'], ctx['args']
+    messages = []
+    for n in range(args.messages):
+        user_id = random.randint(1, args.users)
+        pool = LLM_MESSAGES if random.random() < args.llm_share else QUICK_MESSAGES
+        messages.append(types.Message(
+            message_id=n + 1,
+            date=datetime.now(),
+            chat=types.Chat(id=user_id, type='private'),
+            from_user=types.User(id=user_id, is_bot=False, first_name='Bench'),
+            text=random.choice(pool)
+        ).as_(bot))
+
+    started = time.perf_counter()
+    with StatementCounter(ctx['engine']) as statements:
+        latency = await run_concurrently(messages, handlers.process_message, args.concurrency)
+    elapsed = time.perf_counter() - started
+    return {
+        'обработано сообщений': len(latency),
+        'задержка ответа': latency.summary(),
+        'запросов к базе': statements.count,
+        'запросов к базе на сообщение': f"{statements.count / max(1, len(latency)):.1f}",
+        'обращений к LLM': ctx['llm'].requests,
+        'макс. одновременно в LLM': ctx['llm'].max_in_flight,
+        'сообщений/с': f"{len(latency) / elapsed:.1f}",
+        'время': f"{elapsed:.2f} с",
+    }
+
+
+async def _run_job(ctx, job) -> dict:
+    started_monotonic = time.monotonic()
+    started = time.perf_counter()
+    with StatementCounter(ctx['engine']) as statements:
+        await job(ctx['bot'])
+    elapsed = time.perf_counter() - started
+    return {
+        'запросов к базе': statements.count,
+        'обращений к LLM': ctx['llm'].requests,
+        **_delivery(ctx['tg'], started_monotonic, elapsed),
+        'время': f"{elapsed:.2f} с",
+    }
+
+
+async def scenario_check_tasks(ctx) -> dict:
+    return await _run_job(ctx, importlib.import_module('scheduler').check_tasks)
+
+
+async def scenario_reminder_queue(ctx) -> dict:
+    return await _run_job(ctx, importlib.import_module('scheduler').dispatch_due_reminders)
+
+
+async def scenario_daily_summary(ctx) -> dict:
+    return await _run_job(ctx, importlib.import_module('scheduler').send_daily_summary)
+
+
+async def scenario_weekly_expense_analysis(ctx) -> dict:
+    report = await _run_job(ctx, importlib.import_module('scheduler').weekly_expense_analysis)
+    llm = ctx['llm']
+    return {
+        **report,
+        'символов промпта на запрос': f"{llm.prompt_chars / max(1, llm.requests):.0f}",
+        'макс. одновременно в LLM': llm.max_in_flight,
+    }
+
+
+async def main(args):
+    tg = FakeTelegramServer(latency=args.tg_latency, flood_rate=args.flood_rate)
+    llm = FakeOpenAIServer(latency=args.llm_latency)
+    await tg.start()
+    await llm.start()
+
+    # Конфигурация читается при импорте модулей бота, поэтому окружение - до импорта
+    os.environ.setdefault('BOT_TOKEN', '123456:bench')
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+    os.environ['OPENAI_BASE_URL'] = llm.url
+    if args.no_rate_limit:
+        os.environ['TELEGRAM_GLOBAL_RATE'] = '1000000'
+        os.environ['TELEGRAM_PER_CHAT_RATE'] = '1000000'
+
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from config import BOT_TOKEN, DATABASE_URL
+    from database import engine
+    from benchmarks.datagen import seed
+    import llm_gateway
+    import telegram_sender
+
+    bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(tg.url)))
+    ctx = {'args': args, 'bot': bot, 'tg': tg, 'llm': llm, 'engine': engine}
+
+    try:
+        await reset_schema(engine, DATABASE_URL)
+        started = time.perf_counter()
+        counts = await seed(args.users, tasks_per_user=args.tasks_per_user,
+                            finance_per_user=args.finance_per_user)
+        print_report('Данные', {**counts, 'время заполнения': f"{time.perf_counter() - started:.1f} с"})
+
+        scenarios = SCENARIOS if args.scenarios == ['all'] else args.scenarios
+        for name in scenarios:
+            tg.reset()
+            llm.reset()
+            report = await globals()[f"scenario_{name}"](ctx)
+            print_report(name, report)
+    finally:
+        await telegram_sender.close()
+        await bot.session.close()
+        await llm_gateway.close()
+        await engine.dispose()
+        await tg.stop()
+        await llm.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=['all'], choices=SCENARIOS + ['all'])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--tasks-per-user', type=int, default=10)
+    parser.add_argument('--finance-per-user', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=2000, help='сообщений в сценарии process_message')
+    parser.add_argument('--concurrency', type=int, default=100, help='одновременных пользователей')
+    parser.add_argument('--llm-share', type=float, default=0.3, help='доля сообщений, требующих LLM')
+    parser.add_argument('--llm-latency', type=float, default=0.8, help='задержка ответа LLM, с')
+    parser.add_argument('--tg-latency', type=float, default=0.05, help='задержка ответа Bot API, с')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='доля ответов 429 на sendMessage')
+    parser.add_argument('--no-rate-limit', action='store_true', help='отключить лимиты очереди Telegram')
+    asyncio.run(main(parser.parse_args()))
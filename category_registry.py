@@ -0,0 +1,94 @@
+# category_registry.py
+
+"""
+Справочник категорий задач.
+
+Категории по умолчанию создаются при запуске бота, соответствие имя -> id
+хранится в памяти процесса. Новая категория добавляется одним upsert по
+уникальному индексу на name, поэтому создание задачи обычно вообще не
+обращается к таблице task_categories, а одноименные категории не дублируются.
+"""
+
+from typing import Dict
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from database import get_db
+from models import TaskCategory
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Категории задач по умолчанию: (название, приоритет, цвет)
+DEFAULT_TASK_CATEGORIES = [
+    ('Срочное', 100, '#FF4444'),
+    ('Работа', 90, '#4444FF'),
+    ('Учёба', 80, '#44FF44'),
+    ('Здоровье', 85, '#44FFFF'),
+    ('Финансы', 75, '#FFFF44'),
+    ('Личное', 70, '#FF44FF'),
+    ('Покупки', 60, '#FFA500'),
+    ('Дом', 65, '#8B4513'),
+    ('Хобби', 50, '#9370DB'),
+    ('Разное', 0, '#808080')
+]
+
+DEFAULT_CATEGORY = 'Разное'
+
+_category_ids: Dict[str, int] = {}
+
+
+def normalize_name(name: str) -> str:
+    """Убирает лишние пробелы и делает первую букву заглавной: ' работа ' -> 'Работа'"""
+    name = ' '.join((name or '').split())
+    return name[:1].upper() + name[1:] if name else DEFAULT_CATEGORY
+
+
+async def refresh():
+    """Перечитывает соответствие имя -> id из базы"""
+    async with get_db() as session:
+        rows = (await session.execute(select(TaskCategory.name, TaskCategory.id))).all()
+    _category_ids.clear()
+    _category_ids.update(dict(rows))
+
+
+async def seed_categories():
+    """Создает недостающие категории по умолчанию и загружает справочник"""
+    async with get_db() as session:
+        await session.execute(
+            insert(TaskCategory)
+            .values([
+                {'name': name, 'priority': priority, 'color': color}
+                for name, priority, color in DEFAULT_TASK_CATEGORIES
+            ])
+            .on_conflict_do_nothing(index_elements=[TaskCategory.name])
+        )
+        await session.commit()
+    await refresh()
+    logger.info(f"Загружено категорий задач: {len(_category_ids)}")
+
+
+async def resolve_category_id(name: str) -> int:
+    """Возвращает id категории, создавая ее при первом использовании"""
+    name = normalize_name(name)
+    category_id = _category_ids.get(name)
+    if category_id is not None:
+        return category_id
+
+    # Пустое обновление нужно, чтобы RETURNING вернул id и для уже существующей строки
+    stmt = insert(TaskCategory).values(name=name, description=f"Категория для задач типа {name}")
+    async with get_db() as session:
+        category_id = (await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[TaskCategory.name],
+                set_={'name': stmt.excluded.name}
+            ).returning(TaskCategory.id)
+        )).scalar_one()
+        await session.commit()
+
+    _category_ids[name] = category_id
+    return category_id
+
+
+def category_ids() -> Dict[str, int]:
+    """Текущий справочник имя -> id"""
+    return dict(_category_ids)
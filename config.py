@@ -41,9 +41,99 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Настройки шлюза к LLM
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # None - официальный API OpenAI
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '32'))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+
+# Минимальная уверенность локального разбора, при которой LLM не вызывается
+QUICK_PARSE_THRESHOLD = float(os.getenv('QUICK_PARSE_THRESHOLD', '0.8'))
+
+# Очередь напоминаний
+REMINDER_POLL_SECONDS = int(os.getenv('REMINDER_POLL_SECONDS', '30'))
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '100'))
+
+# Ежедневная сводка
+SUMMARY_BATCH_SIZE = int(os.getenv('SUMMARY_BATCH_SIZE', '1000'))
+
+# Еженедельный анализ финансов
+FINANCE_ANALYSIS_BATCH_SIZE = int(os.getenv('FINANCE_ANALYSIS_BATCH_SIZE', '500'))
+FINANCE_ANALYSIS_CONCURRENCY = int(os.getenv('FINANCE_ANALYSIS_CONCURRENCY', '8'))  # одновременных запросов к LLM
+
+# Хранение истории: секции financial_records и архив закрытых задач
+FINANCE_PARTITIONS_AHEAD = int(os.getenv('FINANCE_PARTITIONS_AHEAD', '2'))   # месяцев вперед
+TASK_ARCHIVE_AFTER_DAYS = int(os.getenv('TASK_ARCHIVE_AFTER_DAYS', '180'))
+TASK_ARCHIVE_BATCH_SIZE = int(os.getenv('TASK_ARCHIVE_BATCH_SIZE', '5000'))
+
+# Регулярные платежи
+REGULAR_PAYMENT_BATCH_SIZE = int(os.getenv('REGULAR_PAYMENT_BATCH_SIZE', '1000'))
+REGULAR_PAYMENT_MAX_FAILURES = int(os.getenv('REGULAR_PAYMENT_MAX_FAILURES', '3'))  # затем платеж отключается
+
+# Очередь исходящих сообщений Telegram
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))      # сообщений в секунду на бота
+TELEGRAM_PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))   # сообщений в секунду на чат
+TELEGRAM_SEND_WORKERS = int(os.getenv('TELEGRAM_SEND_WORKERS', '8'))
+TELEGRAM_SEND_QUEUE_SIZE = int(os.getenv('TELEGRAM_SEND_QUEUE_SIZE', '10000'))
+
+# Кэш сгенерированных сообщений
+MESSAGE_CACHE_TTL = int(os.getenv('MESSAGE_CACHE_TTL', '3600'))    # секунд
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', '5000'))  # записей в памяти процесса
+# Типы сообщений, для которых включен кэш (через запятую, пустая строка - кэш выключен)
+MESSAGE_CACHE_TYPES = {
+    message_type.strip()
+    for message_type in os.getenv(
+        'MESSAGE_CACHE_TYPES',
+        'task_reminder_regular,task_reminder_urgent,task_reminder_overdue,task_reminder_motivational'
+    ).split(',')
+    if message_type.strip()
+}
+
+# Кэш контекста пользователя для генерации сообщений
+USER_CONTEXT_TTL = int(os.getenv('USER_CONTEXT_TTL', '60'))                  # секунд
+USER_CONTEXT_CACHE_SIZE = int(os.getenv('USER_CONTEXT_CACHE_SIZE', '10000'))
+
+# Хранилище состояний FSM: postgres - таблица fsm_states, memory - только в памяти процесса
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'postgres')
+FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', '0.5'))            # секунд между записями пачкой
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', str(7 * 24 * 3600)))          # секунд бездействия до удаления
+FSM_CACHE_TTL = int(os.getenv('FSM_CACHE_TTL', '300'))                        # секунд в памяти процесса
+FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', '10000'))
+# Кэш чтения состояний: только если обновления пользователя всегда попадают в один процесс
+FSM_READ_CACHE = os.getenv('FSM_READ_CACHE', 'false').lower() == 'true'
+
+# Кэш известных пользователей и их тона
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '50000'))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '3600'))   # секунд
+
+# Индекс похожих выполненных задач (по пользователям)
+SIMILARITY_CACHE_SIZE = int(os.getenv('SIMILARITY_CACHE_SIZE', '1000'))   # пользователей
+SIMILARITY_CACHE_TTL = int(os.getenv('SIMILARITY_CACHE_TTL', '3600'))     # секунд
+
+# Ночной пересчет метрик пользователей (analytics_kernel)
+ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', '5000'))     # пользователей за запрос
+ANALYTICS_WINDOW_DAYS = int(os.getenv('ANALYTICS_WINDOW_DAYS', '90'))     # учитываемый период
+
+# Режим приема обновлений: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')                 # публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '64'))          # параллельно обрабатываемых пользователей
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '20'))     # обновлений в очереди одного воркера
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Метрики Prometheus: HTTP-экспортер /metrics (0 - выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = int(os.getenv('METRICS_PORT') or '0')
+
 # Проверяем обязательные переменные
 if not all([BOT_TOKEN, OPENAI_API_KEY, DATABASE_URL]):
     raise ValueError("Missing required environment variables. Check your .env file.")
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL is required when BOT_MODE=webhook.")
 
 def get_database_name():
     """
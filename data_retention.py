@@ -0,0 +1,167 @@
+# data_retention.py
+
+"""
+Обслуживание растущих таблиц: секции financial_records и архив задач.
+
+financial_records секционирована по месяцам поля date. Секции создаются
+заранее на FINANCE_PARTITIONS_AHEAD месяцев вперед; строки, попавшие в секцию
+по умолчанию до создания секции своего месяца, переносятся в нее. Запросы с
+условием по date читают только секции нужных месяцев.
+
+Выполненные и отмененные задачи старше TASK_ARCHIVE_AFTER_DAYS дней
+переносятся из tasks в completed_tasks пачками по TASK_ARCHIVE_BATCH_SIZE:
+одна пачка - один INSERT ... SELECT из DELETE ... RETURNING. Задачи целей не
+переносятся - по ним goal_progress сверяет счетчики целей. id задачи в
+архиве сохраняется, поэтому ее ключевые слова (task_keywords) остаются и
+похожие задачи ищутся по всей истории пользователя.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import List
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select, text, DateTime
+from config import FINANCE_PARTITIONS_AHEAD, TASK_ARCHIVE_AFTER_DAYS, TASK_ARCHIVE_BATCH_SIZE
+from database import get_db
+from date_utils import add_months
+from models import CompletedTask, Task, TaskCategory
+import logging
+import metrics
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = 'financial_records_default'
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"financial_records_{month:%Y_%m}"
+
+
+def partition_statements(month: date) -> List[str]:
+    """
+    DDL секции месяца: таблица создается отдельно, в нее переносятся строки
+    этого месяца из секции по умолчанию, после чего она подключается к
+    financial_records (иначе подключение упадет на строках в секции по умолчанию)
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    return [
+        f"CREATE TABLE {name} (LIKE financial_records INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= '{start}' AND date < '{end}' RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        f"ALTER TABLE financial_records ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')",
+    ]
+
+
+async def ensure_financial_partitions(months_ahead: int = FINANCE_PARTITIONS_AHEAD):
+    """Создает недостающие секции financial_records с текущего месяца на months_ahead вперед"""
+    current = month_start(date.today())
+    async with get_db() as session:
+        existing = set((await session.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'financial_records'::regclass"
+        ))).scalars().all())
+
+        created = []
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(month) in existing:
+                continue
+            for statement in partition_statements(month):
+                await session.execute(text(statement))
+            created.append(partition_name(month))
+        await session.commit()
+
+    if created:
+        logger.info(f"Созданы секции financial_records: {', '.join(created)}")
+
+
+def archive_batch_query(cutoff: datetime, batch_size: int, now: datetime):
+    """Переносит пачку закрытых до cutoff задач из tasks в completed_tasks, возвращает их id"""
+    closed = or_(
+        and_(Task.is_completed == True, func.coalesce(Task.completion_date, Task.due_date) < cutoff),
+        and_(Task.is_cancelled == True, func.coalesce(Task.cancellation_date, Task.due_date) < cutoff)
+    )
+    batch = (
+        select(Task.id)
+        .where(closed, Task.goal_id.is_(None))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    moved = (
+        delete(Task)
+        .where(Task.id.in_(batch))
+        .returning(
+            Task.id, Task.user_id, Task.title, Task.description, Task.category_id,
+            Task.is_completed, Task.completion_date, Task.due_date, Task.created_at, Task.priority,
+            Task.is_cancelled, Task.cancellation_date, Task.cancellation_reason
+        )
+        .cte('moved')
+    )
+    rows = (
+        select(
+            moved.c.id,
+            moved.c.user_id,
+            moved.c.title,
+            moved.c.description,
+            moved.c.completion_date,
+            moved.c.due_date,
+            TaskCategory.name,
+            case((moved.c.is_completed == True, moved.c.completion_date - moved.c.created_at)),
+            moved.c.created_at,
+            moved.c.priority,
+            func.coalesce(moved.c.is_cancelled, False),
+            moved.c.cancellation_date,
+            moved.c.cancellation_reason,
+            literal(now, DateTime)
+        )
+        .select_from(moved.outerjoin(TaskCategory, TaskCategory.id == moved.c.category_id))
+    )
+    return (
+        insert(CompletedTask)
+        .from_select(
+            ['id', 'user_id', 'title', 'description', 'completion_date', 'original_due_date',
+             'category', 'time_spent', 'created_at', 'priority', 'is_cancelled',
+             'cancellation_date', 'cancellation_reason', 'archived_at'],
+            rows
+        )
+        .returning(CompletedTask.id)
+    )
+
+
+async def archive_closed_tasks(after_days: int = TASK_ARCHIVE_AFTER_DAYS,
+                               batch_size: int = TASK_ARCHIVE_BATCH_SIZE) -> int:
+    """Переносит в архив задачи, закрытые больше after_days дней назад; возвращает их число"""
+    started = time.perf_counter()
+    now = datetime.now()
+    cutoff = now - timedelta(days=after_days)
+    archived = 0
+
+    while True:
+        # Каждая пачка - отдельная короткая транзакция
+        async with get_db() as session:
+            moved = (await session.execute(archive_batch_query(cutoff, batch_size, now))).scalars().all()
+            await session.commit()
+        archived += len(moved)
+        metrics.add_job_rows(len(moved))
+        if len(moved) < batch_size:
+            break
+
+    logger.info(f"В архив перенесено {archived} задач за {time.perf_counter() - started:.1f} с")
+    return archived
+
+
+async def run_maintenance():
+    """Ночное обслуживание: секции financial_records и архив задач"""
+    try:
+        await ensure_financial_partitions()
+    except Exception as e:
+        logger.error(f"Ошибка при создании секций financial_records: {e}", exc_info=True)
+    try:
+        await archive_closed_tasks()
+    except Exception as e:
+        logger.error(f"Ошибка при архивации задач: {e}", exc_info=True)
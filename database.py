@@ -10,11 +10,14 @@ import asyncio
 import logging
 from base import Base
 from sqlalchemy.exc import SQLAlchemyError
+import metrics
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=False)
 async_sessionmaker = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+# Время запросов и число запросов на сессию для /metrics
+metrics.instrument_engine(engine)
 
 async def init_db():
     """Инициализация базы данных без удаления существующих данных"""
@@ -31,8 +34,9 @@ async def init_db():
 async def get_db():
     for attempt in range(3):  # Попытки подключения
         try:
-            async with async_sessionmaker() as session:
-                yield session
+            with metrics.db_session():
+                async with async_sessionmaker() as session:
+                    yield session
             break  # Успешное подключение, выходим из цикла
         except SQLAlchemyError as e:
             if attempt == 2:
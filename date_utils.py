@@ -0,0 +1,42 @@
+# date_utils.py
+
+import calendar
+from datetime import date, datetime
+from typing import Optional, TypeVar
+
+Moment = TypeVar('Moment', date, datetime)
+
+# Периодичность регулярных платежей в месяцах
+FREQUENCY_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'annually': 12
+}
+
+
+def add_months(moment: Moment, months: int, day: Optional[int] = None) -> Moment:
+    """
+    Сдвигает дату на months календарных месяцев. День месяца сохраняется
+    (или берется day), а если в целевом месяце его нет - последний день
+    месяца: 31.01 + 1 месяц = 28.02 (29.02 в високосный год)
+    """
+    index = moment.year * 12 + moment.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    last_day = calendar.monthrange(year, month)[1]
+    return moment.replace(year=year, month=month, day=min(day or moment.day, last_day))
+
+
+def anchor_day(moment: Moment, start: Optional[Moment]) -> Optional[int]:
+    """
+    Исходный день месяца платежа по его start_date: 31, если moment (28.02)
+    был прижат к концу месяца. None - если start_date не соответствует
+    moment (у старых записей это дата создания) и день берется из moment
+    """
+    if start is None:
+        return None
+    if start.day == moment.day:
+        return start.day
+    if start.day > moment.day == calendar.monthrange(moment.year, moment.month)[1]:
+        return start.day
+    return None
@@ -4,6 +4,7 @@ from contextlib import contextmanager
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from datetime import datetime
+from typing import Any, Dict, Optional
 from message_utils import (
     generate_message, 
     send_personalized_message,
@@ -20,6 +21,10 @@ class DialogStates(StatesGroup):
 
 class DialogContext:
     """Хранение контекста диалога"""
+
+    # Версия формата to_dict; при изменении полей увеличить и научить from_dict старому формату
+    VERSION = 1
+
     def __init__(self):
         self.topic = None           # Тема обсуждения
         self.identified_issues = [] # Выявленные проблемы
@@ -28,13 +33,39 @@ class DialogContext:
         self.start_time = None      # Время начала диалога
         self.messages_count = 0     # Количество сообщений в диалоге
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Компактное представление для хранения в данных FSM"""
+        return {
+            "v": self.VERSION,
+            "t": self.topic,
+            "i": self.identified_issues,
+            "s": self.proposed_solutions,
+            "n": self.next_steps,
+            "st": int(self.start_time.timestamp()) if self.start_time else None,
+            "c": self.messages_count
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional['DialogContext']:
+        """Восстанавливает контекст из to_dict; None, если диалога нет или формат неизвестен"""
+        if not data or data.get("v") != cls.VERSION:
+            return None
+        context = cls()
+        context.topic = data.get("t")
+        context.identified_issues = data.get("i", [])
+        context.proposed_solutions = data.get("s", [])
+        context.next_steps = data.get("n", [])
+        context.start_time = datetime.fromtimestamp(data["st"]) if data.get("st") else None
+        context.messages_count = data.get("c", 0)
+        return context
+
 async def start_dialog_mode(message: types.Message, state: FSMContext, topic: str):
     """Начинает диалоговый режим с пользователем"""
     dialog_context = DialogContext()
     dialog_context.topic = topic
     dialog_context.start_time = datetime.now()
     
-    await state.set_data({"dialog_context": dialog_context})
+    await state.set_data({"dialog_context": dialog_context.to_dict()})
     await state.set_state(DialogStates.analyzing_problem)
     
     keyboard = InlineKeyboardMarkup(
@@ -77,7 +108,7 @@ async def handle_dialog_action(callback: types.CallbackQuery, state: FSMContext)
     """Обработчик действий в диалоге"""
     action = callback.data
     state_data = await state.get_data()
-    dialog_context: DialogContext = state_data.get("dialog_context")
+    dialog_context = DialogContext.from_dict(state_data.get("dialog_context"))
     
     if not dialog_context:
         await callback.answer("Диалог уже завершен")
@@ -129,7 +160,7 @@ async def handle_dialog_action(callback: types.CallbackQuery, state: FSMContext)
         await state.set_state(DialogStates.taking_break)
         prompt = f"""
         Тема диалога: {dialog_context.topic}
-        Длительность разговора: {(datetime.now() - dialog_context.start_time).minutes} минут
+        Длительность разговора: {int((datetime.now() - dialog_context.start_time).total_seconds() // 60)} минут
         
         Создай сообщение о перерыве, которое:
         1. Подытожит основные моменты обсуждения
@@ -163,7 +194,7 @@ async def handle_user_dialog_message(message: types.Message, state: FSMContext):
     """Обработчик сообщений пользователя в диалоге"""
     current_state = await state.get_state()
     state_data = await state.get_data()
-    dialog_context: DialogContext = state_data.get("dialog_context")
+    dialog_context = DialogContext.from_dict(state_data.get("dialog_context"))
     
     if not dialog_context or not current_state:
         return
@@ -195,7 +226,7 @@ async def handle_user_dialog_message(message: types.Message, state: FSMContext):
     elif current_state == DialogStates.setting_next_steps.state:
         dialog_context.next_steps.append(analysis.get('action_items', []))
     
-    await state.update_data({"dialog_context": dialog_context})
+    await state.update_data({"dialog_context": dialog_context.to_dict()})
     
     # Генерируем ответ на основе анализа
     response_prompt = f"""
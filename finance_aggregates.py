@@ -0,0 +1,99 @@
+# finance_aggregates.py
+
+"""
+Дневные суммы финансовых операций: таблица financial_daily_aggregates.
+
+Каждая новая запись financial_records прибавляется к строке (пользователь,
+день, валюта, категория, тип) одним upsert в той же транзакции, что и сама
+запись. Отчеты и советы читают суммы отсюда, поэтому их стоимость зависит от
+числа дней и категорий, а не от числа операций пользователя.
+
+rebuild_query пересчитывает суммы по financial_records целиком - для
+заполнения базы, загруженной в обход add_records.
+"""
+
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import Date, case, cast, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import FinancialDailyAggregate, FinancialRecord
+import logging
+
+logger = logging.getLogger(__name__)
+
+NO_CATEGORY = 'Без категории'
+UNKNOWN_CURRENCY = '?'
+
+KEY_COLUMNS = ('user_id', 'day', 'currency', 'category', 'type')
+
+
+def aggregate_rows(records: Iterable[FinancialRecord]) -> List[dict]:
+    """Записи, сгруппированные по ключу агрегата (в одном upsert ключ не должен повторяться)"""
+    rows: Dict[tuple, dict] = {}
+    for record in records:
+        key = (record.user_id, record.date.date(), record.currency or UNKNOWN_CURRENCY,
+               record.category or NO_CATEGORY, record.type)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = {**dict(zip(KEY_COLUMNS, key)), 'amount': 0.0, 'count': 0,
+                               'planned_amount': 0.0, 'savings_amount': 0.0}
+        amount = record.amount or 0.0
+        row['amount'] += amount
+        row['count'] += 1
+        if record.is_planned:
+            row['planned_amount'] += amount
+        if record.is_savings:
+            row['savings_amount'] += amount
+    return list(rows.values())
+
+
+async def add_records(session: AsyncSession, records: Iterable[FinancialRecord]):
+    """Прибавляет новые операции к дневным суммам (без commit); у записей должна быть задана date"""
+    rows = aggregate_rows(records)
+    if not rows:
+        return
+    stmt = insert(FinancialDailyAggregate).values(rows)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            column: getattr(FinancialDailyAggregate, column) + getattr(stmt.excluded, column)
+            for column in ('amount', 'count', 'planned_amount', 'savings_amount')
+        }
+    ))
+
+
+def rebuild_query(user_ids: Optional[List[int]] = None):
+    """INSERT ... SELECT, заменяющий дневные суммы пересчетом по financial_records"""
+    amount = func.coalesce(FinancialRecord.amount, 0.0)
+    key = (
+        FinancialRecord.user_id,
+        cast(FinancialRecord.date, Date),
+        func.coalesce(FinancialRecord.currency, UNKNOWN_CURRENCY),
+        func.coalesce(FinancialRecord.category, NO_CATEGORY),
+        FinancialRecord.type
+    )
+    totals = (
+        select(
+            *key,
+            func.sum(amount),
+            func.count(),
+            func.sum(case((FinancialRecord.is_planned == True, amount), else_=0.0)),
+            func.sum(case((FinancialRecord.is_savings == True, amount), else_=0.0))
+        )
+        .where(FinancialRecord.user_id.isnot(None), FinancialRecord.date.isnot(None),
+               FinancialRecord.type.isnot(None))
+        .group_by(*key)
+    )
+    if user_ids is not None:
+        totals = totals.where(FinancialRecord.user_id.in_(user_ids))
+
+    stmt = insert(FinancialDailyAggregate).from_select(
+        [*KEY_COLUMNS, 'amount', 'count', 'planned_amount', 'savings_amount'], totals
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            column: getattr(stmt.excluded, column)
+            for column in ('amount', 'count', 'planned_amount', 'savings_amount')
+        }
+    )
@@ -0,0 +1,115 @@
+# finance_analysis.py
+
+"""
+Подготовка данных для анализа финансов.
+
+Дневные суммы пачки пользователей (finance_aggregates) сворачиваются одним
+GROUP BY запросом до итогов по валюте, типу и категории; из этих строк
+собирается компактная сводка пользователя (итоги и баланс по валютам,
+запланированные и незапланированные расходы, крупнейшие категории). В LLM
+уходит только сводка, поэтому размер промпта не зависит от числа операций.
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, select
+from database import get_db
+from models import FinancialDailyAggregate
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько категорий расходов и доходов показывать в сводке; остальные - одной строкой
+TOP_CATEGORIES = 8
+
+
+def totals_query(user_ids: List[int], since: Optional[date] = None):
+    """Суммы и количество операций пользователей по валюте, типу и категории с дня since"""
+    aggregate = FinancialDailyAggregate
+    query = (
+        select(
+            aggregate.user_id,
+            aggregate.type,
+            aggregate.currency,
+            aggregate.category,
+            func.sum(aggregate.amount),
+            func.sum(aggregate.count),
+            func.sum(aggregate.planned_amount),
+            func.sum(aggregate.savings_amount)
+        )
+        .where(aggregate.user_id.in_(user_ids), aggregate.type.in_(('expense', 'income')))
+        .group_by(aggregate.user_id, aggregate.type, aggregate.currency, aggregate.category)
+    )
+    if since is not None:
+        query = query.where(aggregate.day >= since)
+    return query
+
+
+def _empty_currency() -> dict:
+    return {
+        'income': 0.0, 'expense': 0.0, 'income_count': 0, 'expense_count': 0,
+        'planned': 0.0, 'unplanned': 0.0, 'savings': 0.0,
+        'expense_categories': {}, 'income_categories': {}
+    }
+
+
+def build_summaries(rows: Iterable[tuple]) -> Dict[int, Dict[str, dict]]:
+    """Строки totals_query -> {user_id: {валюта: итоги}}"""
+    summaries: Dict[int, Dict[str, dict]] = {}
+    for user_id, record_type, currency, category, amount, count, planned, savings in rows:
+        totals = summaries.setdefault(user_id, {}).setdefault(currency, _empty_currency())
+        amount = float(amount or 0)
+        totals[record_type] += amount
+        totals[f'{record_type}_count'] += int(count)
+        categories = totals[f'{record_type}_categories']
+        category_amount, category_count = categories.get(category, (0.0, 0))
+        categories[category] = (category_amount + amount, category_count + int(count))
+        if record_type == 'expense':
+            totals['planned'] += float(planned or 0)
+            totals['unplanned'] += amount - float(planned or 0)
+            totals['savings'] += float(savings or 0)
+    return summaries
+
+
+def _money(value: float) -> str:
+    return f"{value:,.0f}".replace(',', ' ') if abs(value) >= 100 else f"{value:.2f}"
+
+
+def _categories_line(categories: Dict[str, tuple]) -> str:
+    ranked = sorted(categories.items(), key=lambda item: item[1][0], reverse=True)
+    parts = [f"{name} {_money(amount)} ({count})" for name, (amount, count) in ranked[:TOP_CATEGORIES]]
+    rest = ranked[TOP_CATEGORIES:]
+    if rest:
+        parts.append(f"прочие {len(rest)} кат. {_money(sum(amount for _, (amount, _) in rest))} "
+                     f"({sum(count for _, (_, count) in rest)})")
+    return ', '.join(parts)
+
+
+def format_summary(summary: Dict[str, dict]) -> str:
+    """Компактный текст сводки для промпта; в скобках - количество операций"""
+    lines = []
+    for currency, totals in sorted(summary.items()):
+        balance = totals['income'] - totals['expense']
+        lines.append(
+            f"{currency}: доходы {_money(totals['income'])} ({totals['income_count']}), "
+            f"расходы {_money(totals['expense'])} ({totals['expense_count']}), "
+            f"баланс {'+' if balance >= 0 else '-'}{_money(abs(balance))}"
+        )
+        if totals['expense_count']:
+            lines.append(
+                f"  запланированные {_money(totals['planned'])}, "
+                f"незапланированные {_money(totals['unplanned'])}, "
+                f"сбережения {_money(totals['savings'])}"
+            )
+            lines.append(f"  расходы по категориям: {_categories_line(totals['expense_categories'])}")
+        if totals['income_count']:
+            lines.append(f"  доходы по категориям: {_categories_line(totals['income_categories'])}")
+    return '\n'.join(lines)
+
+
+async def user_summary(user_id: int, since: Optional[date] = None) -> str:
+    """Сводка финансов одного пользователя (пустая строка, если операций нет)"""
+    async with get_db() as session:
+        rows = (await session.execute(totals_query([user_id], since))).all()
+    summary = build_summaries(rows).get(user_id)
+    return format_summary(summary) if summary else ''
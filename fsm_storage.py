@@ -0,0 +1,185 @@
+# fsm_storage.py
+
+"""
+Хранилище состояний FSM aiogram в таблице fsm_states.
+
+Запись отложенная: изменения копятся и раз в FSM_FLUSH_INTERVAL уходят в
+базу одним INSERT ... ON CONFLICT (очищенные состояния - одним DELETE). При
+остановке бота накопленное записывается сразу. Состояния, не менявшиеся
+дольше FSM_STATE_TTL, считаются истекшими и удаляются задачей планировщика
+purge_expired.
+
+Чтение по умолчанию идет в базу (свои незаписанные изменения процесс видит
+сразу), поэтому состояние видно всем процессам бота не позже чем через
+FSM_FLUSH_INTERVAL. Кэш чтения в памяти процесса включается FSM_READ_CACHE
+и допустим, только если обновления одного пользователя всегда обрабатывает
+один процесс; иначе другой процесс может читать состояние, устаревшее на
+FSM_CACHE_TTL.
+"""
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import func, select, delete
+from sqlalchemy.dialects.postgresql import insert
+from cache_utils import TTLCache
+from config import FSM_FLUSH_INTERVAL, FSM_STATE_TTL, FSM_CACHE_TTL, FSM_CACHE_SIZE, FSM_READ_CACHE
+from database import get_db
+from models import FSMStateRecord
+import asyncio
+import copy
+import json
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# (state, data) одного ключа
+Record = Tuple[Optional[str], Dict[str, Any]]
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище FSM в PostgreSQL с кэшем чтения и пакетной записью"""
+
+    def __init__(self, key_builder: Optional[KeyBuilder] = None,
+                 flush_interval: float = FSM_FLUSH_INTERVAL,
+                 state_ttl: int = FSM_STATE_TTL,
+                 read_cache: bool = FSM_READ_CACHE):
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.flush_interval = flush_interval
+        self.state_ttl = timedelta(seconds=state_ttl)
+        self._cache = TTLCache(maxsize=FSM_CACHE_SIZE, ttl=FSM_CACHE_TTL) if read_cache else None
+        self._pending: Dict[str, Record] = {}
+        # Пачка, которая сейчас записывается: до commit база отдает прежние значения
+        self._flushing: Dict[str, Record] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        metrics.register_collector(self.collect_metrics)
+
+    async def _load(self, key: str) -> Record:
+        record = self._pending.get(key) or self._flushing.get(key)
+        if record is None and self._cache is not None:
+            record = self._cache.get(key)
+        if record is not None:
+            return record
+
+        async with get_db() as session:
+            row = (await session.execute(
+                select(FSMStateRecord.state, FSMStateRecord.data)
+                .where(
+                    FSMStateRecord.key == key,
+                    FSMStateRecord.updated_at > datetime.now() - self.state_ttl
+                )
+            )).one_or_none()
+        record = (row.state, row.data or {}) if row else (None, {})
+        if self._cache is not None:
+            self._cache.set(key, record)
+        return record
+
+    def _store(self, key: str, record: Record):
+        if self._cache is not None:
+            self._cache.set(key, record)
+        self._pending[key] = record
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        _, data = await self._load(storage_key)
+        self._store(storage_key, (state.state if isinstance(state, State) else state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        # Ошибка сериализации должна случиться здесь, а не при отложенной записи
+        try:
+            json.dumps(data)
+        except TypeError as e:
+            raise TypeError(f"Данные FSM должны сериализоваться в JSON: {e}") from e
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._load(storage_key)
+        self._store(storage_key, (state, copy.deepcopy(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return copy.deepcopy(data)
+
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Записывает накопленные изменения в базу"""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            self._flushing = batch
+            now = datetime.now()
+            cleared = [key for key, (state, data) in batch.items() if state is None and not data]
+            rows = [
+                {'key': key, 'state': state, 'data': data, 'updated_at': now}
+                for key, (state, data) in batch.items() if state is not None or data
+            ]
+            try:
+                async with get_db() as session:
+                    if rows:
+                        stmt = insert(FSMStateRecord).values(rows)
+                        await session.execute(stmt.on_conflict_do_update(
+                            index_elements=[FSMStateRecord.key],
+                            set_={
+                                'state': stmt.excluded.state,
+                                'data': stmt.excluded.data,
+                                'updated_at': stmt.excluded.updated_at
+                            }
+                        ))
+                    if cleared:
+                        await session.execute(delete(FSMStateRecord).where(FSMStateRecord.key.in_(cleared)))
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Ошибка при записи состояний FSM ({len(batch)} ключей): {e}")
+                # Возвращаем в очередь то, что не успели перезаписать более новыми значениями
+                for key, record in batch.items():
+                    self._pending.setdefault(key, record)
+            finally:
+                self._flushing = {}
+
+    async def collect_metrics(self):
+        """Количество активных ключей по состояниям (для /metrics); незаписанные изменения не учитываются"""
+        async with get_db() as session:
+            rows = (await session.execute(
+                select(FSMStateRecord.state, func.count())
+                .where(
+                    FSMStateRecord.state.isnot(None),
+                    FSMStateRecord.updated_at > datetime.now() - self.state_ttl
+                )
+                .group_by(FSMStateRecord.state)
+            )).all()
+        metrics.FSM_STATES.clear()
+        for state, count in rows:
+            metrics.FSM_STATES.set(count, state=state)
+
+    async def close(self) -> None:
+        # Сначала дописываем накопленное (дождавшись текущей записи), потом останавливаем цикл
+        await self.flush()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+
+async def purge_expired(state_ttl: int = FSM_STATE_TTL):
+    """Удаляет состояния, не менявшиеся дольше state_ttl секунд"""
+    async with get_db() as session:
+        result = await session.execute(
+            delete(FSMStateRecord)
+            .where(FSMStateRecord.updated_at <= datetime.now() - timedelta(seconds=state_ttl))
+        )
+        await session.commit()
+    metrics.add_job_rows(result.rowcount)
+    logger.info(f"Удалено {result.rowcount} истекших состояний FSM")
@@ -0,0 +1,169 @@
+# goal_progress.py
+
+"""
+Счетчики задач цели: goals.tasks_total и goals.tasks_completed.
+
+Вместо пересчета всех задач цели при каждом выполнении счетчики меняются
+одним UPDATE в той же транзакции, что и сама задача; прогресс в процентах
+вычисляется там же. Отмененные задачи в счетчики не входят.
+
+Флаг задачи меняется условным UPDATE ... WHERE NOT is_completed RETURNING,
+и счетчики трогаются, только если строка вернулась: из двух одновременных
+нажатий "Выполнено" засчитывается одно.
+
+Раз в сутки check_consistency сверяет счетчики с таблицей tasks и исправляет
+расхождения (например, после ручных правок в базе).
+"""
+
+from sqlalchemy import DateTime, Integer, Interval, and_, case, cast, func, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from datetime import datetime
+from database import get_db
+from models import Goal, Task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _progress(total, completed):
+    """Прогресс в целых процентах для новых значений счетчиков"""
+    return case((total > 0, completed * 100 // total), else_=0)
+
+
+async def adjust_counters(session: AsyncSession, goal_id: int,
+                          total_delta: int = 0, completed_delta: int = 0):
+    """Атомарно меняет счетчики цели и ее прогресс (без commit)"""
+    total = Goal.tasks_total + total_delta
+    completed = Goal.tasks_completed + completed_delta
+    await session.execute(
+        update(Goal)
+        .where(Goal.id == goal_id)
+        .values(tasks_total=total, tasks_completed=completed, progress=_progress(total, completed))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _set_loaded(task: Task, **values):
+    """Переносит записанные UPDATE значения в ORM-объект, не помечая его измененным"""
+    for key, value in values.items():
+        set_committed_value(task, key, value)
+
+
+async def complete_task(session: AsyncSession, task: Task, now: datetime) -> bool:
+    """
+    Помечает задачу выполненной и обновляет счетчики ее цели (без commit).
+    False - задачу уже выполнили или отменили (в том числе параллельный запрос)
+    """
+    values = {'is_completed': True, 'completion_date': now}
+    row = (await session.execute(
+        update(Task)
+        .where(Task.id == task.id, Task.is_completed.isnot(True), Task.is_cancelled.isnot(True))
+        .values(**values)
+        .returning(Task.goal_id)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    if row is None:
+        return False
+    _set_loaded(task, **values)
+    if row.goal_id:
+        await adjust_counters(session, row.goal_id, completed_delta=1)
+    return True
+
+
+async def cancel_task(session: AsyncSession, task: Task, now: datetime, reason: str) -> bool:
+    """
+    Помечает задачу отмененной и обновляет счетчики ее цели (без commit).
+    False - задачу уже отменили
+    """
+    values = {'is_cancelled': True, 'cancellation_date': now, 'cancellation_reason': reason}
+    row = (await session.execute(
+        update(Task)
+        .where(Task.id == task.id, Task.is_cancelled.isnot(True))
+        .values(**values)
+        .returning(Task.goal_id, Task.is_completed)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    if row is None:
+        return False
+    _set_loaded(task, **values)
+    if row.goal_id:
+        await adjust_counters(session, row.goal_id, total_delta=-1,
+                              completed_delta=-1 if row.is_completed else 0)
+    return True
+
+
+def actual_counts_query():
+    """Фактические счетчики по таблице tasks для каждой цели"""
+    return (
+        select(
+            Goal.id.label('goal_id'),
+            func.count(Task.id).filter(Task.is_cancelled.isnot(True)).label('total'),
+            func.count(Task.id).filter(and_(Task.is_completed == True, Task.is_cancelled.isnot(True))).label('completed')
+        )
+        .select_from(Goal)
+        .outerjoin(Task, Task.goal_id == Goal.id)
+        .group_by(Goal.id)
+        .subquery()
+    )
+
+
+async def check_consistency():
+    """Исправляет цели, у которых счетчики разошлись с задачами"""
+    actual = actual_counts_query()
+    async with get_db() as session:
+        result = await session.execute(
+            update(Goal)
+            .where(
+                Goal.id == actual.c.goal_id,
+                or_(
+                    Goal.tasks_total.is_distinct_from(actual.c.total),
+                    Goal.tasks_completed.is_distinct_from(actual.c.completed)
+                )
+            )
+            .values(
+                tasks_total=actual.c.total,
+                tasks_completed=actual.c.completed,
+                progress=_progress(actual.c.total, actual.c.completed)
+            )
+            .returning(Goal.id)
+            .execution_options(synchronize_session=False)
+        )
+        fixed = result.scalars().all()
+        await session.commit()
+
+    if fixed:
+        logger.warning(f"Исправлены счетчики задач у {len(fixed)} целей: {fixed[:20]}")
+    else:
+        logger.info("Счетчики задач целей согласованы")
+
+
+def reschedule_subsequent_query(task: Task, now):
+    """
+    Один UPDATE вместо загрузки задач: невыполненные задачи цели после task
+    равномерно распределяются от now до дедлайна цели
+    """
+    subsequent = (
+        select(
+            Task.id,
+            func.row_number().over(order_by=Task.order).label('position'),
+            func.count().over().label('remaining')
+        )
+        .where(
+            Task.goal_id == task.goal_id,
+            Task.order > task.order,
+            Task.is_completed == False
+        )
+        .subquery()
+    )
+    days_left = cast(func.date_part('day', Goal.deadline - now), Integer)
+    days_per_task = func.greatest(1, days_left // (subsequent.c.remaining + 1))
+    return (
+        update(Task)
+        .where(Task.id == subsequent.c.id, Goal.id == task.goal_id)
+        .values(due_date=func.least(
+            literal(now, DateTime) + func.make_interval(0, 0, 0, days_per_task * subsequent.c.position, type_=Interval),
+            Goal.deadline
+        ))
+        .execution_options(synchronize_session=False)
+    )
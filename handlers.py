@@ -8,8 +8,6 @@ from aiogram.types import (
     ReplyKeyboardMarkup, 
     ReplyKeyboardRemove, 
     FSInputFile, 
-    InlineKeyboardButton, 
-    InlineKeyboardMarkup, 
     KeyboardButton
 )
 from database import get_db
@@ -19,18 +17,25 @@ from models import (
     CompletedTask, 
     FinancialRecord, 
     Goal, 
-    TaskCategory, 
     Milestone, 
     RegularPayment
 )
 from ai_module import parse_message, generate_goal_steps
-from message_utils import generate_message, send_personalized_message
+from message_utils import generate_message
 from datetime import datetime, timedelta
 from sqlalchemy import select, func
 import logging
 import matplotlib.pyplot as plt
 import io
-from scheduler import send_task_reminder, scheduler
+from reminder_queue import schedule_reminder, cancel_reminder
+from user_context import invalidate_user_context
+from user_registry import ensure_user, set_tone
+import goal_progress
+import task_similarity
+import finance_aggregates
+import finance_analysis
+import metrics
+from category_registry import DEFAULT_CATEGORY, normalize_name as normalize_category_name, resolve_category_id
 import json
 from aiogram.filters import Command, CommandObject
 from tone import get_message
@@ -101,18 +106,12 @@ async def process_available_time(message: types.Message, state: FSMContext):
     available_time = message.text
     
     try:
+        user_id = message.from_user.id
+        await ensure_user(user_id)
         async with get_db() as session:
-            user = await session.execute(select(User).where(User.user_id == message.from_user.id))
-            user = user.scalar_one_or_none()
-
-            if not user:
-                user = User(user_id=message.from_user.id)
-                session.add(user)
-                await session.flush()
-
             # Создаем цель с учетом опыта и доступного времени
             new_goal = Goal(
-                user_id=user.user_id,
+                user_id=user_id,
                 title=goal_title,
                 user_experience=experience,
                 available_time=available_time,
@@ -132,7 +131,7 @@ async def process_available_time(message: types.Message, state: FSMContext):
             # Создаем задачи и milestone'ы
             for task_info in plan['tasks']:
                 new_task = Task(
-                    user_id=user.user_id,
+                    user_id=user_id,
                     goal_id=new_goal.id,
                     title=task_info['title'],
                     description=task_info['description'],
@@ -155,7 +154,9 @@ async def process_available_time(message: types.Message, state: FSMContext):
                 )
                 session.add(new_milestone)
 
+            new_goal.tasks_total = len(plan['tasks'])
             await session.commit()
+            invalidate_user_context(user_id)
 
             # Формируем ответ с планом
             response = format_goal_plan(plan)
@@ -227,16 +228,8 @@ async def process_message(message: types.Message):
     logger.info(f"Получено сообщение от пользователя {user_id}: {message.text}")
     
     try:
-        # Получаем тон общения пользователя
-        async with get_db() as session:
-            user = await session.execute(select(User).where(User.user_id == user_id))
-            user = user.scalar_one_or_none()
-            if not user:
-                user = User(user_id=user_id, tone='neutral')
-                session.add(user)
-                await session.commit()
-            
-            user_tone = user.tone
+        # Получаем тон общения пользователя (новый пользователь создается здесь же)
+        user_tone = await ensure_user(user_id)
         
         parsed_data = await parse_message(message.text)
         logger.info(f"Результат парсинга сообщения: {parsed_data}")
@@ -267,55 +260,28 @@ async def handle_task(user_id: int, task_data: dict, bot) -> str:
     due_date = datetime.fromisoformat(task_data['due_date'])
     priority = task_data.get('priority', 'medium')
 
+    await ensure_user(user_id)
+    # Категория берется из справочника в памяти, новая создается upsert'ом
+    category_name = normalize_category_name(task_data.get('category') or DEFAULT_CATEGORY)
+    category_id = await resolve_category_id(category_name)
     async with get_db() as session:
         try:
-            # Проверяем существование пользователя
-            user = await session.execute(select(User).where(User.user_id == user_id))
-            user = user.scalar_one_or_none()
-
-            if not user:
-                user = User(user_id=user_id)
-                session.add(user)
-                await session.flush()
-            
-            # Ищем или создаем категорию
-            category_name = task_data.get('category', 'Общее')
-            category = await session.execute(
-                select(TaskCategory).where(TaskCategory.name == category_name)
-            )
-            category = category.scalar_one_or_none()
-            
-            if not category:
-                category = TaskCategory(
-                    name=category_name,
-                    description=f"Категория для задач типа {category_name}"
-                )
-                session.add(category)
-                await session.flush()
-
             # Создаем новую задачу
             new_task = Task(
-                user_id=user_id, 
-                title=title, 
+                user_id=user_id,
+                title=title,
                 due_date=due_date,
                 priority=priority,
-                category_id=category.id  # Используем category_id вместо category
+                category_id=category_id
             )
+            # Напоминание хранится в базе и переживет перезапуск бота
+            schedule_reminder(new_task, due_date)
             session.add(new_task)
             await session.commit()
+            invalidate_user_context(user_id)
             
             logger.info(f"New task added: {new_task.title}, due date: {new_task.due_date}")
 
-            # Добавляем джоб в планировщик
-            job = scheduler.add_job(
-                send_task_reminder,
-                trigger='date',
-                run_date=new_task.due_date,
-                args=[bot, user.user_id, new_task.id]
-            )
-            new_task.scheduler_job_id = job.id
-            await session.commit()
-
             return (f"Отлично! Я добавил новую задачу:\n"
                     f"Название: {title}\n"
                     f"Срок: {due_date.strftime('%d.%m.%Y %H:%M')}\n"
@@ -329,17 +295,9 @@ async def handle_task(user_id: int, task_data: dict, bot) -> str:
             return "Извините, произошла ошибка при добавлении задачи. Пожалуйста, попробуйте еще раз позже."
 async def handle_finance(user_id: int, finance_data: dict) -> str:
     logger.info(f"Обработка финансовой операции для пользователя {user_id}: {finance_data}")
+    await ensure_user(user_id)
     async with get_db() as session:
         try:
-            user = await session.execute(select(User).where(User.user_id == user_id))
-            user = user.scalar_one_or_none()
-
-            if not user:
-                user = User(user_id=user_id)
-                session.add(user)
-                await session.flush()
-                logger.info(f"Создан новый пользователь с id {user_id}")
-
             new_record = FinancialRecord(
                 user_id=user_id,
                 amount=finance_data['amount'],
@@ -347,9 +305,11 @@ async def handle_finance(user_id: int, finance_data: dict) -> str:
                 category=finance_data['category'],
                 description=finance_data['description'],
                 type=finance_data['type'],  # 'income' или 'expense'
-                is_savings=finance_data.get('is_savings', False)
+                is_savings=finance_data.get('is_savings', False),
+                date=datetime.now()
             )
             session.add(new_record)
+            await finance_aggregates.add_records(session, [new_record])
             await session.commit()
             logger.info(f"Добавлена новая финансовая запись: {new_record}")
 
@@ -371,6 +331,7 @@ async def add_regular_payment(user_id: int, payment_data: dict) -> str:
             if not user:
                 return "Пользователь не найден."
 
+            next_payment_date = datetime.fromisoformat(payment_data['next_payment_date'])
             new_payment = RegularPayment(
                 user_id=user_id,
                 amount=payment_data['amount'],
@@ -378,7 +339,8 @@ async def add_regular_payment(user_id: int, payment_data: dict) -> str:
                 category=payment_data['category'],
                 description=payment_data['description'],
                 frequency=payment_data['frequency'],
-                next_payment_date=datetime.fromisoformat(payment_data['next_payment_date'])
+                next_payment_date=next_payment_date,
+                start_date=next_payment_date  # Исходный день месяца для date_utils.anchor_day
             )   
             session.add(new_payment)
             await session.commit()
@@ -394,16 +356,8 @@ async def add_regular_payment(user_id: int, payment_data: dict) -> str:
 async def handle_goal(message: types.Message, goal_data: dict) -> str:
     user_id = message.from_user.id
     try:
+        await ensure_user(user_id)
         async with get_db() as session:
-            # Проверяем существование пользователя
-            user = await session.execute(select(User).where(User.user_id == user_id))
-            user = user.scalar_one_or_none()
-
-            if not user:
-                user = User(user_id=user_id)
-                session.add(user)
-                await session.flush()
-
             deadline = datetime.fromisoformat(goal_data['deadline'])
             new_goal = Goal(
                 user_id=user_id,
@@ -446,7 +400,9 @@ async def handle_goal(message: types.Message, goal_data: dict) -> str:
                 )
                 session.add(new_task)
 
+            new_goal.tasks_total = len(plan['tasks'])
             await session.commit()
+            invalidate_user_context(user_id)
 
             # Формируем ответ
             return format_goal_plan(plan)
@@ -461,33 +417,8 @@ async def update_task_deadline(task: Task, session):
     """
     if not task.goal_id:
         return
-        
-    subsequent_tasks = await session.execute(
-        select(Task)
-        .where(
-            Task.goal_id == task.goal_id,
-            Task.order > task.order,
-            Task.is_completed == False
-        )
-        .order_by(Task.order)
-    )
-    subsequent_tasks = subsequent_tasks.scalars().all()
-
-    if not subsequent_tasks:
-        return
 
-    goal = await session.get(Goal, task.goal_id)
-    remaining_time = (goal.deadline - datetime.now()).days
-    if remaining_time <= 0:
-        days_per_task = 1
-    else:
-        days_per_task = max(1, remaining_time // (len(subsequent_tasks) + 1))
-
-    current_date = datetime.now()
-    for subsequent_task in subsequent_tasks:
-        current_date += timedelta(days=days_per_task)
-        subsequent_task.due_date = min(current_date, goal.deadline)
-        session.add(subsequent_task)
+    await session.execute(goal_progress.reschedule_subsequent_query(task, datetime.now()))
 
 # Команды управления задачами
 async def show_tasks(message: types.Message):
@@ -514,76 +445,6 @@ async def edit_task_command(message: types.Message, state: FSMContext):
     await message.answer("Укажите ID задачи для редактирования. Посмотреть задачи можно командой /tasks.")
 
 
-async def update_goal_progress(goal_id: int, session):
-    """
-    Обновляет прогресс цели на основе выполненных задач
-    """
-    try:
-        # Получаем все задачи цели
-        tasks = await session.execute(
-            select(Task).where(Task.goal_id == goal_id)
-        )
-        tasks = tasks.scalars().all()
-        
-        if not tasks:
-            return
-        
-        # Вычисляем процент выполнения
-        completed = sum(1 for task in tasks if task.is_completed)
-        progress = (completed / len(tasks)) * 100
-
-        # Обновляем прогресс цели
-        goal = await session.get(Goal, goal_id)
-        if goal:
-            goal.progress = progress
-            session.add(goal)
-            await session.commit()
-
-    except Exception as e:
-        logger.error(f"Ошибка при обновлении прогресса цели: {e}")
-        await session.rollback()
-
-async def send_task_reminder(bot, user_id, task_id):
-    logger.info(f"Начало отправки напоминания для задачи {task_id} пользователю {user_id}")
-    try:
-        async with get_db() as session:
-            task = await session.get(Task, task_id)
-            user = await session.get(User, user_id)
-
-        if task and not task.is_completed:
-            # Генерируем сообщение
-            message_data = {
-                'task_title': task.title,
-                'due_date': task.due_date.strftime('%d.%m.%Y %H:%M')
-            }
-            message = await generate_message(
-                user_id,
-                'task_reminder_regular',
-                **message_data
-            )
-            logger.info(f"Сгенерированное сообщение: {message}")
-
-            if not message.strip():
-                logger.error("Сгенерированное сообщение пустое")
-                message = "Напоминание о задаче."
-
-            # Создаем клавиатуру с кнопкой завершения
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="✅ Выполнено", callback_data=f"complete_{task_id}")]
-            ])
-
-            try:
-                await bot.send_message(
-                    chat_id=user_id, 
-                    text=message,
-                    reply_markup=keyboard
-                )
-                logger.info(f"Напоминание отправлено для задачи: {task.title}")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке напоминания: {e}")
-    except Exception as e:
-        logger.error(f"Ошибка при отправке напоминания: {e}")
-
 async def handle_task_callback(callback: types.CallbackQuery):
     """Обработчик всех callback-кнопок для задач"""
     try:
@@ -603,29 +464,35 @@ async def handle_task_callback(callback: types.CallbackQuery):
                 return
             
             if action == 'complete':
-                task.is_completed = True
-                task.completion_date = datetime.now()
+                if not await goal_progress.complete_task(session, task, datetime.now()):
+                    await callback.answer("Задача уже выполнена или отменена")
+                    return
+                await task_similarity.index_completed_task(session, task)
+                cancel_reminder(task)
                 message = "✅ Задача выполнена!"
                 
             elif action == 'remind':
                 hours = int(params[0][:-1])  # Убираем 'h' из строки
                 next_reminder = datetime.now() + timedelta(hours=hours)
-                task.next_reminder = next_reminder
+                schedule_reminder(task, next_reminder)
                 message = f"⏰ Напомню через {hours} час(ов)"
                 
             elif action == 'postpone':
                 days = int(params[0][:-1])  # Убираем 'd' из строки
                 task.due_date = datetime.now() + timedelta(days=days)
+                schedule_reminder(task, task.due_date)
                 message = f"📅 Задача перенесена на {task.due_date.strftime('%d.%m.%Y')}"
                 
             elif action == 'cancel':
                 # Не удаляем задачу, а помечаем как отмененную
-                task.is_cancelled = True
-                task.cancellation_date = datetime.now()
-                task.cancellation_reason = "Отменено пользователем"
+                if not await goal_progress.cancel_task(session, task, datetime.now(), "Отменено пользователем"):
+                    await callback.answer("Задача уже отменена")
+                    return
+                cancel_reminder(task)
                 message = "❌ Задача отменена"
             
             await session.commit()
+            invalidate_user_context(task.user_id)
             
             # Обновляем сообщение, убирая кнопки
             await callback.message.edit_text(
@@ -678,13 +545,15 @@ async def complete_task_command(message: types.Message, command: CommandObject):
                 await message.answer("Сначала необходимо выполнить предыдущие задачи цели")
                 return
 
-        task.is_completed = True
+        # Прогресс цели и сроки следующих задач меняются в той же транзакции
+        if not await goal_progress.complete_task(session, task, datetime.now()):
+            await message.answer("Задача уже выполнена или отменена")
+            return
+        cancel_reminder(task)
+        await task_similarity.index_completed_task(session, task)
+        await update_task_deadline(task, session)
         await session.commit()
-
-        # Если задача привязана к цели, обновляем прогресс
-        if task.goal_id:
-            await update_task_deadline(task, session)
-            await update_goal_progress(task.goal_id, session)
+        invalidate_user_context(task.user_id)
 
         await message.answer(f"Задача '{task.title}' отмечена как выполненная")
 
@@ -723,20 +592,10 @@ async def tone_selected(message: types.Message, state: FSMContext):
     selected_tone = tone_mapping.get(message.text)
     
     if selected_tone:
-        async with get_db() as session:
-            user = await session.execute(select(User).where(User.user_id == message.from_user.id))
-            user = user.scalar_one_or_none()
-            
-            if not user:
-                user = User(user_id=message.from_user.id)
-                session.add(user)
-            
-            user.tone = selected_tone
-            await session.commit()
-            
-            response = get_message(selected_tone, 'tone_updated',
-                message="Тон общения успешно обновлен")
-            await message.answer(response, reply_markup=ReplyKeyboardRemove())
+        await set_tone(message.from_user.id, selected_tone)
+        response = get_message(selected_tone, 'tone_updated',
+            message="Тон общения успешно обновлен")
+        await message.answer(response, reply_markup=ReplyKeyboardRemove())
     else:
         await message.answer("Пожалуйста, выберите тон из предложенных вариантов.")
     
@@ -777,14 +636,9 @@ async def suggest_resources(message: types.Message):
 async def financial_advice_command(message: types.Message):
     user_id = message.from_user.id
     try:
-        async with get_db() as session:
-            user = await session.get(User, user_id)
-            financial_records = await session.execute(
-                select(FinancialRecord).where(FinancialRecord.user_id == user_id)
-            )
-            records = financial_records.scalars().all()
-        
-        advice = await send_personalized_message(message.bot, user_id, 'financial_advice', records=records)
+        # Сводка по дневным суммам, а не по всем операциям пользователя
+        summary = await finance_analysis.user_summary(user_id)
+        advice = await generate_message(user_id, 'financial_advice', finance_summary=summary)
         await message.answer(advice)
     except Exception as e:
         logger.error(f"Ошибка при генерации финансового совета для пользователя {user_id}: {e}", exc_info=True)
@@ -824,6 +678,9 @@ async def start_planning_dialog(message: types.Message, state: FSMContext):
 
 # Регистрация обработчиков
 def register_handlers(router: Router):
+    # Время и ошибки обработчиков для /metrics
+    router.message.middleware(metrics.HandlerMetricsMiddleware())
+    router.callback_query.middleware(metrics.HandlerMetricsMiddleware())
     router.message.register(start_command, Command("start"))
     router.message.register(show_tasks, Command("tasks"))
     router.message.register(edit_task_command, Command("edit"))
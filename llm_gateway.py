@@ -0,0 +1,90 @@
+# llm_gateway.py
+
+import asyncio
+import logging
+import time
+import httpx
+import metrics
+from openai import AsyncOpenAI
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# Общий пул соединений для всех обращений к LLM
+_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS
+    ),
+    timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0)
+)
+
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    http_client=_http_client,
+    max_retries=2
+)
+
+# Ограничение числа одновременных запросов к API
+_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+_in_flight = 0
+
+
+async def create_chat_completion(call_site: str, **kwargs):
+    """
+    Выполняет запрос chat.completions с ограничением параллелизма.
+    Принимает те же аргументы, что и client.chat.completions.create;
+    call_site - метка места вызова для метрик
+    """
+    global _in_flight
+    async with _semaphore:
+        _in_flight += 1
+        started = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(**kwargs)
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(call_site=call_site, error=type(e).__name__)
+            raise
+        finally:
+            _in_flight -= 1
+            metrics.LLM_DURATION.observe(time.perf_counter() - started, call_site=call_site)
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, call_site=call_site, kind='prompt')
+        metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, call_site=call_site, kind='completion')
+    return response
+
+
+async def complete(call_site: str, messages: list, model: str = "gpt-4o-mini", **kwargs) -> str:
+    """Возвращает текст первого варианта ответа модели"""
+    response = await create_chat_completion(call_site, model=model, messages=messages, **kwargs)
+    return response.choices[0].message.content.strip()
+
+
+def in_flight() -> int:
+    """Количество запросов, выполняющихся прямо сейчас"""
+    return _in_flight
+
+
+def is_saturated() -> bool:
+    """Все слоты параллелизма заняты"""
+    return _semaphore.locked()
+
+
+async def _collect_metrics():
+    metrics.LLM_IN_FLIGHT.set(_in_flight)
+
+
+metrics.register_collector(_collect_metrics)
+
+
+async def close():
+    """Закрывает пул соединений"""
+    await client.close()
@@ -4,10 +4,18 @@ import asyncio
 import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
+from config import BOT_TOKEN, FSM_STORAGE, BOT_MODE
+from fsm_storage import PostgresStorage
 from handlers import register_handlers
 from scheduler import start_scheduler
 from database import init_db, close_db
+from category_registry import seed_categories
+from data_retention import ensure_financial_partitions
+import reminder_policy
+from webhook import run_webhook
+import llm_gateway
+import telegram_sender
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,10 +23,17 @@ logger = logging.getLogger(__name__)
 async def main():
     # Инициализация базы данных
     await init_db()
+    # Категории по умолчанию и справочник имя -> id для создания задач
+    await seed_categories()
+    # Секция financial_records текущего месяца должна существовать до первой записи
+    await ensure_financial_partitions()
+    # Эффективность напоминаний пользователей для расчета интервалов
+    await reminder_policy.refresh()
     
     # Инициализация бота и диспетчера
     bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
+    # Состояния сценариев хранятся в базе и переживают перезапуск бота
+    storage = PostgresStorage() if FSM_STORAGE == 'postgres' else MemoryStorage()
     dp = Dispatcher(storage=storage)
     
     # Регистрация обработчиков
@@ -26,15 +41,25 @@ async def main():
     
     # Запуск планировщика
     scheduler = start_scheduler(bot)
+    # Экспортер /metrics (если задан METRICS_PORT)
+    await metrics.start_exporter()
     
     try:
         # Запуск бота
-        await dp.start_polling(bot)
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
     except Exception as e:
         logger.exception(f"Произошла ошибка: {e}")
     finally:
         # Корректное завершение работы
+        await telegram_sender.close()
+        # Накопленные изменения состояний FSM записываются в базу
+        await dp.storage.close()
+        await metrics.stop_exporter()
         await bot.session.close()
+        await llm_gateway.close()
         await close_db()
 
 if __name__ == '__main__':
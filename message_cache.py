@@ -0,0 +1,163 @@
+# message_cache.py
+
+"""
+Кэш сообщений, сгенерированных LLM.
+
+Ключ строится из типа сообщения, тона, всех нормализованных параметров
+generate_message (кроме явно перечисленных в NON_PROMPT_KWARGS, которые в
+промпт не попадают) и огрубленного контекста пользователя (загрузка, стресс,
+число задач, время суток). Новый параметр промпта попадает в ключ сам собой -
+сообщение одного пользователя не достанется другому.
+Два уровня: LRU-кэш в памяти процесса и таблица message_cache, общая для всех
+процессов бота. Кэширование включается отдельно для каждого типа сообщений.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from cache_utils import TTLCache
+from config import MESSAGE_CACHE_TTL, MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TYPES
+from database import get_db
+from models import MessageCacheEntry
+import hashlib
+import json
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Параметры generate_message, которые не попадают в промпты: в ключ не входят,
+# чтобы не дробить кэш (число прошлых напоминаний растет с каждой отправкой)
+NON_PROMPT_KWARGS = {'previous_reminders', 'effectiveness'}
+
+_memory = TTLCache(maxsize=MESSAGE_CACHE_SIZE, ttl=MESSAGE_CACHE_TTL)
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def is_enabled(message_type: str) -> bool:
+    """Включено ли кэширование для типа сообщений"""
+    return message_type in MESSAGE_CACHE_TYPES
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in sorted(value.items())}
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    return value
+
+
+def _bucket(value: int, bounds=(0, 3, 7)) -> str:
+    for bound in bounds:
+        if value <= bound:
+            return f"<={bound}"
+    return f">{bounds[-1]}"
+
+
+def _part_of_day(now: datetime) -> str:
+    if 5 <= now.hour < 12:
+        return 'morning'
+    if 12 <= now.hour < 18:
+        return 'day'
+    if 18 <= now.hour < 23:
+        return 'evening'
+    return 'night'
+
+
+def build_key(message_type: str, tone: str, kwargs: Dict[str, Any],
+              user_context: Optional[Dict[str, Any]] = None) -> str:
+    """Строит ключ кэша из типа, тона, параметров промпта и огрубленного контекста"""
+    context = {'part_of_day': _part_of_day(datetime.now())}
+    if user_context:
+        context.update({
+            'workload': user_context['task_context']['workload_level'],
+            'stress': user_context['emotional_context']['stress_level'],
+            'active_tasks': _bucket(user_context['task_context']['active_tasks']),
+            'style': user_context['metrics']['interaction_style']
+        })
+    payload = {
+        'type': message_type,
+        'tone': tone,
+        'kwargs': {key: _normalize(value) for key, value in sorted(kwargs.items()) if key not in NON_PROMPT_KWARGS},
+        'context': context
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _count(message_type: str, outcome: str):
+    counters = _stats.setdefault(message_type, {'memory_hits': 0, 'db_hits': 0, 'misses': 0})
+    counters[outcome] += 1
+
+
+def get_stats() -> Dict[str, Dict[str, int]]:
+    """Счетчики попаданий и промахов по типам сообщений"""
+    return {message_type: dict(counters) for message_type, counters in _stats.items()}
+
+
+async def get(message_type: str, key: str) -> Optional[str]:
+    """Ищет сообщение сначала в памяти, затем в базе"""
+    text = _memory.get(key)
+    if text is not None:
+        _count(message_type, 'memory_hits')
+        return text
+
+    try:
+        async with get_db() as session:
+            entry = await session.execute(
+                select(MessageCacheEntry.text, MessageCacheEntry.expires_at)
+                .where(
+                    MessageCacheEntry.key == key,
+                    MessageCacheEntry.expires_at > datetime.now()
+                )
+            )
+            entry = entry.one_or_none()
+    except Exception as e:
+        logger.error(f"Ошибка при чтении кэша сообщений: {e}")
+        entry = None
+
+    if entry is None:
+        _count(message_type, 'misses')
+        return None
+
+    text, expires_at = entry
+    _memory.set(key, text, ttl=max(0, (expires_at - datetime.now()).total_seconds()))
+    _count(message_type, 'db_hits')
+    return text
+
+
+async def put(message_type: str, key: str, text: str):
+    """Сохраняет сообщение в оба уровня кэша"""
+    _memory.set(key, text)
+    now = datetime.now()
+    expires_at = now + timedelta(seconds=MESSAGE_CACHE_TTL)
+    try:
+        async with get_db() as session:
+            await session.execute(
+                insert(MessageCacheEntry)
+                .values(key=key, message_type=message_type, text=text,
+                        created_at=now, expires_at=expires_at)
+                .on_conflict_do_update(
+                    index_elements=[MessageCacheEntry.key],
+                    set_={'text': text, 'created_at': now, 'expires_at': expires_at}
+                )
+            )
+            await session.commit()
+    except Exception as e:
+        logger.error(f"Ошибка при записи в кэш сообщений: {e}")
+
+
+async def purge_expired():
+    """Удаляет просроченные записи из таблицы кэша"""
+    async with get_db() as session:
+        result = await session.execute(
+            delete(MessageCacheEntry).where(MessageCacheEntry.expires_at <= datetime.now())
+        )
+        await session.commit()
+    metrics.add_job_rows(result.rowcount)
+    logger.info(f"Кэш сообщений: удалено {result.rowcount} просроченных записей, статистика {get_stats()}")
@@ -1,18 +1,17 @@
 # message_generation.py
 
-from openai import OpenAI
-from config import OPENAI_API_KEY
+from llm_gateway import create_chat_completion
 import logging
 from typing import Dict, Any
 import json
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 logger = logging.getLogger(__name__)
 
 async def generate_message(prompt: str) -> str:
     """Генерирует сообщение для диалога используя OpenAI API"""
     try:
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            call_site="generate_message",
             model="gpt-4-turbo-preview",
             messages=[
                 {"role": "system", "content": "Ты эмпатичный ассистент, который помогает пользователям достигать целей."},
@@ -29,7 +28,8 @@ async def generate_message(prompt: str) -> str:
 async def analyze_user_message(prompt: str) -> Dict[str, Any]:
     """Анализирует сообщение пользователя и возвращает структурированный результат"""
     try:
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            call_site="analyze_user_message",
             model="gpt-4-turbo-preview",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that analyzes user messages."},
@@ -1,7 +1,9 @@
 from database import get_db
 from models import User, Task
-from ai_module import client  # Импортируем OpenAI клиент
+from llm_gateway import create_chat_completion
 from user_context import get_user_context
+import message_cache
+from user_registry import get_tone
 import logging
 from datetime import datetime
 from typing import Optional, Dict, Any
@@ -21,7 +23,8 @@ async def get_task(task_id):
 async def analyze_user_message(prompt: str) -> Dict[str, Any]:
     """Анализирует сообщение пользователя и возвращает структурированный результат"""
     try:
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            call_site="analyze_user_message",
             model="gpt-4-turbo-preview",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that analyzes user messages."},
@@ -50,10 +53,9 @@ async def generate_message(user_id: int, message_type: str, use_context: bool =
         **kwargs: Дополнительные параметры для сообщения
     """
     try:
-        user = await get_user(user_id)
-        if not user:
+        user_tone = await get_tone(user_id)
+        if user_tone is None:
             return "Пользователь не найден"
-        user_tone = user.tone if user.tone else 'neutral'
         # Получаем базовый контекст
         base_context = f"""
         Роль: эмпатичный коуч-ассистент, помогающий достигать целей
@@ -62,6 +64,7 @@ async def generate_message(user_id: int, message_type: str, use_context: bool =
         """
 
         # Если требуется расширенный контекст, добавляем его
+        user_context = None
         if use_context:
             user_context = await get_user_context(user_id)
             base_context += f"""
@@ -131,6 +134,16 @@ async def generate_message(user_id: int, message_type: str, use_context: bool =
                 - Предложи конкретные шаги по приоритизации
                 - Напомни о важности отдыха
             """,
+            'financial_advice': f"""
+                {base_context}
+                Финансы пользователя (в скобках - количество операций):
+                {kwargs.get('finance_summary') or 'операций пока нет'}
+
+                Дай короткий персональный финансовый совет:
+                - Опирайся на баланс и крупнейшие категории расходов
+                - Предложи один-два небольших конкретных шага
+                - Если операций нет, предложи начать записывать доходы и расходы
+            """,
             'support_message': f"""
                 {base_context}
                 Текущие сложности: {kwargs.get('current_challenges', [])}
@@ -144,10 +157,20 @@ async def generate_message(user_id: int, message_type: str, use_context: bool =
 
         # Получаем нужный промпт или используем базовый контекст
         prompt = prompts.get(message_type, base_context + "\nСоздай уместное сообщение для текущей ситуации.")
-        logger.info(f"message_type: {message_type}")
-        logger.info(f"Generated prompt: {prompt}")
+        logger.debug(f"message_type: {message_type}")
+
+        # Повторные напоминания с теми же данными берем из кэша
+        cache_key = None
+        if message_cache.is_enabled(message_type):
+            cache_key = message_cache.build_key(message_type, user_tone, kwargs, user_context)
+            cached = await message_cache.get(message_type, cache_key)
+            if cached is not None:
+                return cached
+
+        logger.debug(f"Промпт {message_type}: {len(prompt)} символов")
         # Генерируем сообщение через OpenAI API
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            call_site=f"generate_message.{message_type}",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": f"Ты эмпатичный ассистент, который помогает пользователям достигать целей.Твой тон общения должен быть {user_tone}"},
@@ -156,8 +179,15 @@ async def generate_message(user_id: int, message_type: str, use_context: bool =
             temperature=0.7,
             max_tokens=150
         )
-        logger.info(f"API response: {response}")
-        return response.choices[0].message.content.strip()
+        if response.usage is not None:
+            logger.debug(
+                f"Ответ {message_type}: {response.usage.prompt_tokens} + "
+                f"{response.usage.completion_tokens} токенов"
+            )
+        message = response.choices[0].message.content.strip()
+        if cache_key:
+            await message_cache.put(message_type, cache_key, message)
+        return message
 
     except Exception as e:
         logger.error(f"Ошибка при генерации сообщения: {e}")
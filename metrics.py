@@ -0,0 +1,324 @@
+# metrics.py
+
+"""
+Метрики бота в текстовом формате Prometheus.
+
+Счетчики, измерители и гистограммы живут в памяти процесса; модули бота
+обновляют их по ходу работы:
+- обработчики aiogram - HandlerMetricsMiddleware (задержка и ошибки по обработчику);
+- задачи планировщика - обертка track_job (длительность, ошибки, обработанные строки);
+- база - события движка и db_session в get_db (время запросов, запросов на сессию);
+- LLM - llm_gateway (задержка, токены и ошибки по месту вызова);
+- Telegram - telegram_sender (задержка отправки, ответы 429, размер очереди);
+- FSM - PostgresStorage (количество пользователей в каждом состоянии).
+
+Значения, которые дешевле посчитать в момент опроса (очереди, состояния FSM),
+снимают коллекторы, зарегистрированные через register_collector.
+
+Экспортер /metrics включается переменной METRICS_PORT и работает на отдельном
+aiohttp-сервере; без него метрики только копятся в памяти.
+"""
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from config import METRICS_HOST, METRICS_PORT
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000, 10000, 100000, 1000000)
+
+_registry: List['Metric'] = []
+_collectors: List[Callable[[], Awaitable[None]]] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def clear(self):
+        self._values.clear()
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type_name}\n"
+        return header + ''.join(f"{sample}\n" for sample in self.samples())
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Текущее значение"""
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам (le), сумма и количество наблюдений"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# --- Метрики ---
+
+HANDLER_DURATION = Histogram('bot_handler_duration_seconds', 'Время обработки обновления', ['handler'])
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Исключения в обработчиках', ['handler'])
+
+JOB_DURATION = Histogram('scheduler_job_duration_seconds', 'Длительность задачи планировщика', ['job'],
+                         buckets=JOB_BUCKETS)
+JOB_ROWS = Histogram('scheduler_job_rows', 'Строк (пользователей, задач, платежей) за запуск задачи', ['job'],
+                     buckets=COUNT_BUCKETS)
+JOB_ERRORS = Counter('scheduler_job_errors_total', 'Задачи планировщика, завершившиеся исключением', ['job'])
+
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Время выполнения SQL-запроса', ['statement'])
+DB_SESSION_QUERIES = Histogram('db_session_queries', 'Запросов к базе за одну сессию get_db',
+                               buckets=COUNT_BUCKETS)
+DB_SESSION_DURATION = Histogram('db_session_duration_seconds', 'Время жизни сессии get_db')
+
+LLM_DURATION = Histogram('llm_request_duration_seconds', 'Задержка запроса к LLM', ['call_site'],
+                         buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60))
+LLM_TOKENS = Counter('llm_tokens_total', 'Токены LLM', ['call_site', 'kind'])
+LLM_ERRORS = Counter('llm_errors_total', 'Ошибки запросов к LLM', ['call_site', 'error'])
+LLM_IN_FLIGHT = Gauge('llm_in_flight', 'Запросов к LLM выполняется сейчас')
+
+TELEGRAM_SEND_DURATION = Histogram('telegram_send_duration_seconds', 'Задержка вызова sendMessage', ['job'])
+TELEGRAM_MESSAGES = Counter('telegram_messages_total', 'Исходящие сообщения по результату', ['job', 'result'])
+TELEGRAM_RETRY_AFTER = Counter('telegram_retry_after_total', 'Ответы 429 (retry_after) от Bot API')
+TELEGRAM_QUEUE_SIZE = Gauge('telegram_send_queue_size', 'Сообщений в очереди на отправку')
+
+FSM_STATES = Gauge('bot_fsm_states', 'Пользователей в состоянии FSM', ['state'])
+
+
+# --- Коллекторы и вывод ---
+
+def register_collector(collector: Callable[[], Awaitable[None]]):
+    """Асинхронная функция, обновляющая измерители перед каждым опросом /metrics"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+async def collect():
+    for collector in _collectors:
+        try:
+            await collector()
+        except Exception as e:
+            logger.warning(f"Коллектор метрик {getattr(collector, '__qualname__', collector)}: {e}")
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    return ''.join(metric.render() for metric in _registry)
+
+
+# --- Планировщик ---
+
+_job_rows: ContextVar[Optional[List[int]]] = ContextVar('job_rows', default=None)
+
+
+def add_job_rows(count: int):
+    """Учитывает обработанные строки в текущем запуске задачи (вне track_job ничего не делает)"""
+    rows = _job_rows.get()
+    if rows is not None:
+        rows[0] += count
+
+
+def track_job(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Обертка задачи планировщика: длительность, ошибки и строки за запуск по имени функции"""
+    job = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        rows = [0]
+        token = _job_rows.set(rows)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            JOB_ERRORS.inc(job=job)
+            raise
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - started, job=job)
+            JOB_ROWS.observe(rows[0], job=job)
+            _job_rows.reset(token)
+
+    return wrapper
+
+
+# --- База данных ---
+
+_session_queries: ContextVar[Optional[List[int]]] = ContextVar('session_queries', default=None)
+
+
+@contextmanager
+def db_session():
+    """Считает запросы и время одной сессии get_db"""
+    queries = [0]
+    token = _session_queries.set(queries)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_SESSION_DURATION.observe(time.perf_counter() - started)
+        DB_SESSION_QUERIES.observe(queries[0])
+        _session_queries.reset(token)
+
+
+def instrument_engine(engine):
+    """Подключает замер времени запросов к движку SQLAlchemy (AsyncEngine или Engine)"""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, 'sync_engine', engine)
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_started'].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        if kind not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+            kind = 'OTHER'
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, statement=kind)
+        queries = _session_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+    @event.listens_for(sync_engine, 'handle_error')
+    def _error(context):
+        started = context.connection.info.get('metrics_started') if context.connection else None
+        if started:
+            started.pop()
+
+
+# --- Обработчики aiogram ---
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время и ошибки каждого обработчика по имени функции"""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, handler=name)
+
+
+# --- Экспортер ---
+
+_runner: Optional[web.AppRunner] = None
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    await collect()
+    return web.Response(text=render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+
+async def start_exporter(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Запускает HTTP-сервер с /metrics; при port=0 экспортер выключен"""
+    global _runner
+    if not port or _runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+
+async def stop_exporter():
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Text, Interval, Enum
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Float, ForeignKey, Text, Interval, Enum, Index, text, DDL, event
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime, timedelta
+from datetime import datetime
+from date_utils import FREQUENCY_MONTHS, add_months, anchor_day
 import json
 import enum
 
@@ -79,6 +80,10 @@ class DialogSession(Base):
     user = relationship("User", back_populates="dialog_sessions")
     emotional_states = relationship("DialogEmotionalState", back_populates="session")
 
+    __table_args__ = (
+        Index('ix_dialog_sessions_user_id', 'user_id'),
+    )
+
 class UserInteractionMetrics(Base):
     """Метрики взаимодействия с пользователем"""
     __tablename__ = 'user_interaction_metrics'
@@ -104,6 +109,10 @@ class UserInteractionMetrics(Base):
     
     user = relationship("User", back_populates="interaction_metrics")
 
+    __table_args__ = (
+        Index('ix_user_interaction_metrics_user_id_date', 'user_id', 'date'),
+    )
+
 class EmotionalState(enum.Enum):
     MOTIVATED = "motivated"
     STRESSED = "stressed"
@@ -125,6 +134,10 @@ class DialogEmotionalState(Base):
     
     session = relationship("DialogSession", back_populates="emotional_states")
 
+    __table_args__ = (
+        Index('ix_dialog_emotional_states_session_id_timestamp', 'session_id', 'timestamp'),
+    )
+
 class UserEmotionalState(Base):
     __tablename__ = 'user_emotional_states'
     
@@ -141,7 +154,7 @@ class TaskCategory(Base):
     __tablename__ = 'task_categories'
     
     id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True, index=True)
     description = Column(Text, nullable=True)
     priority = Column(Integer, default=0)
     color = Column(String, nullable=True)
@@ -167,10 +180,11 @@ class Task(Base):
     reminder_count = Column(Integer, default=0)
     upcoming_reminder_sent = Column(Boolean, default=False)
     last_overdue_reminder = Column(DateTime, nullable=True)
+    next_reminder = Column(DateTime, nullable=True)       # Когда отправить следующее напоминание
     is_cancelled = Column(Boolean, default=False)
     cancellation_date = Column(DateTime, nullable=True)
     cancellation_reason = Column(String, nullable=True)
-    scheduler_job_id = Column(String, nullable=True)
+    scheduler_job_id = Column(String, nullable=True)      # Воркер, захвативший напоминание
     goal_id = Column(Integer, ForeignKey('goals.id'), nullable=True)
     order = Column(Integer, nullable=True)
     dependencies = Column(String, nullable=True)
@@ -183,6 +197,21 @@ class Task(Base):
     category_rel = relationship("TaskCategory", back_populates="tasks")
     goal = relationship("Goal", back_populates="tasks")
 
+    __table_args__ = (
+        Index('ix_tasks_next_reminder', 'next_reminder',
+              postgresql_where=text('next_reminder IS NOT NULL')),
+        # Незавершенные задачи: проверки планировщика, сводка, контекст пользователя
+        Index('ix_tasks_open_due_date', 'due_date',
+              postgresql_where=text('NOT is_completed AND NOT is_cancelled')),
+        Index('ix_tasks_open_user_id_due_date', 'user_id', 'due_date',
+              postgresql_where=text('NOT is_completed AND NOT is_cancelled')),
+        # Выполненные задачи: статистика по пользователю за период
+        Index('ix_tasks_completed_user_id_completion_date', 'user_id', 'completion_date',
+              postgresql_where=text('is_completed')),
+        # Задачи цели по порядку: сдвиг сроков, проверка предыдущих задач
+        Index('ix_tasks_goal_id_order', 'goal_id', 'order'),
+    )
+
     def is_overdue(self):
         return not self.is_completed and self.due_date < datetime.now()
 
@@ -200,8 +229,10 @@ class ReminderEffectiveness(Base):
     __tablename__ = 'reminder_effectiveness'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.user_id'))
+    user_id = Column(Integer, ForeignKey('users.user_id'), unique=True, index=True)  # одна запись на пользователя
     completion_rate = Column(Float)
+    on_time_rate = Column(Float)                  # доля выполненных в срок среди выполненных
+    average_completion_time = Column(Interval)    # от последнего напоминания до выполнения
     response_time = Column(Interval)
     optimal_intervals = Column(String)
     created_at = Column(DateTime, default=datetime.now)
@@ -212,20 +243,24 @@ class ReminderEffectiveness(Base):
     def to_dict(self):
         return {
             'completion_rate': self.completion_rate,
+            'on_time_rate': self.on_time_rate,
+            'average_completion_time': (self.average_completion_time.total_seconds()
+                                        if self.average_completion_time else None),
             'response_time': self.response_time.total_seconds() if self.response_time else None,
             'optimal_intervals': json.loads(self.optimal_intervals) if self.optimal_intervals else {}
         }
 
 class FinancialRecord(Base):
+    """Финансовые операции; таблица секционирована по месяцам поля date (data_retention)"""
     __tablename__ = 'financial_records'
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey('users.user_id'))
     amount = Column(Float)
     currency = Column(String)
     category = Column(String)
     description = Column(Text, nullable=True)
-    date = Column(DateTime, default=datetime.now)
+    date = Column(DateTime, primary_key=True, default=datetime.now)  # ключ секционирования
     type = Column(String)
     is_planned = Column(Boolean, default=False)
     is_savings = Column(Boolean, default=False)
@@ -235,11 +270,38 @@ class FinancialRecord(Base):
     owner = relationship("User", back_populates="financial_records")
     regular_payment = relationship("RegularPayment", back_populates="records")
 
+    __table_args__ = (
+        Index('ix_financial_records_user_id_date', 'user_id', 'date'),
+        {'postgresql_partition_by': 'RANGE (date)'}
+    )
+
     def get_tags(self):
         if not self.tags:
             return []
         return json.loads(self.tags)
 
+# Секция по умолчанию принимает строки месяцев, для которых секция еще не создана;
+# помесячные секции создает data_retention.ensure_financial_partitions
+event.listen(
+    FinancialRecord.__table__, 'after_create',
+    DDL("CREATE TABLE IF NOT EXISTS financial_records_default PARTITION OF financial_records DEFAULT")
+    .execute_if(dialect='postgresql')
+)
+
+class FinancialDailyAggregate(Base):
+    """Суммы финансовых операций пользователя за день (finance_aggregates); пополняется при записи операций"""
+    __tablename__ = 'financial_daily_aggregates'
+
+    user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    currency = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    type = Column(String, primary_key=True)
+    amount = Column(Float, nullable=False, server_default='0')
+    count = Column(Integer, nullable=False, server_default='0')
+    planned_amount = Column(Float, nullable=False, server_default='0')
+    savings_amount = Column(Float, nullable=False, server_default='0')
+
 class RegularPayment(Base):
     __tablename__ = 'regular_payments'
 
@@ -262,17 +324,11 @@ class RegularPayment(Base):
     records = relationship("FinancialRecord", back_populates="regular_payment")
 
     def calculate_next_payment_date(self):
-        if not self.next_payment_date:
+        months = FREQUENCY_MONTHS.get(self.frequency)
+        if not self.next_payment_date or months is None:
             return None
-            
-        if self.frequency == 'monthly':
-            return self.next_payment_date + timedelta(days=30)
-        elif self.frequency == 'quarterly':
-            return self.next_payment_date + timedelta(days=91)
-        elif self.frequency == 'annually':
-            return self.next_payment_date + timedelta(days=365)
-        
-        return None
+        return add_months(self.next_payment_date, months,
+                          day=anchor_day(self.next_payment_date, self.start_date))
 
 class Goal(Base):
     __tablename__ = 'goals'
@@ -283,6 +339,9 @@ class Goal(Base):
     description = Column(Text, nullable=True)
     deadline = Column(DateTime)
     progress = Column(Integer, default=0)
+    # Счетчики задач цели (без отмененных), ведутся модулем goal_progress
+    tasks_total = Column(Integer, nullable=False, default=0, server_default='0')
+    tasks_completed = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime, default=datetime.now)
     user_experience = Column(String, nullable=True)
     available_time = Column(String, nullable=True)
@@ -327,6 +386,7 @@ class Milestone(Base):
     goal = relationship("Goal", back_populates="milestones")
 
 class CompletedTask(Base):
+    """Архив выполненных и отмененных задач; id совпадает с id задачи в tasks (data_retention)"""
     __tablename__ = 'completed_tasks'
 
     id = Column(Integer, primary_key=True, index=True)
@@ -339,5 +399,45 @@ class CompletedTask(Base):
     time_spent = Column(Interval, nullable=True)
     difficulty_rating = Column(Integer, nullable=True)
     completion_notes = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    priority = Column(String, nullable=True)
+    is_cancelled = Column(Boolean, nullable=False, server_default='false')
+    cancellation_date = Column(DateTime, nullable=True)
+    cancellation_reason = Column(String, nullable=True)
+    archived_at = Column(DateTime, nullable=True)
     
-    owner = relationship("User", back_populates="completed_tasks")
\ No newline at end of file
+    owner = relationship("User", back_populates="completed_tasks")
+
+    __table_args__ = (
+        Index('ix_completed_tasks_user_id_completion_date', 'user_id', 'completion_date'),
+    )
+
+class MessageCacheEntry(Base):
+    """Кэш сообщений, сгенерированных LLM (общий для всех процессов бота)"""
+    __tablename__ = 'message_cache'
+
+    key = Column(String(64), primary_key=True)  # sha256 от нормализованных входных данных промпта
+    message_type = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class FSMStateRecord(Base):
+    """Состояние FSM aiogram: пошаговые сценарии и диалоги, переживающие перезапуск бота"""
+    __tablename__ = 'fsm_states'
+
+    key = Column(String, primary_key=True)  # bot_id:chat_id:user_id[:thread_id]:destiny
+    state = Column(String, nullable=True)
+    data = Column(JSONB, nullable=False, default={})
+    updated_at = Column(DateTime, nullable=False, default=datetime.now, index=True)
+
+
+class TaskKeywords(Base):
+    """Основы ключевых слов выполненной задачи для поиска похожих задач (task_similarity)"""
+    __tablename__ = 'task_keywords'
+
+    # id задачи в tasks, после архивации - в completed_tasks (id сохраняется), поэтому без внешнего ключа
+    task_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False, index=True)
+    keywords = Column(ARRAY(String), nullable=False)
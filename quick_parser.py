@@ -0,0 +1,399 @@
+# quick_parser.py
+
+"""
+Быстрый локальный разбор простых сообщений без обращения к LLM.
+
+Понимает относительные и абсолютные даты ("завтра в 10", "через 2 минуты",
+"15 марта", "в пятницу вечером"), суммы с валютой ("500 руб", "$20") и
+отличает задачи от финансовых операций. Возвращает тот же формат
+{"type", "data"}, что и ai_module.parse_message, плюс оценку уверенности.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+import re
+
+NUMBER_WORDS = {
+    'одну': 1, 'одна': 1, 'один': 1, 'две': 2, 'два': 2, 'пару': 2, 'три': 3,
+    'четыре': 4, 'пять': 5, 'шесть': 6, 'семь': 7, 'восемь': 8, 'девять': 9,
+    'десять': 10, 'пятнадцать': 15, 'двадцать': 20, 'тридцать': 30, 'сорок': 40
+}
+
+MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
+}
+
+WEEKDAYS = {
+    'понедельник': 0, 'вторник': 1, 'среду': 2, 'четверг': 3,
+    'пятницу': 4, 'субботу': 5, 'воскресенье': 6
+}
+
+DAY_OFFSETS = {'сегодня': 0, 'завтра': 1, 'послезавтра': 2}
+
+PART_OF_DAY_HOURS = {'утром': 9, 'днём': 14, 'днем': 14, 'вечером': 19, 'ночью': 23}
+
+CURRENCIES = [
+    (r'руб\w*\.?|р\.|р\b|₽|rub\b', 'RUB'),
+    (r'\$|usd\b|долл\w*|бакс\w*', 'USD'),
+    (r'€|eur\b|евро\b', 'EUR'),
+    (r'£|gbp\b|фунт\w*', 'GBP'),
+    (r'₸|kzt\b|тенге\b', 'KZT'),
+    (r'грн\b|uah\b|гривн\w*', 'UAH'),
+]
+
+FINANCE_VERBS = [
+    (r'\b(?:потратил\w*|заплатил\w*|оплатил\w*|купил\w*|отдал\w*|расход\w*|трат[аы]\b|потрачено)', 'expense'),
+    (r'\b(?:получил\w*|заработал\w*|зарплат\w*|доход\w*|пришл[иао]\b|премия|премию|вернули)', 'income'),
+    (r'\b(?:отложил\w*|накопил\w*|копилк\w*|сбережени\w*)', 'savings'),
+]
+
+FINANCE_CATEGORIES = [
+    (r'кафе|ресторан|кофе|обед|ужин|бар\b', 'Кафе и рестораны'),
+    (r'продукт|магазин|супермаркет|еда|молоко|хлеб', 'Продукты'),
+    (r'такси|метро|бензин|автобус|проезд|транспорт', 'Транспорт'),
+    (r'аренд|квартир|коммунал|жкх|ипотек', 'Жильё'),
+    (r'телефон|интернет|связь|мобильн', 'Связь'),
+    (r'аптек|врач|лекарств|анализ|стоматолог', 'Здоровье'),
+    (r'кино|театр|концерт|игр|подписк', 'Развлечения'),
+    (r'одежд|обув|куртк', 'Одежда'),
+    (r'подар', 'Подарки'),
+    (r'зарплат|аванс|преми', 'Зарплата'),
+]
+
+# Категории совпадают с DEFAULT_TASK_CATEGORIES
+TASK_CATEGORIES = [
+    (r'купить|закупить|заказать|магазин', 'Покупки'),
+    (r'отч[её]т|встреч|совещани|созвон|клиент|презентаци|работ', 'Работа'),
+    (r'учить|выучить|экзамен|домашк|лекци|курс', 'Учёба'),
+    (r'врач|спортзал|тренировк|таблетк|бегать|зарядк', 'Здоровье'),
+    (r'оплатить|заплатить|счёт|счет|налог|перевести', 'Финансы'),
+    (r'убрать|уборк|помыть|постирать|приготовить|починить', 'Дом'),
+    (r'позвонить|написать|поздравить|встретиться', 'Личное'),
+]
+
+_NUM = r'(\d+|' + '|'.join(NUMBER_WORDS) + r')'
+
+RELATIVE_RE = re.compile(
+    r'\bчерез\s+(?:(полчаса|полтора\s+часа)|(?:' + _NUM + r'\s+)?'
+    r'(минут[уы]?|мин\b\.?|час(?:а|ов)?|д(?:ень|ня|ней)|недел[юиь]|месяц(?:а|ев)?))',
+    re.IGNORECASE
+)
+TIME_RE = re.compile(
+    r'\b(?:в|к|до)\s+(\d{1,2})(?:[:.](\d{2}))?(?:\s*(?:ч\b|час(?:а|ов)?\b))?'
+    r'(?:\s+(утра|дня|вечера|ночи))?(?!\s*(?:[.\d]|' + '|'.join(MONTHS) + r'))',
+    re.IGNORECASE
+)
+BARE_TIME_RE = re.compile(r'\b(\d{1,2}):(\d{2})\b')
+NOON_RE = re.compile(r'\bв\s+полдень\b', re.IGNORECASE)
+DAY_RE = re.compile(r'\b(' + '|'.join(DAY_OFFSETS) + r')\b', re.IGNORECASE)
+WEEKDAY_RE = re.compile(r'\bв(?:о)?\s+(' + '|'.join(WEEKDAYS) + r')\b', re.IGNORECASE)
+PART_OF_DAY_RE = re.compile(r'\b(' + '|'.join(PART_OF_DAY_HOURS) + r')\b', re.IGNORECASE)
+NUMERIC_DATE_RE = re.compile(r'\b(\d{1,2})\.(\d{1,2})(?:\.(\d{2,4}))?\b')
+TEXT_DATE_RE = re.compile(r'\b(\d{1,2})(?:-?го)?\s+(' + '|'.join(MONTHS) + r')\b', re.IGNORECASE)
+
+AMOUNT_RE = re.compile(
+    r'(?:(?P<pre>[$€£₽])\s*)?(?<![\d.,:])(?P<num>\d{1,3}(?:[  ]\d{3})+|\d+)(?:[.,](?P<frac>\d{1,2}))?(?![\d:])'
+    r'\s*(?P<mult>к\b|тыс\b\.?|тысяч[аиу]?\b)?\s*(?P<cur>' + '|'.join(p for p, _ in CURRENCIES) + r')?',
+    re.IGNORECASE
+)
+
+# Предлог перед датой убирается из названия вместе с ней: "подарок на 23 февраля" -> "подарок"
+DATE_PREPOSITION_RE = re.compile(r'\b(?:на|к|ко|до|с|со|по|от)\s+$', re.IGNORECASE)
+# После "в 10" без минут должен идти конец фразы, часть суток или день; иначе число
+# может относиться к следующему слову ("сходить в 10 класс") - такой разбор отдается LLM
+BARE_HOUR_CONTEXT_RE = re.compile(
+    r'\s*(?:$|[,.;!?]|(?:' + '|'.join(list(DAY_OFFSETS) + list(PART_OF_DAY_HOURS)) + r')\b'
+    r'|во?\s+(?:' + '|'.join(WEEKDAYS) + r')\b)',
+    re.IGNORECASE
+)
+# Час 1-6 без "утра"/"ночи" ("в 2") может означать и ночь, и день - такой разбор отдается LLM
+AMBIGUOUS_HOURS = range(1, 7)
+
+PRIORITY_RE = re.compile(r'\b(срочно|важно|немедленно|обязательно)\b', re.IGNORECASE)
+INFINITIVE_RE = re.compile(r'^\w+(?:ть|ться|ти|чь)\b', re.IGNORECASE)
+
+# Статистика попаданий быстрого разбора
+_stats = {'hits': 0, 'misses': 0}
+
+
+def record_result(hit: bool):
+    """Учитывает результат быстрого разбора в статистике"""
+    _stats['hits' if hit else 'misses'] += 1
+
+
+def get_stats() -> Dict[str, Any]:
+    """Возвращает статистику попаданий быстрого разбора"""
+    total = _stats['hits'] + _stats['misses']
+    return {
+        'hits': _stats['hits'],
+        'misses': _stats['misses'],
+        'total': total,
+        'hit_rate': _stats['hits'] / total if total else 0.0
+    }
+
+
+def _to_number(value: Optional[str]) -> int:
+    if not value:
+        return 1
+    value = value.lower()
+    return int(value) if value.isdigit() else NUMBER_WORDS[value]
+
+
+def _detect_currency(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    for pattern, code in CURRENCIES:
+        if re.fullmatch(pattern, text.strip(), re.IGNORECASE):
+            return code
+    return None
+
+
+def _match_keywords(text: str, table: List[Tuple[str, str]]) -> Optional[str]:
+    for pattern, value in table:
+        if re.search(pattern, text, re.IGNORECASE):
+            return value
+    return None
+
+
+def _date_span(text: str, match) -> Tuple[int, int]:
+    """Фрагмент даты вместе с предлогом перед ней"""
+    start, end = match.span()
+    preposition = DATE_PREPOSITION_RE.search(text[:start])
+    return (preposition.start() if preposition else start), end
+
+
+def _is_unconfirmed_hour(match) -> bool:
+    """"в 10" без минут, "ч"/"час" и части суток, за которым нет ничего из BARE_HOUR_CONTEXT_RE"""
+    if match.group(2) or match.group(3) or re.search(r'\d\s*ч', match.group(0), re.IGNORECASE):
+        return False
+    return not BARE_HOUR_CONTEXT_RE.match(match.string, match.end())
+
+
+def _is_numeric_date(match) -> bool:
+    """"до 05.11" - дата: "N.MM" после предлога читается как время, только если MM больше 12"""
+    minute = match.group(2)
+    return (minute is not None and match.string[match.start(2) - 1] == '.' and not match.group(3)
+            and 1 <= int(minute) <= 12 and 1 <= int(match.group(1)) <= 31)
+
+
+def parse_datetime(text: str, now: datetime) -> Tuple[Optional[datetime], List[Tuple[int, int]], bool, bool]:
+    """
+    Извлекает дату и время из текста.
+
+    Returns:
+        (дата или None, найденные фрагменты текста, было ли указано время явно,
+        неоднозначен ли час - "в 2" без "утра"/"ночи" и без части суток или
+        "в 10" перед словом, к которому может относиться число)
+    """
+    spans = []
+    ambiguous_hour = False
+    unconfirmed_hour = False
+
+    relative = RELATIVE_RE.search(text)
+    if relative:
+        spans.append(relative.span())
+        special, amount, unit = relative.groups()
+        if special:
+            delta = timedelta(minutes=30) if special.lower() == 'полчаса' else timedelta(minutes=90)
+        else:
+            count = _to_number(amount)
+            unit = unit.lower()
+            if unit.startswith('мин'):
+                delta = timedelta(minutes=count)
+            elif unit.startswith('час'):
+                delta = timedelta(hours=count)
+            elif unit.startswith('д'):
+                delta = timedelta(days=count)
+            elif unit.startswith('недел'):
+                delta = timedelta(weeks=count)
+            else:
+                delta = timedelta(days=30 * count)
+        return (now + delta).replace(microsecond=0), spans, True, False
+
+    date = None
+    hour = minute = None
+
+    # Время суток
+    noon = NOON_RE.search(text)
+    time_match = (next((m for m in TIME_RE.finditer(text) if not _is_numeric_date(m)), None)
+                  or BARE_TIME_RE.search(text))
+    if noon:
+        spans.append(noon.span())
+        hour, minute = 12, 0
+    elif time_match:
+        hour = int(time_match.group(1))
+        minute = int(time_match.group(2) or 0)
+        suffix = time_match.group(3).lower() if time_match.re is TIME_RE and time_match.group(3) else None
+        if suffix in ('дня', 'вечера') and hour < 12:
+            hour += 12
+        elif suffix == 'ночи' and hour == 12:
+            hour = 0
+        if hour > 23 or minute > 59:
+            hour = minute = None
+        else:
+            spans.append(time_match.span())
+            # "в 02:00" - явное время, "в 2" и "в 2:30" - неоднозначные
+            ambiguous_hour = (time_match.re is TIME_RE and suffix is None and hour in AMBIGUOUS_HOURS
+                              and not time_match.group(1).startswith('0'))
+            # Часть суток в другом месте фразы этого не исправляет
+            unconfirmed_hour = time_match.re is TIME_RE and _is_unconfirmed_hour(time_match)
+
+    part_of_day = PART_OF_DAY_RE.search(text)
+    if part_of_day:
+        spans.append(part_of_day.span())
+        if hour is None:
+            hour, minute = PART_OF_DAY_HOURS[part_of_day.group(1).lower()], 0
+        elif part_of_day.group(1).lower() == 'вечером' and hour < 12:
+            hour += 12
+        # Часть суток снимает неоднозначность: "в 2 ночью", "в 5 утром"
+        ambiguous_hour = False
+
+    # День
+    day = DAY_RE.search(text)
+    weekday = WEEKDAY_RE.search(text)
+    text_date = TEXT_DATE_RE.search(text)
+    masked = text
+    if time_match and hour is not None:
+        # Время вида "10.30" не должно читаться как дата
+        masked = text[:time_match.start()] + ' ' * (time_match.end() - time_match.start()) + text[time_match.end():]
+    numeric_date = NUMERIC_DATE_RE.search(masked)
+    if day:
+        spans.append(_date_span(text, day))
+        date = now.date() + timedelta(days=DAY_OFFSETS[day.group(1).lower()])
+    elif weekday:
+        spans.append(_date_span(text, weekday))
+        days_ahead = (WEEKDAYS[weekday.group(1).lower()] - now.weekday()) % 7 or 7
+        date = now.date() + timedelta(days=days_ahead)
+    elif text_date:
+        spans.append(_date_span(text, text_date))
+        date = _safe_date(now, int(text_date.group(1)), MONTHS[text_date.group(2).lower()], None)
+    elif numeric_date:
+        date = _safe_date(now, int(numeric_date.group(1)), int(numeric_date.group(2)), numeric_date.group(3))
+        if date:
+            spans.append(_date_span(masked, numeric_date))
+
+    if date is None and hour is None:
+        return None, [], False, False
+
+    explicit_time = hour is not None
+    if hour is None:
+        hour, minute = 9, 0
+    if date is None:
+        date = now.date()
+        if datetime.combine(date, datetime.min.time()).replace(hour=hour, minute=minute) <= now:
+            date += timedelta(days=1)
+
+    result = datetime.combine(date, datetime.min.time()).replace(hour=hour, minute=minute)
+    return result, spans, explicit_time, ambiguous_hour or unconfirmed_hour
+
+
+def _safe_date(now: datetime, day: int, month: int, year: Optional[str]):
+    """Собирает дату; без года берет ближайшую будущую"""
+    try:
+        if year:
+            year = int(year)
+            if year < 100:
+                year += 2000
+            return datetime(year, month, day).date()
+        candidate = datetime(now.year, month, day).date()
+        if candidate < now.date():
+            candidate = datetime(now.year + 1, month, day).date()
+        return candidate
+    except ValueError:
+        return None
+
+
+def parse_amount(text: str) -> Tuple[Optional[float], Optional[str], Optional[Tuple[int, int]]]:
+    """Извлекает сумму и валюту. Возвращает (сумма, код валюты, фрагмент)"""
+    fallback = None
+    for match in AMOUNT_RE.finditer(text):
+        amount = float(re.sub(r'[  ]', '', match.group('num')))
+        if match.group('frac'):
+            amount += float('0.' + match.group('frac'))
+        if match.group('mult'):
+            amount *= 1000
+        currency = _detect_currency(match.group('pre')) or _detect_currency(match.group('cur'))
+        if currency:
+            return amount, currency, match.span()
+        if fallback is None:
+            fallback = (amount, None, match.span())
+    return fallback or (None, None, None)
+
+
+def _strip_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + ' ' + text[end:]
+    text = re.sub(r'\s+', ' ', text).strip(' ,.;:-')
+    return text[:1].upper() + text[1:]
+
+
+def quick_parse(message_text: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Разбирает сообщение правилами. Возвращает {"type", "data", "confidence"};
+    при низкой уверенности вызывающий код должен обратиться к LLM.
+    """
+    now = now or datetime.now()
+    text = message_text.strip()
+    unknown = {"type": "unknown", "data": {}, "confidence": 0.0}
+    if not text or len(text) > 200:
+        return unknown
+
+    # Финансы
+    finance_type = _match_keywords(text, FINANCE_VERBS)
+    amount, currency, amount_span = parse_amount(text)
+    if amount is not None and (finance_type or currency):
+        if finance_type and currency:
+            confidence = 0.9
+        elif finance_type:
+            confidence = 0.7  # Валюта не указана
+        else:
+            confidence = 0.6  # Непонятно, доход это или расход
+        on_target = re.search(r'\bна\s+(\w+)', text[amount_span[1]:], re.IGNORECASE)
+        category = _match_keywords(text, FINANCE_CATEGORIES)
+        if not category:
+            category = on_target.group(1).capitalize() if on_target else 'Разное'
+        return {
+            "type": "finance",
+            "data": {
+                "amount": amount,
+                "currency": currency or 'RUB',
+                "category": category,
+                "description": text,
+                "type": finance_type or 'expense'
+            },
+            "confidence": confidence
+        }
+
+    # Задачи
+    due_date, spans, explicit_time, ambiguous_hour = parse_datetime(text, now)
+    if due_date is None:
+        return unknown
+
+    priority_match = PRIORITY_RE.search(text)
+    if priority_match:
+        spans.append(priority_match.span())
+    title = _strip_spans(text, spans)
+    if not title or len(title) < 3:
+        return unknown
+
+    confidence = 0.6
+    if INFINITIVE_RE.match(title):
+        confidence += 0.2
+    if explicit_time:
+        confidence += 0.1
+    if ambiguous_hour:
+        confidence = min(confidence, 0.5)
+    if due_date < now:
+        confidence = 0.3
+
+    return {
+        "type": "task",
+        "data": {
+            "title": title,
+            "due_date": due_date.isoformat(),
+            "priority": 'high' if priority_match else 'medium',
+            "category": _match_keywords(title, TASK_CATEGORIES) or 'Разное'
+        },
+        "confidence": round(confidence, 2)
+    }
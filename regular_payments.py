@@ -0,0 +1,228 @@
+# regular_payments.py
+
+"""
+Ежедневная обработка регулярных платежей.
+
+Платежи со сроком не позже сегодняшнего дня выбираются пачками по
+REGULAR_PAYMENT_BATCH_SIZE (keyset-пагинация по id) с блокировкой строк
+FOR UPDATE SKIP LOCKED. Для каждого платежа план строится без обращений к
+базе: все пропущенные периоды с учетом календарных месяцев
+(date_utils.add_months) и end_date. Записи всей пачки вставляются одним
+INSERT, новые даты платежей записываются одним UPDATE по первичному ключу -
+в той же транзакции, что и выборка. Поэтому при нескольких процессах бота
+каждый платеж списывает ровно один из них: заблокированные строки остальные
+пропускают, а после фиксации платеж уже не попадает в выборку.
+
+Платеж, который не удалось обработать (неизвестная периодичность, нет даты),
+получает failure_count + 1; после REGULAR_PAYMENT_MAX_FAILURES ошибок он
+отключается. Уведомления о списаниях и о предстоящих за
+notification_days_before дней платежах собираются по пользователю в одно
+сообщение из шаблонов tone.py, без обращений к LLM.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import Date, cast, func, insert, select, update
+from config import REGULAR_PAYMENT_BATCH_SIZE, REGULAR_PAYMENT_MAX_FAILURES
+from database import get_db
+from date_utils import FREQUENCY_MONTHS, add_months, anchor_day
+from models import FinancialRecord, RegularPayment, User
+from telegram_sender import get_sender
+from tone import get_message
+import finance_aggregates
+import logging
+import metrics
+import time
+
+logger = logging.getLogger(__name__)
+
+# Колонки платежа, нужные для обработки (ORM-объекты не загружаются)
+PAYMENT_COLUMNS = (
+    RegularPayment.id, RegularPayment.user_id, RegularPayment.amount, RegularPayment.currency,
+    RegularPayment.category, RegularPayment.description, RegularPayment.frequency,
+    RegularPayment.next_payment_date, RegularPayment.start_date, RegularPayment.end_date,
+    RegularPayment.failure_count,
+    User.tone
+)
+
+
+class PaymentPlan(NamedTuple):
+    """Что сделать с платежом: даты списаний, новая дата следующего платежа и активен ли он дальше"""
+    charges: List[datetime]
+    next_payment_date: datetime
+    is_active: bool
+
+
+def plan_payment(next_payment_date: Optional[datetime], frequency: Optional[str],
+                 end_date: Optional[datetime], until: datetime,
+                 start_date: Optional[datetime] = None) -> PaymentPlan:
+    """
+    Все списания со сроком до until (не включительно), в том числе пропущенные.
+    Платеж перестает быть активным, когда следующая дата выходит за end_date.
+    День месяца берется из start_date (date_utils.anchor_day), поэтому платеж
+    31-го числа после 28.02 снова списывается 31.03
+    """
+    months = FREQUENCY_MONTHS.get(frequency)
+    if months is None:
+        raise ValueError(f"Неизвестная периодичность платежа: {frequency}")
+    if next_payment_date is None:
+        raise ValueError("Не задана дата следующего платежа")
+
+    # Считаем от исходной даты и исходного дня, чтобы 31-е число не сползало
+    # на 28-е после февраля ни внутри одного запуска, ни между запусками
+    day = anchor_day(next_payment_date, start_date)
+    charges = []
+    periods = 0
+    moment = next_payment_date
+    while moment < until and (end_date is None or moment <= end_date):
+        charges.append(moment)
+        periods += 1
+        moment = add_months(next_payment_date, months * periods, day=day)
+    return PaymentPlan(charges, moment, end_date is None or moment <= end_date)
+
+
+def _amount(value: float) -> str:
+    return f"{value:g}"
+
+
+def charged_line(payment, charges: int) -> str:
+    periods = f" (за {charges} периода(ов))" if charges > 1 else ''
+    return f"• {_amount(payment.amount * charges)} {payment.currency} - {payment.category}{periods}"
+
+
+def upcoming_line(payment) -> str:
+    return (f"• {_amount(payment.amount)} {payment.currency} - {payment.category}, "
+            f"{payment.next_payment_date.strftime('%d.%m')}")
+
+
+def due_payments_query(until: datetime, after_id: Optional[int], limit: int):
+    """Активные платежи со сроком раньше until, пачка по id; строки платежей блокируются"""
+    query = (
+        select(*PAYMENT_COLUMNS)
+        .join(User, User.user_id == RegularPayment.user_id)
+        .where(
+            RegularPayment.is_active.isnot(False),
+            RegularPayment.next_payment_date < until,
+            func.coalesce(RegularPayment.failure_count, 0) < REGULAR_PAYMENT_MAX_FAILURES
+        )
+        .order_by(RegularPayment.id)
+        .limit(limit)
+        .with_for_update(of=RegularPayment, skip_locked=True)
+    )
+    if after_id is not None:
+        query = query.where(RegularPayment.id > after_id)
+    return query
+
+
+def upcoming_payments_query(today):
+    """Активные платежи, о которых пора предупредить: до срока ровно notification_days_before дней"""
+    return (
+        select(*PAYMENT_COLUMNS)
+        .join(User, User.user_id == RegularPayment.user_id)
+        .where(
+            RegularPayment.is_active.isnot(False),
+            RegularPayment.notification_days_before > 0,
+            cast(RegularPayment.next_payment_date, Date) - RegularPayment.notification_days_before == today,
+            func.coalesce(RegularPayment.failure_count, 0) < REGULAR_PAYMENT_MAX_FAILURES
+        )
+        .order_by(RegularPayment.user_id)
+    )
+
+
+async def process_batch(session, payments: list, now: datetime, until: datetime) -> Dict[int, list]:
+    """
+    Записывает списания пачки платежей и фиксирует транзакцию, в которой они
+    были выбраны и заблокированы; возвращает строки уведомлений по пользователям
+    """
+    records = []
+    updates = []
+    lines: Dict[int, list] = {}
+    for payment in payments:
+        try:
+            plan = plan_payment(payment.next_payment_date, payment.frequency, payment.end_date, until,
+                                payment.start_date)
+        except ValueError as e:
+            failures = (payment.failure_count or 0) + 1
+            logger.error(f"Регулярный платеж {payment.id}: {e} (ошибка {failures})")
+            updates.append({'id': payment.id, 'failure_count': failures,
+                            'is_active': failures < REGULAR_PAYMENT_MAX_FAILURES})
+            continue
+
+        records.extend(
+            {
+                'user_id': payment.user_id,
+                'amount': payment.amount,
+                'currency': payment.currency,
+                'category': payment.category,
+                'description': payment.description,
+                'type': 'expense',
+                'is_planned': True,
+                'regular_payment_id': payment.id,
+                'date': charge
+            }
+            for charge in plan.charges
+        )
+        updates.append({'id': payment.id, 'next_payment_date': plan.next_payment_date,
+                        'is_active': plan.is_active, 'last_processed': now, 'failure_count': 0})
+        if plan.charges:
+            lines.setdefault(payment.user_id, []).append(charged_line(payment, len(plan.charges)))
+
+    if records:
+        await session.execute(insert(FinancialRecord), records)
+        await finance_aggregates.add_records(session, [FinancialRecord(**record) for record in records])
+    if updates:
+        # ORM bulk UPDATE по первичному ключу - один executemany
+        await session.execute(update(RegularPayment), updates)
+    await session.commit()
+    return lines
+
+
+async def process_regular_payments(bot):
+    """Записывает все наступившие регулярные платежи и предупреждает о предстоящих"""
+    logger.info("Начало обработки регулярных платежей")
+    started = time.perf_counter()
+    now = datetime.now()
+    today = now.date()
+    until = datetime.combine(today + timedelta(days=1), datetime.min.time())
+    sender = get_sender(bot)
+    last_id = None
+    processed = 0
+
+    try:
+        while True:
+            # Выборка, списания и новые даты - одна транзакция с блокировкой платежей
+            async with get_db() as session:
+                payments = (await session.execute(
+                    due_payments_query(until, last_id, REGULAR_PAYMENT_BATCH_SIZE)
+                )).all()
+                if not payments:
+                    break
+                last_id = payments[-1].id
+                lines = await process_batch(session, payments, now, until)
+
+            tones = {payment.user_id: payment.tone for payment in payments}
+            for user_id, user_lines in lines.items():
+                message = get_message(tones[user_id], 'regular_payment', details='\n'.join(user_lines))
+                await sender.send(user_id, message, job='regular_payments')
+            processed += len(payments)
+            metrics.add_job_rows(len(payments))
+
+        async with get_db() as session:
+            upcoming = (await session.execute(upcoming_payments_query(today))).all()
+        by_user: Dict[int, list] = {}
+        for payment in upcoming:
+            by_user.setdefault(payment.user_id, []).append(payment)
+        for user_id, user_payments in by_user.items():
+            message = get_message(user_payments[0].tone, 'payment_upcoming',
+                                  details='\n'.join(upcoming_line(payment) for payment in user_payments))
+            await sender.send(user_id, message, job='regular_payments')
+
+        logger.info(
+            f"Регулярные платежи: обработано {processed}, предупреждений {len(by_user)}, "
+            f"{time.perf_counter() - started:.1f} с"
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при обработке регулярных платежей: {e}", exc_info=True)
+    finally:
+        await sender.finish_job('regular_payments')
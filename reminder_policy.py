@@ -0,0 +1,107 @@
+# reminder_policy.py
+
+"""
+Политика напоминаний: интервал до следующего напоминания и усиление типа
+напоминания по эффективности прошлых напоминаний пользователя.
+
+Эффективность (таблица reminder_effectiveness) держится в памяти процесса:
+загружается при запуске бота и обновляется после ночного пересчета
+analyze_reminder_effectiveness. Сами расчеты - чистые функции без обращений к
+базе, поэтому отправка напоминания не читает reminder_effectiveness вовсе.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+from sqlalchemy import select
+from database import get_db
+from models import ReminderEffectiveness
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = timedelta(minutes=30)
+
+
+class Effectiveness(NamedTuple):
+    """Эффективность напоминаний пользователя (снимок строки reminder_effectiveness)"""
+    completion_rate: Optional[float]
+    on_time_rate: Optional[float] = None
+    average_completion_time: Optional[timedelta] = None
+    response_time: Optional[timedelta] = None
+    optimal_intervals: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Тот же формат, что и ReminderEffectiveness.to_dict"""
+        return {
+            'completion_rate': self.completion_rate,
+            'on_time_rate': self.on_time_rate,
+            'average_completion_time': (self.average_completion_time.total_seconds()
+                                        if self.average_completion_time else None),
+            'response_time': self.response_time.total_seconds() if self.response_time else None,
+            'optimal_intervals': json.loads(self.optimal_intervals) if self.optimal_intervals else {}
+        }
+
+
+_effectiveness: Dict[int, Effectiveness] = {}
+
+
+async def refresh():
+    """Перечитывает эффективность всех пользователей"""
+    async with get_db() as session:
+        rows = (await session.execute(
+            select(
+                ReminderEffectiveness.user_id,
+                ReminderEffectiveness.completion_rate,
+                ReminderEffectiveness.on_time_rate,
+                ReminderEffectiveness.average_completion_time,
+                ReminderEffectiveness.response_time,
+                ReminderEffectiveness.optimal_intervals
+            )
+        )).all()
+    _effectiveness.clear()
+    _effectiveness.update({row.user_id: Effectiveness(*row[1:]) for row in rows})
+    logger.info(f"Загружена эффективность напоминаний для {len(_effectiveness)} пользователей")
+
+
+def get(user_id: int) -> Optional[Effectiveness]:
+    """Эффективность напоминаний пользователя; None, если данных еще нет"""
+    return _effectiveness.get(user_id)
+
+
+def next_interval(effectiveness: Optional[Effectiveness], due_date: datetime,
+                  reminder_count: Optional[int], now: datetime) -> timedelta:
+    """Рассчитывает интервал до следующего напоминания"""
+    if not effectiveness or effectiveness.completion_rate is None:
+        return DEFAULT_INTERVAL
+    # Базовый интервал зависит от эффективности
+    base_interval = DEFAULT_INTERVAL
+    if effectiveness.completion_rate < 0.3:
+        base_interval = timedelta(minutes=15)  # Чаще для менее ответственных
+    elif effectiveness.completion_rate > 0.7:
+        base_interval = timedelta(hours=1)  # Реже для ответственных
+
+    # Учитываем срочность задачи
+    time_until_due = due_date - now
+    if time_until_due < timedelta(hours=1):
+        base_interval = timedelta(minutes=10)  # Очень частые напоминания при близком дедлайне
+    elif time_until_due < timedelta(hours=3):
+        base_interval = min(base_interval, timedelta(minutes=20))
+
+    # Учитываем историю напоминаний
+    if reminder_count and reminder_count > 3:
+        base_interval *= 1.5  # Увеличиваем интервал, если уже много напоминали
+
+    return base_interval
+
+
+def adjust_reminder_type(effectiveness: Optional[Effectiveness], reminder_type: str) -> str:
+    """Усиливает тип напоминания, если прошлые напоминания работали плохо"""
+    if not effectiveness or effectiveness.completion_rate is None:
+        return reminder_type
+    if effectiveness.completion_rate < 0.3:  # Низкая эффективность
+        return 'urgent'  # Усиливаем важность
+    if (effectiveness.average_completion_time
+            and effectiveness.average_completion_time.total_seconds() > 86400):  # Больше суток
+        return 'motivational'  # Добавляем мотивацию
+    return reminder_type
@@ -0,0 +1,175 @@
+# reminder_queue.py
+
+"""
+Очередь напоминаний, хранящаяся в таблице tasks.
+
+Время следующего напоминания лежит в Task.next_reminder. Воркеры забирают
+пачки наступивших напоминаний через SELECT ... FOR UPDATE SKIP LOCKED и
+сдвигают next_reminder на время аренды, записывая себя в
+Task.scheduler_job_id. Перед генерацией каждого напоминания аренда
+продлевается, а отправка идет только после условного UPDATE, который
+срабатывает, пока задача записана за этим воркером: напоминание, которое
+успел перехватить другой процесс, повторно не отправляется. Если воркер
+упал, не успев отправить напоминание, после истечения аренды его подберет
+другой процесс.
+
+Периодические проверки планировщика (предстоящие и просроченные задачи)
+захватывают свои выборки той же арендой через claim_tasks и release_claims,
+поэтому при нескольких процессах каждое напоминание отправляется один раз.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Set, Tuple
+from sqlalchemy import cast, column, func, or_, select, update, values
+from models import Task
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+# Идентификатор текущего процесса в Task.scheduler_job_id
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Через сколько захваченное, но не отправленное напоминание станет снова доступным
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def due_reminders_query(now: datetime, limit: int):
+    """Наступившие напоминания, еще не захваченные другими воркерами"""
+    return (
+        select(Task.id, Task.user_id)
+        .where(
+            Task.next_reminder != None,
+            Task.next_reminder <= now,
+            Task.is_completed == False,
+            Task.is_cancelled == False
+        )
+        .order_by(Task.next_reminder)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+async def claim_due_reminders(session, limit: int) -> List[Tuple[int, int]]:
+    """
+    Захватывает до limit наступивших напоминаний и возвращает пары (task_id, user_id).
+    Строки, заблокированные другими воркерами, пропускаются.
+    """
+    now = datetime.now()
+    result = await session.execute(due_reminders_query(now, limit))
+    claimed = [tuple(row) for row in result.all()]
+
+    if claimed:
+        await session.execute(
+            update(Task)
+            .where(Task.id.in_([task_id for task_id, _ in claimed]))
+            .values(next_reminder=now + CLAIM_LEASE, scheduler_job_id=WORKER_ID)
+        )
+    await session.commit()
+
+    if claimed:
+        logger.info(f"Воркер {WORKER_ID} захватил {len(claimed)} напоминаний")
+    return claimed
+
+
+async def renew_lease(session, task_id: int) -> bool:
+    """Продлевает аренду захваченного напоминания; False - задача уже не за этим воркером"""
+    result = await session.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.scheduler_job_id == WORKER_ID)
+        .values(next_reminder=datetime.now() + CLAIM_LEASE)
+        .returning(Task.id)
+    )
+    renewed = result.scalar_one_or_none() is not None
+    await session.commit()
+    return renewed
+
+
+async def release_claim(session, task_id: int, when: datetime, **values) -> bool:
+    """
+    Завершает захват: назначает следующее напоминание на when (и пишет values),
+    только если задача все еще за этим воркером. False - отправлять нельзя
+    """
+    result = await session.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.scheduler_job_id == WORKER_ID)
+        .values(next_reminder=when, scheduler_job_id=None, **values)
+        .returning(Task.id)
+    )
+    released = result.scalar_one_or_none() is not None
+    await session.commit()
+    return released
+
+
+def unclaimed_filter(now: datetime):
+    """Задача не захвачена другим воркером или его аренда истекла"""
+    return or_(Task.scheduler_job_id == None, Task.next_reminder <= now)
+
+
+async def claim_tasks(session, query, now: datetime) -> list:
+    """
+    Захватывает задачи из выборки query (первая колонка - Task) и возвращает ее строки.
+    Строки, заблокированные или арендованные другими воркерами, пропускаются.
+    Загруженные объекты Task сохраняют прежний next_reminder - его нужно
+    вернуть при освобождении, если задача не стоит в очереди напоминаний.
+    """
+    result = await session.execute(
+        query.where(unclaimed_filter(now)).with_for_update(of=Task, skip_locked=True)
+    )
+    rows = result.all()
+
+    if rows:
+        await session.execute(
+            update(Task)
+            .where(Task.id.in_([row[0].id for row in rows]))
+            .values(next_reminder=now + CLAIM_LEASE, scheduler_job_id=WORKER_ID)
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+
+    if rows:
+        logger.info(f"Воркер {WORKER_ID} захватил {len(rows)} задач")
+    return rows
+
+
+async def release_claims(session, releases: List[dict]) -> Set[int]:
+    """
+    Освобождает пачку захваченных задач одним UPDATE ... FROM (VALUES ...).
+    Каждый элемент releases - {'id', 'next_reminder', ...колонки Task}; None в
+    остальных колонках оставляет прежнее значение. Возвращает id задач, которые
+    все еще были за этим воркером; по остальным отправлять нельзя
+    """
+    if not releases:
+        return set()
+    names = ['id', 'next_reminder'] + sorted({name for release in releases for name in release} - {'id', 'next_reminder'})
+    table = Task.__table__.c
+    rows = values(*(column(name, table[name].type) for name in names), name='released').data(
+        [tuple(release.get(name) for name in names) for release in releases]
+    )
+    # Колонка VALUES из одних NULL получает тип text - приводим явно
+    assignments = {'next_reminder': cast(rows.c.next_reminder, table.next_reminder.type), 'scheduler_job_id': None}
+    for name in names[2:]:
+        assignments[name] = func.coalesce(cast(rows.c[name], table[name].type), table[name])
+    result = await session.execute(
+        update(Task)
+        .where(Task.id == rows.c.id, Task.scheduler_job_id == WORKER_ID)
+        .values(**assignments)
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    )
+    released = set(result.scalars().all())
+    await session.commit()
+    return released
+
+
+def schedule_reminder(task: Task, when: datetime):
+    """Назначает следующее напоминание о задаче"""
+    task.next_reminder = when
+    task.scheduler_job_id = None
+
+
+def cancel_reminder(task: Task):
+    """Снимает задачу с очереди напоминаний"""
+    task.next_reminder = None
+    task.scheduler_job_id = None
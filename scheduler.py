@@ -1,476 +1,643 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, timedelta
-from sqlalchemy import select, or_, func
-from models import Task, User, FinancialRecord, RegularPayment, ReminderEffectiveness, TaskCategory
+from sqlalchemy import select, update, and_, or_, func, case, cast, literal, Float, DateTime
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+from models import Task, User, ReminderEffectiveness, TaskCategory
 from ai_module import analyze_expenses
 from database import get_db
 from message_utils import generate_message, send_personalized_message
+from reminder_queue import claim_due_reminders, claim_tasks, release_claim, release_claims, renew_lease
+from config import (
+    REMINDER_POLL_SECONDS,
+    REMINDER_BATCH_SIZE,
+    SUMMARY_BATCH_SIZE,
+    FINANCE_ANALYSIS_BATCH_SIZE,
+    FINANCE_ANALYSIS_CONCURRENCY
+)
+from telegram_sender import get_sender
+import message_cache
+import fsm_storage
+import goal_progress
+import analytics_kernel
+import data_retention
+import reminder_policy
+import finance_analysis
+import regular_payments
+import metrics
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+import asyncio
 import logging
 import json
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Эффективность напоминаний считается по стольким последним задачам пользователя
+EFFECTIVENESS_WINDOW = 20
+
 scheduler = AsyncIOScheduler()
 
 def start_scheduler(bot):
-    """Инициализация и запуск планировщика задач"""
+    """Инициализация и запуск планировщика задач (каждая задача обернута в metrics.track_job)"""
     scheduler.start()
     logger.info("Scheduler started")
     
     # Ежедневные проверки
-    scheduler.add_job(send_daily_summary, 'cron', hour=9, minute=0, args=[bot])
+    scheduler.add_job(metrics.track_job(send_daily_summary), 'cron', hour=9, minute=0, args=[bot])
     
     # Регулярные проверки задач
-    scheduler.add_job(check_tasks, 'interval', minutes=15, args=[bot])
-    scheduler.add_job(send_overdue_reminders, 'interval', minutes=30, args=[bot])
+    scheduler.add_job(metrics.track_job(dispatch_due_reminders), 'interval', seconds=REMINDER_POLL_SECONDS,
+                     args=[bot], max_instances=1, coalesce=True)
+    scheduler.add_job(metrics.track_job(check_tasks), 'interval', minutes=15, args=[bot])
+    scheduler.add_job(metrics.track_job(send_overdue_reminders), 'interval', minutes=30, args=[bot])
     
-    # Еженедельные финансовые проверки
-    scheduler.add_job(weekly_expense_analysis, 'cron', 
-                     day_of_week='mon', hour=9, minute=0, args=[bot])
-    scheduler.add_job(process_regular_payments, 'cron', 
+    # Финансы: еженедельный анализ и ежедневные регулярные платежи
+    scheduler.add_job(metrics.track_job(weekly_expense_analysis), 'cron', 
                      day_of_week='mon', hour=9, minute=0, args=[bot])
+    scheduler.add_job(metrics.track_job(regular_payments.process_regular_payments), 'cron',
+                     hour=8, minute=0, args=[bot])
     
+    # Очистка просроченных записей кэша сообщений и состояний FSM
+    scheduler.add_job(metrics.track_job(message_cache.purge_expired), 'interval', hours=1)
+    scheduler.add_job(metrics.track_job(fsm_storage.purge_expired), 'interval', hours=1)
+
+    # Сверка счетчиков задач целей с таблицей tasks
+    scheduler.add_job(metrics.track_job(goal_progress.check_consistency), 'cron', hour=3, minute=30)
+
+    # Ночной пересчет метрик пользователей (контекст для сообщений)
+    scheduler.add_job(metrics.track_job(analytics_kernel.recompute_user_metrics), 'cron', hour=4, minute=0)
+
+    # Секции financial_records на следующие месяцы и архив закрытых задач
+    scheduler.add_job(metrics.track_job(data_retention.run_maintenance), 'cron', hour=4, minute=30)
+
     # Анализ эффективности напоминаний
-    scheduler.add_job(analyze_reminder_effectiveness, 'cron', 
+    scheduler.add_job(metrics.track_job(analyze_reminder_effectiveness), 'cron', 
                      hour=3, minute=0, args=[bot])
     
     logger.info("All jobs added to scheduler")
 
+def format_overdue(overdue_time: timedelta) -> str:
+    """Округляет просрочку до часов или дней - точность до секунд в тексте не нужна"""
+    overdue_hours = overdue_time.total_seconds() / 3600
+    if overdue_hours < 24:
+        return f"{int(overdue_hours)} час(ов)"
+    return f"{int(overdue_hours / 24)} дней"
+
+def open_task_filter(task=Task):
+    """Незавершенная и неотмененная задача (совпадает с условием частичных индексов tasks)"""
+    return and_(task.is_completed == False, task.is_cancelled == False)
+
+def overdue_tasks_query(now: datetime):
+    """Просроченные задачи, о которых не напоминали последние 4 часа"""
+    return select(Task, User).join(User).where(
+        Task.due_date <= now,
+        open_task_filter(),
+        or_(
+            Task.last_overdue_reminder == None,
+            Task.last_overdue_reminder <= now - timedelta(hours=4)  # Напоминаем каждые 4 часа
+        )
+    )
+
+def summary_tasks_query(user_ids: list, until: datetime):
+    """Незавершенные задачи пачки пользователей со сроком до until"""
+    return (
+        select(Task.user_id, Task.title, Task.due_date, TaskCategory.name)
+        .outerjoin(TaskCategory)
+        .where(
+            Task.user_id.in_(user_ids),
+            open_task_filter(),
+            Task.due_date <= until
+        )
+        .order_by(Task.user_id, TaskCategory.priority.desc(), Task.due_date)
+    )
+
+def completed_since_query(user_ids: list, since: datetime):
+    """Количество задач, выполненных пользователями начиная с since"""
+    return (
+        select(Task.user_id, func.count(Task.id))
+        .where(
+            Task.user_id.in_(user_ids),
+            Task.completion_date >= since,
+            Task.is_completed == True
+        )
+        .group_by(Task.user_id)
+    )
+
+def upcoming_tasks_query(now: datetime):
+    """
+    Задачи со сроком в ближайшие 2 часа, о которых не напоминали последние 30 минут,
+    вместе с пользователем и числом его незавершенных задач в пределах ±1 часа от срока
+    """
+    candidate_filter = and_(
+        Task.due_date.between(now, now + timedelta(hours=2)),
+        open_task_filter(),
+        or_(
+            Task.last_reminder == None,
+            Task.last_reminder <= now - timedelta(minutes=30)
+        )
+    )
+
+    # Соседние задачи в пределах часа от срока каждого кандидата
+    neighbour = aliased(Task)
+    workload = (
+        select(Task.id.label('task_id'), func.count(neighbour.id).label('tasks_count'))
+        .join(neighbour, and_(
+            neighbour.user_id == Task.user_id,
+            open_task_filter(neighbour),
+            neighbour.due_date.between(
+                Task.due_date - timedelta(hours=1),
+                Task.due_date + timedelta(hours=1)
+            )
+        ))
+        .where(candidate_filter)
+        .group_by(Task.id)
+        .subquery()
+    )
+    return (
+        select(Task, User, workload.c.tasks_count)
+        .join(User)
+        .join(workload, workload.c.task_id == Task.id)
+        .order_by(Task.user_id, Task.due_date)
+    )
+
 async def send_overdue_reminders(bot):
-    """Проверяет и отправляет напоминания о просроченных задачах"""
+    """
+    Проверяет и отправляет напоминания о просроченных задачах.
+
+    Выборка захватывается арендой reminder_queue, так что при нескольких
+    процессах о каждой задаче напоминает только один; отправляется только
+    то, что после генерации все еще за этим воркером.
+    """
     logger.info("Проверка просроченных задач")
+    sender = get_sender(bot)
     
     try:
+        now = datetime.now()
+        # Захватываем просроченные задачи, о которых давно не напоминали
         async with get_db() as session:
-            now = datetime.now()
-            # Получаем просроченные задачи, о которых давно не напоминали
-            result = await session.execute(
-                select(Task, User).join(User).where(
-                    Task.due_date <= now,
-                    Task.is_completed == False,
-                    or_(
-                        Task.last_overdue_reminder == None,
-                        Task.last_overdue_reminder <= now - timedelta(hours=4)  # Напоминаем каждые 4 часа
-                    )
-                )
-            )
-            tasks = result.all()
-
-            for task, user in tasks:
-                try:
-                    # Считаем, сколько времени прошло с дедлайна
-                    overdue_time = now - task.due_date
-                    overdue_hours = overdue_time.total_seconds() / 3600
-
-                    # Создаем текст напоминания в зависимости от просрочки
-                    if overdue_hours < 24:
-                        severity = "⚠️"
-                        time_text = f"{int(overdue_hours)} час(ов)"
-                    else:
-                        severity = "🚨"
-                        days = int(overdue_hours / 24)
-                        time_text = f"{days} дней"
-
-                    # Формируем клавиатуру с действиями
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="✅ Выполнено", 
-                                            callback_data=f"complete_{task.id}")],
-                        [InlineKeyboardButton(text="📅 Перенести срок", 
-                                            callback_data=f"reschedule_{task.id}")],
-                        [InlineKeyboardButton(text="❌ Отменить задачу", 
-                                            callback_data=f"cancel_{task.id}")]
-                    ])
-
-                    # Генерируем персонализированное сообщение
-                    logger.info(f"Данные для generate_message: user_id={user.user_id}, message_type='task_reminder_overdue', task_title={task.title}, overdue_time={time_text}")
-                    message = await generate_message(
-                        user.user_id,
-                        'task_reminder_overdue',
-                        task_title=task.title,
-                        overdue_time=time_text
-                    )
+            tasks = await claim_tasks(session, overdue_tasks_query(now), now)
+        metrics.add_job_rows(len(tasks))
+        if not tasks:
+            return
 
-                    await bot.send_message(
-                        chat_id=user.user_id,
-                        text=f"{severity} {message}",
-                        reply_markup=keyboard
-                    )
+        # Генерация (запросы к LLM) идет без открытой сессии
+        messages = {}
+        releases = []
+        for task, user in tasks:
+            try:
+                # Считаем, сколько времени прошло с дедлайна
+                overdue_time = now - task.due_date
+                severity = "⚠️" if overdue_time < timedelta(hours=24) else "🚨"
+                time_text = format_overdue(overdue_time)
 
-                    # Обновляем время последнего напоминания
-                    task.last_overdue_reminder = now
-                    task.reminder_count = (task.reminder_count or 0) + 1
-                    await session.commit()
+                # Формируем клавиатуру с действиями
+                keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="✅ Выполнено", 
+                                        callback_data=f"complete_{task.id}")],
+                    [InlineKeyboardButton(text="📅 Перенести срок", 
+                                        callback_data=f"reschedule_{task.id}")],
+                    [InlineKeyboardButton(text="❌ Отменить задачу", 
+                                        callback_data=f"cancel_{task.id}")]
+                ])
 
-                    logger.info(f"Отправлено напоминание о просроченной задаче {task.id}")
+                # Генерируем персонализированное сообщение
+                logger.info(f"Данные для generate_message: user_id={user.user_id}, message_type='task_reminder_overdue', task_title={task.title}, overdue_time={time_text}")
+                message = await generate_message(
+                    user.user_id,
+                    'task_reminder_overdue',
+                    task_title=task.title,
+                    overdue_time=time_text
+                )
+                messages[task.id] = (user.user_id, f"{severity} {message}", keyboard)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке напоминания о задаче {task.id}: {e}")
+
+            # Аренда снимается и с задач, для которых не удалось сгенерировать
+            # сообщение; очередь напоминаний задачи не меняется
+            release = {'id': task.id, 'next_reminder': task.next_reminder}
+            if task.id in messages:
+                release.update(last_overdue_reminder=now, reminder_count=(task.reminder_count or 0) + 1)
+            releases.append(release)
+
+        # Все отметки о напоминаниях - одним UPDATE
+        async with get_db() as session:
+            released = await release_claims(session, releases)
 
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке напоминания о задаче {task.id}: {e}")
-                    continue
+        for task_id, (user_id, text, keyboard) in messages.items():
+            if task_id not in released:
+                logger.info(f"Напоминание о просроченной задаче {task_id} уже забрал другой воркер")
+                continue
+            await sender.send(user_id, text, job='overdue_reminders', reply_markup=keyboard)
+            logger.info(f"Поставлено в очередь напоминание о просроченной задаче {task_id}")
 
     except Exception as e:
         logger.error(f"Ошибка при проверке просроченных задач: {e}")
+    finally:
+        await sender.finish_job('overdue_reminders')
 
 async def send_daily_summary(bot):
-    """Отправляет ежедневную сводку пользователям"""
+    """
+    Отправляет ежедневную сводку пользователям.
+
+    Пользователи обрабатываются пачками по SUMMARY_BATCH_SIZE (keyset-пагинация
+    по user_id); на каждую пачку приходится три запроса независимо от ее размера.
+    """
     logger.info("Отправка ежедневной сводки")
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = today_start + timedelta(days=1)
+    last_user_id = None
+    batches = 0
+    sender = get_sender(bot)
+
     try:
-        async with get_db() as session:
-            users = await session.execute(select(User))
-            for user in users.scalars():
-                try:
-                    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                    today_end = today_start + timedelta(days=1)
-                    
-                    # Получаем задачи по категориям
-                    tasks_query = await session.execute(
-                        select(Task, TaskCategory)
-                        .outerjoin(TaskCategory)
-                        .where(
-                            Task.user_id == user.user_id,
-                            Task.is_completed == False
-                        )
-                        .order_by(TaskCategory.priority.desc(), Task.due_date)
+        while True:
+            async with get_db() as session:
+                users_query = select(User.user_id).order_by(User.user_id).limit(SUMMARY_BATCH_SIZE)
+                if last_user_id is not None:
+                    users_query = users_query.where(User.user_id > last_user_id)
+                user_ids = (await session.execute(users_query)).scalars().all()
+                if not user_ids:
+                    break
+                last_user_id = user_ids[-1]
+                metrics.add_job_rows(len(user_ids))
+
+                # Незавершенные задачи всей пачки одним запросом
+                tasks_query = await session.execute(
+                    summary_tasks_query(user_ids, today_end + timedelta(days=2))
+                )
+                tasks_by_user = {}
+                for user_id, title, due_date, category_name in tasks_query.all():
+                    tasks_by_user.setdefault(user_id, []).append((title, due_date, category_name))
+
+                # Количество выполненных сегодня задач по пользователям
+                completed_counts = {}
+                if tasks_by_user:
+                    completed_query = await session.execute(
+                        completed_since_query(list(tasks_by_user), today_start)
                     )
-                    all_tasks = tasks_query.all()
-                    
-                    # Разделяем задачи по типам
-                    today_tasks = []
-                    overdue_tasks = []
-                    upcoming_tasks = []
-                    for task, category in all_tasks:
-                        if task.due_date < today_start:
-                            overdue_tasks.append((task, category))
-                        elif task.due_date <= today_end:
-                            today_tasks.append((task, category))
-                        elif task.due_date <= today_end + timedelta(days=2):
-                            upcoming_tasks.append((task, category))
-                    
-                    if any([today_tasks, overdue_tasks, upcoming_tasks]):
-                        message = "🌅 Доброе утро! Вот ваша сводка задач:\n\n"
-                        
-                        if overdue_tasks:
-                            message += "🚨 Просроченные задачи:\n"
-                            for task, category in overdue_tasks:
-                                days_overdue = (datetime.now() - task.due_date).days
-                                category_name = category.name if category else "Без категории"
-                                message += (f"• [{category_name}] {task.title}"
-                                          f" (просрочено на {days_overdue} дн.)\n")
-                            message += "\n"
-                        
-                        if today_tasks:
-                            message += "📋 Задачи на сегодня:\n"
-                            for task, category in today_tasks:
-                                category_name = category.name if category else "Без категории"
-                                message += (f"• [{category_name}] {task.title}"
-                                          f" (к {task.due_date.strftime('%H:%M')})\n")
-                            message += "\n"
-                        
-                        if upcoming_tasks:
-                            message += "📅 Ближайшие задачи:\n"
-                            for task, category in upcoming_tasks:
-                                category_name = category.name if category else "Без категории"
-                                message += (f"• [{category_name}] {task.title}"
-                                          f" ({task.due_date.strftime('%d.%m %H:%M')})\n")
-                        
-                        # Добавляем статистику
-                        completed_today = await session.execute(
-                            select(func.count(Task.id))
-                            .where(
-                                Task.user_id == user.user_id,
-                                Task.completion_date >= today_start,
-                                Task.is_completed == True
-                            )
-                        )
-                        completed_count = completed_today.scalar_one()
-                        
-                        if completed_count > 0:
-                            message += f"\n✨ Сегодня вы уже выполнили {completed_count} задач!"
-                        
-                        await bot.send_message(chat_id=user.user_id, text=message)
-                        
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке сводки пользователю {user.user_id}: {e}")
-                    continue
-                    
+                    completed_counts = dict(completed_query.all())
+
+            for user_id, user_tasks in tasks_by_user.items():
+                message = build_daily_summary(user_tasks, completed_counts.get(user_id, 0), now)
+                if message:
+                    await sender.send(user_id, message, job='daily_summary')
+            batches += 1
+
+        logger.info(f"Ежедневная сводка: обработано {batches} пачек пользователей")
+
     except Exception as e:
-        logger.error(f"Ошибка при отправке ежедневной сводки: {e}")
+        logger.error(f"Ошибка при отправке ежедневной сводки: {e}", exc_info=True)
+    finally:
+        await sender.finish_job('daily_summary')
+
+def build_daily_summary(user_tasks: list, completed_count: int, now: datetime):
+    """
+    Формирует текст ежедневной сводки.
+
+    Args:
+        user_tasks: список (название, срок, категория), отсортированный по приоритету категории и сроку
+        completed_count: сколько задач пользователь выполнил сегодня
+        now: текущее время
+    """
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = today_start + timedelta(days=1)
+
+    # Разделяем задачи по типам
+    today_tasks = []
+    overdue_tasks = []
+    upcoming_tasks = []
+    for title, due_date, category_name in user_tasks:
+        category_name = category_name or "Без категории"
+        if due_date < today_start:
+            overdue_tasks.append((title, due_date, category_name))
+        elif due_date <= today_end:
+            today_tasks.append((title, due_date, category_name))
+        elif due_date <= today_end + timedelta(days=2):
+            upcoming_tasks.append((title, due_date, category_name))
+
+    if not any([today_tasks, overdue_tasks, upcoming_tasks]):
+        return None
+
+    message = "🌅 Доброе утро! Вот ваша сводка задач:\n\n"
+
+    if overdue_tasks:
+        message += "🚨 Просроченные задачи:\n"
+        for title, due_date, category_name in overdue_tasks:
+            days_overdue = (now - due_date).days
+            message += f"• [{category_name}] {title} (просрочено на {days_overdue} дн.)\n"
+        message += "\n"
+
+    if today_tasks:
+        message += "📋 Задачи на сегодня:\n"
+        for title, due_date, category_name in today_tasks:
+            message += f"• [{category_name}] {title} (к {due_date.strftime('%H:%M')})\n"
+        message += "\n"
+
+    if upcoming_tasks:
+        message += "📅 Ближайшие задачи:\n"
+        for title, due_date, category_name in upcoming_tasks:
+            message += f"• [{category_name}] {title} ({due_date.strftime('%d.%m %H:%M')})\n"
+
+    if completed_count > 0:
+        message += f"\n✨ Сегодня вы уже выполнили {completed_count} задач!"
+
+    return message
+
+def reminder_effectiveness_upsert(now: datetime, window: int = EFFECTIVENESS_WINDOW):
+    """
+    Один INSERT ... SELECT ... ON CONFLICT: метрики по последним window задачам
+    каждого пользователя (ROW_NUMBER по дате создания)
+    """
+    recent = (
+        select(
+            Task.user_id,
+            Task.is_completed,
+            Task.completion_date,
+            Task.due_date,
+            Task.last_reminder,
+            func.row_number().over(
+                partition_by=Task.user_id, order_by=(Task.created_at.desc(), Task.id.desc())
+            ).label('position')
+        )
+        .subquery()
+    )
+    completed = func.count().filter(recent.c.is_completed == True)
+    on_time = func.count().filter(and_(recent.c.is_completed == True,
+                                       recent.c.completion_date <= recent.c.due_date))
+    after_reminder = func.avg(recent.c.completion_date - recent.c.last_reminder).filter(
+        and_(recent.c.is_completed == True, recent.c.last_reminder.isnot(None))
+    )
+    stats = (
+        select(
+            recent.c.user_id,
+            (cast(completed, Float) / func.count()).label('completion_rate'),
+            case((completed > 0, cast(on_time, Float) / completed), else_=0.0).label('on_time_rate'),
+            func.coalesce(after_reminder, timedelta(0)).label('average_completion_time'),
+            literal(now, DateTime).label('created_at'),
+            literal(now, DateTime).label('updated_at')
+        )
+        .where(recent.c.position <= window)
+        .group_by(recent.c.user_id)
+    )
+    stmt = insert(ReminderEffectiveness).from_select(
+        ['user_id', 'completion_rate', 'on_time_rate', 'average_completion_time', 'created_at', 'updated_at'],
+        stats
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[ReminderEffectiveness.user_id],
+        set_={
+            'completion_rate': stmt.excluded.completion_rate,
+            'on_time_rate': stmt.excluded.on_time_rate,
+            'average_completion_time': stmt.excluded.average_completion_time,
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
 
 async def analyze_reminder_effectiveness(bot):
-    """Анализирует эффективность напоминаний для каждого пользователя"""
+    """Анализирует эффективность напоминаний для всех пользователей одним запросом"""
     try:
         async with get_db() as session:
-            users = await session.execute(select(User))
-            for user in users.scalars():
-                try:
-                    # Анализируем последние 20 задач пользователя
-                    tasks = await session.execute(
-                        select(Task)
-                        .where(Task.user_id == user.user_id)
-                        .order_by(Task.created_at.desc())
-                        .limit(20)
-                    )
-                    tasks = tasks.scalars().all()
-                    if tasks:
-                        total_tasks = len(tasks)
-                        completed_tasks = sum(1 for task in tasks if task.is_completed)
-                        completed_on_time = sum(1 for task in tasks 
-                                              if task.is_completed and task.completion_date <= task.due_date)
-                        
-                        # Рассчитываем метрики
-                        completion_rate = completed_tasks / total_tasks
-                        on_time_rate = completed_on_time / completed_tasks if completed_tasks > 0 else 0
-                        
-                        # Среднее время выполнения после напоминания
-                        completion_times = []
-                        for task in tasks:
-                            if task.is_completed and task.last_reminder:
-                                time_diff = task.completion_date - task.last_reminder
-                                completion_times.append(time_diff.total_seconds())
-                        
-                        avg_completion_time = (sum(completion_times) / len(completion_times) 
-                                             if completion_times else 0)
-                        
-                        # Сохраняем или обновляем метрики
-                        effectiveness = await session.execute(
-                            select(ReminderEffectiveness)
-                            .where(ReminderEffectiveness.user_id == user.user_id)
-                        )
-                        effectiveness = effectiveness.scalar_one_or_none()
-                        
-                        if effectiveness:
-                            effectiveness.completion_rate = completion_rate
-                            effectiveness.on_time_rate = on_time_rate
-                            effectiveness.average_completion_time = timedelta(seconds=avg_completion_time)
-                            effectiveness.updated_at = datetime.now()
-                        else:
-                            effectiveness = ReminderEffectiveness(
-                                user_id=user.user_id,
-                                completion_rate=completion_rate,
-                                on_time_rate=on_time_rate,
-                                average_completion_time=timedelta(seconds=avg_completion_time)
-                            )
-                            session.add(effectiveness)
-                        
-                        await session.commit()
-                        
-                except Exception as e:
-                    logger.error(f"Ошибка при анализе эффективности для пользователя {user.user_id}: {e}")
-                    continue
-                    
+            result = await session.execute(reminder_effectiveness_upsert(datetime.now()))
+            await session.commit()
+        metrics.add_job_rows(result.rowcount)
+        logger.info(f"Эффективность напоминаний пересчитана для {result.rowcount} пользователей")
+        await reminder_policy.refresh()
     except Exception as e:
         logger.error(f"Ошибка при анализе эффективности напоминаний: {e}")
 
-async def calculate_next_reminder_interval(user_id: int, task: Task) -> timedelta:
-    """Рассчитывает интервал до следующего напоминания на основе эффективности"""
-    try:
-        async with get_db() as session:
-            effectiveness = await session.execute(
-                select(ReminderEffectiveness)
-                .where(ReminderEffectiveness.user_id == user_id)
+async def build_task_reminder(task: Task, effectiveness, reminder_type: str):
+    """
+    Генерирует текст и клавиатуру напоминания о задаче.
+    Тип напоминания может быть усилен на основе эффективности прошлых напоминаний.
+    """
+    # Настраиваем сообщение на основе эффективности
+    reminder_type = reminder_policy.adjust_reminder_type(effectiveness, reminder_type)
+    
+    # Создаем клавиатуру с действиями
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Выполнено", 
+                            callback_data=f"complete_{task.id}")],
+        [InlineKeyboardButton(text="⏰ Напомнить через час", 
+                            callback_data=f"remind_1h_{task.id}")],
+        [InlineKeyboardButton(text="📅 Перенести на завтра", 
+                            callback_data=f"postpone_1d_{task.id}")]
+    ])
+    
+    if reminder_type == 'overdue':
+        keyboard.inline_keyboard.append([
+            InlineKeyboardButton(
+                text="❌ Отменить задачу",
+                callback_data=f"cancel_{task.id}"
             )
-            effectiveness = effectiveness.scalar_one_or_none()
-            
-            if not effectiveness:
-                return timedelta(minutes=30)  # Значение по умолчанию
-            # Базовый интервал зависит от эффективности
-            base_interval = timedelta(minutes=30)
-            if effectiveness.completion_rate < 0.3:
-                base_interval = timedelta(minutes=15)  # Чаще для менее ответственных
-            elif effectiveness.completion_rate > 0.7:
-                base_interval = timedelta(hours=1)  # Реже для ответственных
-            
-            # Учитываем срочность задачи
-            time_until_due = task.due_date - datetime.now()
-            if time_until_due < timedelta(hours=1):
-                base_interval = timedelta(minutes=10)  # Очень частые напоминания при близком дедлайне
-            elif time_until_due < timedelta(hours=3):
-                base_interval = min(base_interval, timedelta(minutes=20))
-            
-            # Учитываем историю напоминаний
-            if task.reminder_count and task.reminder_count > 3:
-                base_interval *= 1.5  # Увеличиваем интервал, если уже много напоминали
-            
-            return base_interval
-            
-    except Exception as e:
-        logger.error(f"Ошибка при расчете интервала напоминаний: {e}")
-        return timedelta(minutes=30)
+        ])
+    
+    # Генерируем персонализированное сообщение
+    message_data = {
+        'task_title': task.title,
+        'due_date': task.due_date.strftime("%d.%m.%Y %H:%M"),
+        'overdue_time': format_overdue(datetime.now() - task.due_date) if reminder_type == 'overdue' else None,
+        'previous_reminders': task.reminder_count or 0,
+        'effectiveness': effectiveness.to_dict() if effectiveness else None
+    }
+    
+    message = await generate_message(
+        task.user_id,
+        f'task_reminder_{reminder_type}',
+        **message_data
+    )
+    
+    # Добавляем эмодзи в зависимости от типа
+    format_tags = {
+        'regular': '📝',
+        'urgent': '⚠️',
+        'overdue': '🚨',
+        'motivational': '💪'
+    }
+    return f"{format_tags[reminder_type]} {message}", keyboard
 
-async def send_task_reminder(bot, user_id: int, task_id: int, reminder_type: str = 'regular'):
+async def send_task_reminder(bot, user_id: int, task_id: int, reminder_type: str = 'regular',
+                             job: str = 'task_reminders'):
     """
-    Отправляет напоминание о задаче с учетом контекста, истории и эффективности
+    Отправляет захваченное этим воркером напоминание о задаче с учетом
+    контекста, истории и эффективности
     
     Args:
         bot: Объект бота
         user_id: ID пользователя
         task_id: ID задачи
         reminder_type: Тип напоминания ('regular', 'urgent', 'overdue')
+        job: Имя задачи планировщика для статистики очереди сообщений
     """
     logger.info(f"Отправка напоминания type={reminder_type} для задачи {task_id} пользователю {user_id}")
     
     try:
+        # Пачка может обрабатываться дольше аренды - продлеваем ее перед генерацией
         async with get_db() as session:
+            if not await renew_lease(session, task_id):
+                logger.info(f"Напоминание для задачи {task_id} уже забрал другой воркер")
+                return
             task = await session.get(Task, task_id)
-            user = await session.get(User, user_id)
-            
-            if not task or task.is_completed:
+
+        if not task or task.is_completed:
+            return
+
+        # Эффективность предыдущих напоминаний - из памяти процесса
+        effectiveness = reminder_policy.get(user_id)
+
+        # Генерация (запрос к LLM) идет без открытой сессии
+        formatted_message, keyboard = await build_task_reminder(task, effectiveness, reminder_type)
+
+        # Следующее напоминание с адаптивным интервалом; отправляем, только если
+        # задача все еще за этим воркером
+        now = datetime.now()
+        reminder_count = (task.reminder_count or 0) + 1
+        next_reminder = now + reminder_policy.next_interval(effectiveness, task.due_date, reminder_count, now)
+        async with get_db() as session:
+            if not await release_claim(session, task_id, next_reminder,
+                                       last_reminder=now, reminder_count=reminder_count):
+                logger.info(f"Напоминание для задачи {task_id} уже забрал другой воркер")
                 return
-            
-            # Проверяем эффективность предыдущих напоминаний
-            effectiveness = await session.execute(
-                select(ReminderEffectiveness)
-                .where(ReminderEffectiveness.user_id == user_id)
-                .order_by(ReminderEffectiveness.updated_at.desc())
-                .limit(1)
-            )
-            effectiveness = effectiveness.scalar_one_or_none()
-            # Настраиваем сообщение на основе эффективности
-            if effectiveness:
-                if effectiveness.completion_rate < 0.3:  # Низкая эффективность
-                    reminder_type = 'urgent'  # Усиливаем важность
-                elif effectiveness.average_completion_time.total_seconds() > 86400:  # Больше суток
-                    reminder_type = 'motivational'  # Добавляем мотивацию
-            
-            # Создаем клавиатуру с действиями
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="✅ Выполнено", 
-                                    callback_data=f"complete_{task_id}")],
-                [InlineKeyboardButton(text="⏰ Напомнить через час", 
-                                    callback_data=f"remind_1h_{task_id}")],
-                [InlineKeyboardButton(text="📅 Перенести на завтра", 
-                                    callback_data=f"postpone_1d_{task_id}")]
-            ])
-            
-            if reminder_type == 'overdue':
-                keyboard.inline_keyboard.append([
-                    InlineKeyboardButton(
-                        text="❌ Отменить задачу",
-                        callback_data=f"cancel_{task_id}"
-                    )
-                ])
-            
-            # Генерируем персонализированное сообщение
-            message_data = {
-                'task_title': task.title,
-                'due_date': task.due_date.strftime("%d.%m.%Y %H:%M"),
-                'overdue_time': str(datetime.now() - task.due_date) if reminder_type == 'overdue' else None,
-                'previous_reminders': task.reminder_count or 0,
-                'effectiveness': effectiveness.to_dict() if effectiveness else None
-            }
-            
-            message = await generate_message(
-                user.user_id,
-                f'task_reminder_{reminder_type}',
-                **message_data
-            )
-            
-            # Добавляем эмодзи в зависимости от типа
-            format_tags = {
-                'regular': '📝',
-                'urgent': '⚠️',
-                'overdue': '🚨',
-                'motivational': '💪'
-            }
-            formatted_message = f"{format_tags[reminder_type]} {message}"
-            
-            # Отправляем сообщение
-            await bot.send_message(
-                chat_id=user_id,
-                text=formatted_message,
-                reply_markup=keyboard
-            )
-            
-            # Обновляем информацию о напоминании
-            task.last_reminder = datetime.now()
-            task.reminder_count = (task.reminder_count or 0) + 1
-            
-            # Планируем следующее напоминание с адаптивным интервалом
-            next_interval = await calculate_next_reminder_interval(user_id, task)
-            next_reminder_time = datetime.now() + next_interval
-            
-            scheduler.add_job(
-                send_task_reminder,
-                'date',
-                run_date=next_reminder_time,
-                args=[bot, user_id, task_id, 'regular']
-            )
-            await session.commit()
-            logger.info(f"Напоминание успешно отправлено для задачи {task_id}")
+
+        # Ставим сообщение в очередь отправки
+        await get_sender(bot).send(
+            user_id,
+            formatted_message,
+            job=job,
+            reply_markup=keyboard
+        )
+        logger.info(f"Напоминание для задачи {task_id} поставлено в очередь")
             
     except Exception as e:
         logger.error(f"Ошибка при отправке напоминания: {e}", exc_info=True)
 
+async def dispatch_due_reminders(bot):
+    """Забирает наступившие напоминания из базы и отправляет их"""
+    try:
+        while True:
+            async with get_db() as session:
+                claimed = await claim_due_reminders(session, REMINDER_BATCH_SIZE)
+            metrics.add_job_rows(len(claimed))
+
+            for task_id, user_id in claimed:
+                await send_task_reminder(bot, user_id, task_id, job='reminder_queue')
+
+            if len(claimed) < REMINDER_BATCH_SIZE:
+                break
+    except Exception as e:
+        logger.error(f"Ошибка при рассылке напоминаний из очереди: {e}", exc_info=True)
+    finally:
+        await get_sender(bot).finish_job('reminder_queue')
+
+def workload_warnings(rows: list) -> list:
+    """
+    Предупреждения о нагрузке (пользователь, срок, число задач) по строкам
+    upcoming_tasks_query: не больше одного на пользователя - по самому плотному
+    периоду, и только если в этот период (±1 час от срока) попадает еще не
+    напоминавшаяся задача, то есть о нем еще не предупреждали
+    """
+    by_user = {}
+    for task, user, tasks_count in rows:
+        by_user.setdefault(user.user_id, []).append((task, user, tasks_count))
+
+    warnings = []
+    for user_rows in by_user.values():
+        task, user, tasks_count = max(user_rows, key=lambda row: row[2])
+        if tasks_count < 2:
+            continue
+        if any(other.last_reminder is None and abs(other.due_date - task.due_date) <= timedelta(hours=1)
+               for other, _, _ in user_rows):
+            warnings.append((user, task.due_date, tasks_count))
+    return warnings
+
 async def check_tasks(bot):
-    """Проверяет предстоящие задачи и отправляет уведомления"""
+    """
+    Проверяет предстоящие задачи и отправляет уведомления.
+
+    Загруженность периода (число незавершенных задач пользователя в пределах
+    ±1 часа от срока) считается для всех кандидатов одним запросом, так что
+    количество обращений к базе не зависит от числа задач. Соединение с базой
+    на время запросов к LLM не удерживается.
+    """
     logger.info("Проверка предстоящих задач")
+    sender = get_sender(bot)
     try:
+        now = datetime.now()
+        # Кандидаты вместе с загруженностью захватываются арендой reminder_queue:
+        # при нескольких процессах каждую задачу обрабатывает только один
         async with get_db() as session:
-            now = datetime.now()
-            upcoming_window = now + timedelta(hours=2)
-            
-            tasks = await session.execute(
-                select(Task, User).join(User).where(
-                    Task.due_date.between(now, upcoming_window),
-                    Task.is_completed == False,
-                    or_(
-                        Task.last_reminder == None,
-                        Task.last_reminder <= now - timedelta(minutes=30)
-                    )
-                )
-            )
-            tasks = tasks.all()
-            
-            for task, user in tasks:
-                try:
-                    # Проверяем загруженность периода
-                    time_window_start = task.due_date - timedelta(hours=1)
-                    time_window_end = task.due_date + timedelta(hours=1)
-                    
-                    tasks_in_period = await session.execute(
-                        select(func.count(Task.id)).where(
-                            Task.user_id == user.user_id,
-                            Task.due_date.between(time_window_start, time_window_end),
-                            Task.is_completed == False
-                        )
-                    )
-                    tasks_count = tasks_in_period.scalar_one()
-                    
-                    # Определяем тип напоминания
-                    if task.due_date <= now:
-                        reminder_type = 'overdue'
-                    elif task.due_date <= now + timedelta(minutes=30):
-                        reminder_type = 'urgent'
-                    else:
-                        reminder_type = 'regular'
-                    
-                    # Если много задач в один период, отправляем предупреждение
-                    if tasks_count > 1:
-                        await send_workload_warning(bot, user, task.due_date, tasks_count)
-                    
-                    await send_task_reminder(bot, user.user_id, task.id, reminder_type)
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке задачи {task.id}: {e}")
-                    continue
+            rows = await claim_tasks(session, upcoming_tasks_query(now), now)
+        metrics.add_job_rows(len(rows))
+        if not rows:
+            return
+
+        # Генерация (запросы к LLM) идет без открытой сессии
+        messages = {}
+        releases = []
+        for task, user, tasks_count in rows:
+            try:
+                # Определяем тип напоминания
+                if task.due_date <= now:
+                    reminder_type = 'overdue'
+                elif task.due_date <= now + timedelta(minutes=30):
+                    reminder_type = 'urgent'
+                else:
+                    reminder_type = 'regular'
+
+                effectiveness = reminder_policy.get(user.user_id)
+                formatted_message, keyboard = await build_task_reminder(task, effectiveness, reminder_type)
+                messages[task.id] = (user.user_id, formatted_message, keyboard)
+
+                # Как и в send_task_reminder: интервал считается по счетчику с учетом этого напоминания
+                reminder_count = (task.reminder_count or 0) + 1
+                releases.append({
+                    'id': task.id,
+                    'last_reminder': now,
+                    'reminder_count': reminder_count,
+                    'next_reminder': now + reminder_policy.next_interval(
+                        effectiveness, task.due_date, reminder_count, now)
+                })
+                
+            except Exception as e:
+                logger.error(f"Ошибка при обработке задачи {task.id}: {e}")
+                # Аренда снимается, очередь напоминаний задачи не меняется
+                releases.append({'id': task.id, 'next_reminder': task.next_reminder})
+
+        # Все отметки о напоминаниях - одним UPDATE в короткой транзакции и только
+        # за задачами, которые все еще за этим воркером
+        async with get_db() as session:
+            released = await release_claims(session, releases)
+
+        # Предупреждения о нагрузке - только по задачам, которые остались за этим воркером
+        for user, time_period, tasks_count in workload_warnings(
+                [row for row in rows if row[0].id in released]):
+            await send_workload_warning(bot, user, time_period, tasks_count, job='check_tasks')
+
+        for task_id, (user_id, formatted_message, keyboard) in messages.items():
+            if task_id in released:
+                await sender.send(user_id, formatted_message, job='check_tasks', reply_markup=keyboard)
                     
     except Exception as e:
-        logger.error(f"Ошибка при проверке предстоящих задач: {e}")
+        logger.error(f"Ошибка при проверке предстоящих задач: {e}", exc_info=True)
+    finally:
+        await sender.finish_job('check_tasks')
 
-async def send_workload_warning(bot, user, time_period, tasks_count):
+async def send_workload_warning(bot, user, time_period, tasks_count, job: str = 'task_reminders'):
     """Отправляет предупреждение о большом количестве задач в один период"""
     try:
         message = await generate_message(
-            user,
+            user.user_id,
             'multiple_tasks_warning',
             tasks_count=tasks_count,
             time_period=time_period.strftime("%H:%M")
         )
         
-        await bot.send_message(
-            chat_id=user.user_id,
-            text=f"⚠️ {message}",
+        await get_sender(bot).send(
+            user.user_id,
+            f"⚠️ {message}",
+            job=job,
             parse_mode='HTML'
         )
         
@@ -478,104 +645,80 @@ async def send_workload_warning(bot, user, time_period, tasks_count):
         logger.error(f"Ошибка при отправке предупреждения о нагрузке: {e}")
 
 async def weekly_expense_analysis(bot):
-    """Еженедельный анализ финансов пользователей"""
+    """
+    Еженедельный анализ финансов пользователей.
+
+    Пользователи, у которых анализ был больше недели назад, обрабатываются
+    пачками по FINANCE_ANALYSIS_BATCH_SIZE: дневные суммы операций пачки
+    (financial_daily_aggregates) сворачиваются одним GROUP BY запросом, в
+    LLM уходит только компактная сводка, а запросы к LLM идут параллельно,
+    не больше FINANCE_ANALYSIS_CONCURRENCY одновременно.
+    Соединение с базой на время запросов к LLM не удерживается.
+    """
     logger.info("Начало еженедельного анализа финансов")
-    async with get_db() as session:
-        users = await session.execute(select(User))
-        users = users.scalars().all()
-
-        for user in users:
-            if user.last_expense_analysis is None or (datetime.now() - user.last_expense_analysis).days >= 7:
-                week_ago = datetime.now() - timedelta(days=7)
-                financial_records = await session.execute(
-                    select(FinancialRecord)
-                    .where(FinancialRecord.user_id == user.user_id)
-                    .where(FinancialRecord.date >= week_ago)
-                )
-                financial_records = financial_records.scalars().all()
-
-                # Подготавливаем данные для анализа
-                expense_data = [
-                    {
-                        "amount": record.amount,
-                        "currency": record.currency,
-                        "category": record.category,
-                        "description": record.description,
-                        "date": record.date.isoformat(),
-                        "is_planned": record.is_planned,
-                        "is_savings": record.is_savings
-                    }
-                    for record in financial_records if record.type == 'expense'
-                ]
-
-                income_data = [
-                    {
-                        "amount": record.amount,
-                        "currency": record.currency,
-                        "category": record.category,
-                        "description": record.description,
-                        "date": record.date.isoformat()
-                    }
-                    for record in financial_records if record.type == 'income'
-                ]
-
-                analysis = await analyze_expenses(expense_data, income_data)
-
-                await bot.send_message(chat_id=user.user_id, text=analysis)
-                user.last_expense_analysis = datetime.now()
-                await session.commit()
-
-    logger.info("Завершение еженедельного анализа финансов")
-async def process_regular_payments(bot):
-    """Обработка регулярных платежей"""
-    logger.info("Начало обработки регулярных платежей")
-    async with get_db() as session:
-        today = datetime.now().date()
-        payments = await session.execute(
-            select(RegularPayment).where(RegularPayment.next_payment_date <= today)
-        )
-        payments = payments.scalars().all()
+    started = time.perf_counter()
+    now = datetime.now()
+    week_ago = now - timedelta(days=7)
+    first_day = (now - timedelta(days=6)).date()  # 7 календарных дней, включая сегодня
+    semaphore = asyncio.Semaphore(FINANCE_ANALYSIS_CONCURRENCY)
+    sender = get_sender(bot)
+    last_user_id = None
+    analyzed = 0
 
-        for payment in payments:
-            try:
-                # Создаем запись о финансовой операции
-                new_record = FinancialRecord(
-                    user_id=payment.user_id,
-                    amount=payment.amount,
-                    currency=payment.currency,
-                    category=payment.category,
-                    description=payment.description,
-                    type='expense',
-                    is_planned=True,
-                    date=datetime.now()
+    async def analyze(user_id: int, summary: dict):
+        async with semaphore:
+            analysis = await analyze_expenses(finance_analysis.format_summary(summary))
+        await sender.send(user_id, analysis, job='weekly_expense_analysis')
+
+    try:
+        while True:
+            async with get_db() as session:
+                users_query = (
+                    select(User.user_id)
+                    .where(or_(User.last_expense_analysis.is_(None), User.last_expense_analysis <= week_ago))
+                    .order_by(User.user_id)
+                    .limit(FINANCE_ANALYSIS_BATCH_SIZE)
                 )
-                session.add(new_record)
+                if last_user_id is not None:
+                    users_query = users_query.where(User.user_id > last_user_id)
+                user_ids = (await session.execute(users_query)).scalars().all()
+                if not user_ids:
+                    break
+                last_user_id = user_ids[-1]
 
-                # Обновляем дату следующего платежа
-                if payment.frequency == 'monthly':
-                    payment.next_payment_date += timedelta(days=30)
-                elif payment.frequency == 'quarterly':
-                    payment.next_payment_date += timedelta(days=91)
-                elif payment.frequency == 'annually':
-                    payment.next_payment_date += timedelta(days=365)
+                rows = (await session.execute(finance_analysis.totals_query(user_ids, first_day))).all()
+            summaries = finance_analysis.build_summaries(rows)
 
-                # Отправляем уведомление пользователю
-                message = await generate_message(
-                    user_id=payment.user_id,
-                    message_type='regular_payment',
-                    amount=payment.amount,
-                    currency=payment.currency,
-                    category=payment.category
-                )
-                
-                await bot.send_message(
-                    chat_id=payment.user_id,
-                    text=message
-                )
+            # Пользователям без операций за неделю анализ не отправляется
+            results = await asyncio.gather(
+                *(analyze(user_id, summary) for user_id, summary in summaries.items()),
+                return_exceptions=True
+            )
+            done = []
+            for user_id, result in zip(summaries, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Ошибка анализа финансов пользователя {user_id}: {result}")
+                else:
+                    done.append(user_id)
 
-            except Exception as e:
-                logger.error(f"Ошибка при обработке регулярного платежа {payment.id}: {e}")
-                continue
+            if done:
+                async with get_db() as session:
+                    await session.execute(
+                        update(User)
+                        .where(User.user_id.in_(done))
+                        .values(last_expense_analysis=now)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await session.commit()
+            analyzed += len(done)
+            metrics.add_job_rows(len(done))
 
-        await session.commit()
-    logger.info("Завершение обработки регулярных платежей")
\ No newline at end of file
+        logger.info(
+            f"Еженедельный анализ финансов: {analyzed} пользователей "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при еженедельном анализе финансов: {e}", exc_info=True)
+    finally:
+        await sender.finish_job('weekly_expense_analysis')
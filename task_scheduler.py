@@ -1,57 +1,308 @@
 from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Sequence
+import heapq
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Сколько часов в неделю нужно на одну задачу, идущую параллельно с другими
+HOURS_PER_LANE = 5
+
+# Ответы на вопрос о доступном времени (GoalCreationStates) и значения из parse_message
+WEEKLY_HOURS = {
+    '1': 2, '2': 5, '3': 10, '4': 15,
+    'low': 3, 'medium': 5, 'high': 10
+}
+DEFAULT_WEEKLY_HOURS = 5
+
+
+class CycleError(ValueError):
+    """Зависимости задач образуют цикл"""
+
+    def __init__(self, titles: List[str]):
+        super().__init__(f"Циклические зависимости между задачами: {', '.join(titles)}")
+        self.titles = titles
+
+
+class TaskTiming(NamedTuple):
+    """Результат расчета критического пути для одной задачи (в днях от начала)"""
+    earliest_start: float
+    earliest_finish: float
+    latest_start: float
+    latest_finish: float
+
+    @property
+    def slack(self) -> float:
+        return self.latest_start - self.earliest_start
+
+    @property
+    def is_critical(self) -> bool:
+        return self.slack <= 1e-9
+
+
+def weekly_hours(available_time: Optional[str]) -> float:
+    """Часы в неделю из ответа пользователя: '2', 'medium', '6-10 часов'"""
+    if available_time is None:
+        return DEFAULT_WEEKLY_HOURS
+    value = str(available_time).strip().lower()
+    if value in WEEKLY_HOURS:
+        return WEEKLY_HOURS[value]
+    numbers = [float(number) for number in re.findall(r'\d+(?:[.,]\d+)?', value.replace(',', '.'))]
+    if numbers:
+        # Для диапазона "6-10" берем нижнюю границу
+        return max(1.0, min(numbers))
+    return DEFAULT_WEEKLY_HOURS
+
+
+def _duration(task: dict) -> float:
+    try:
+        return max(0.0, float(task.get('duration', 1)))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def build_graph(tasks: Sequence[dict]) -> List[List[int]]:
+    """
+    Список предшественников для каждой задачи. Зависимость задается названием
+    задачи или ее номером в плане (с 1); неизвестные ссылки пропускаются
+    """
+    index_by_title = {}
+    for i, task in enumerate(tasks):
+        index_by_title.setdefault(str(task.get('title', '')).strip().lower(), i)
+
+    predecessors = []
+    for i, task in enumerate(tasks):
+        found = set()
+        for dependency in task.get('dependencies') or []:
+            if isinstance(dependency, int) and not isinstance(dependency, bool):
+                j = dependency - 1 if 1 <= dependency <= len(tasks) else None
+            else:
+                j = index_by_title.get(str(dependency).strip().lower())
+            if j is None or j == i:
+                logger.debug(f"Неизвестная зависимость '{dependency}' у задачи '{task.get('title')}'")
+                continue
+            found.add(j)
+        predecessors.append(sorted(found))
+    return predecessors
+
+
+def topological_order(predecessors: List[List[int]], titles: Sequence[str] = ()) -> List[int]:
+    """Алгоритм Кана, O(V+E); при цикле - CycleError с задачами, входящими в циклы"""
+    n = len(predecessors)
+    indegree = [len(preds) for preds in predecessors]
+    successors: List[List[int]] = [[] for _ in range(n)]
+    for i, preds in enumerate(predecessors):
+        for j in preds:
+            successors[j].append(i)
+
+    order = [i for i in range(n) if indegree[i] == 0]
+    for i in order:  # список растет по ходу обхода
+        for k in successors[i]:
+            indegree[k] -= 1
+            if indegree[k] == 0:
+                order.append(k)
+
+    if len(order) < n:
+        stuck = [i for i in range(n) if indegree[i] > 0]
+        raise CycleError([titles[i] if i < len(titles) else str(i) for i in stuck])
+    return order
+
+
+def critical_path_analysis(tasks: Sequence[dict]) -> List[TaskTiming]:
+    """Прямой и обратный проход метода критического пути, O(V+E)"""
+    predecessors = build_graph(tasks)
+    order = topological_order(predecessors, [task.get('title', '') for task in tasks])
+    durations = [_duration(task) for task in tasks]
+
+    earliest_finish = [0.0] * len(tasks)
+    for i in order:
+        start = max((earliest_finish[j] for j in predecessors[i]), default=0.0)
+        earliest_finish[i] = start + durations[i]
+
+    project_length = max(earliest_finish, default=0.0)
+    latest_finish = [project_length] * len(tasks)
+    for i in reversed(order):
+        latest_start = latest_finish[i] - durations[i]
+        for j in predecessors[i]:
+            if latest_start < latest_finish[j]:
+                latest_finish[j] = latest_start
+
+    return [
+        TaskTiming(earliest_finish[i] - durations[i], earliest_finish[i],
+                   latest_finish[i] - durations[i], latest_finish[i])
+        for i in range(len(tasks))
+    ]
+
+
+def pack_schedule(tasks: Sequence[dict], timings: Sequence[TaskTiming], lanes: int) -> List[float]:
+    """
+    Расставляет задачи с учетом ресурса: одновременно идет не больше lanes задач
+    с can_parallel, задача без can_parallel идет одна. Из готовых к старту задач
+    первой берется та, у которой меньше всего резерв (позднее начало).
+    Возвращает время начала каждой задачи в днях, O((V+E) log V)
+    """
+    predecessors = build_graph(tasks)
+    durations = [_duration(task) for task in tasks]
+    waiting = [len(preds) for preds in predecessors]
+    successors: List[List[int]] = [[] for _ in tasks]
+    for i, preds in enumerate(predecessors):
+        for j in preds:
+            successors[j].append(i)
+
+    ready = [(timings[i].latest_start, i) for i in range(len(tasks)) if waiting[i] == 0]
+    heapq.heapify(ready)
+    running: List[tuple] = []  # (окончание, задача)
+    starts = [0.0] * len(tasks)
+    free_lanes = lanes
+    exclusive_running = False
+    now = 0.0
+
+    while ready or running:
+        while ready and not exclusive_running:
+            _, i = ready[0]
+            exclusive = not tasks[i].get('can_parallel', False)
+            if exclusive and free_lanes < lanes:
+                break  # ждем, пока закончатся все идущие задачи
+            if not exclusive and free_lanes == 0:
+                break
+            heapq.heappop(ready)
+            starts[i] = now
+            heapq.heappush(running, (now + durations[i], i))
+            if exclusive:
+                exclusive_running = True
+                free_lanes = 0
+            else:
+                free_lanes -= 1
+
+        if not running:
+            break
+        now = running[0][0]
+        while running and running[0][0] <= now:
+            _, i = heapq.heappop(running)
+            if not tasks[i].get('can_parallel', False):
+                exclusive_running = False
+                free_lanes = lanes
+            else:
+                free_lanes += 1
+            for k in successors[i]:
+                waiting[k] -= 1
+                if waiting[k] == 0:
+                    heapq.heappush(ready, (timings[k].latest_start, k))
+
+    return starts
+
+
+def packed_slack(tasks: Sequence[dict], starts: Sequence[float], lanes: int) -> List[float]:
+    """
+    Резерв задач в расписании pack_schedule: на сколько дней можно отложить
+    задачу, не сдвигая остальные и не превышая lanes потоков. К зависимостям
+    добавляется порядок задач в каждом потоке, затем - обратный проход от
+    длительности упакованного плана, O(V log V + E + V * lanes)
+    """
+    predecessors = build_graph(tasks)
+    durations = [_duration(task) for task in tasks]
+    finishes = [offset + duration for offset, duration in zip(starts, durations)]
+    position = {i: k for k, i in enumerate(topological_order(predecessors))}
+    successors: List[set] = [set() for _ in tasks]
+    for i, preds in enumerate(predecessors):
+        for j in preds:
+            successors[j].add(i)
+
+    # Восстанавливаем потоки: задача занимает поток, освободившийся к ее началу,
+    # задача без can_parallel - все потоки сразу
+    order = sorted(range(len(tasks)), key=lambda i: (starts[i], finishes[i], position[i]))
+    lane_last: List[Optional[int]] = [None] * lanes
+    for i in order:
+        if not tasks[i].get('can_parallel', False):
+            for j in lane_last:
+                if j is not None:
+                    successors[j].add(i)
+            lane_last = [i] * lanes
+            continue
+        free = [lane for lane, j in enumerate(lane_last) if j is None or finishes[j] <= starts[i] + 1e-9]
+        lane = max(free or range(lanes),
+                   key=lambda lane: -1.0 if lane_last[lane] is None else finishes[lane_last[lane]])
+        if lane_last[lane] is not None:
+            successors[lane_last[lane]].add(i)
+        lane_last[lane] = i
+
+    makespan = max(finishes, default=0.0)
+    latest_start = [0.0] * len(tasks)
+    slack = [0.0] * len(tasks)
+    for i in reversed(order):
+        latest_finish = min((latest_start[k] for k in successors[i]), default=makespan)
+        latest_start[i] = latest_finish - durations[i]
+        slack[i] = max(0.0, latest_finish - finishes[i])
+    return slack
+
+
+def schedule_plan(tasks: List[dict], deadline: Optional[datetime] = None,
+                  available_time: Optional[str] = None,
+                  start: Optional[datetime] = None) -> List[dict]:
+    """
+    Заполняет start_date/end_date, slack_days и is_critical у задач плана.
+    Резерв считается по упакованному расписанию (packed_slack), то есть с
+    учетом числа потоков. Если план не укладывается в дедлайн, сроки и резерв
+    пропорционально сжимаются.
+    При циклических зависимостях задачи планируются без учета зависимостей
+    """
+    start = start or datetime.now()
+    try:
+        timings = critical_path_analysis(tasks)
+        plan_tasks = tasks
+    except CycleError as e:
+        logger.warning(f"{e}; план строится без учета зависимостей")
+        plan_tasks = [{**task, 'dependencies': []} for task in tasks]
+        timings = critical_path_analysis(plan_tasks)
+
+    lanes = max(1, int(weekly_hours(available_time) // HOURS_PER_LANE))
+    starts = pack_schedule(plan_tasks, timings, lanes)
+    finishes = [offset + _duration(task) for offset, task in zip(starts, plan_tasks)]
+    slack = packed_slack(plan_tasks, starts, lanes)
+
+    scale = 1.0
+    makespan = max(finishes, default=0.0)
+    if deadline is not None and makespan > 0:
+        days_left = (deadline - start).total_seconds() / 86400
+        if 0 < days_left < makespan:
+            scale = days_left / makespan
+            logger.info(f"План на {makespan:.0f} дн. сжат до {days_left:.0f} дн. к дедлайну")
+
+    for task, offset, finish, task_slack in zip(tasks, starts, finishes, slack):
+        task['start_date'] = start + timedelta(days=offset * scale)
+        task['end_date'] = start + timedelta(days=finish * scale)
+        task['slack_days'] = task_slack * scale
+        task['is_critical'] = task_slack <= 1e-9
+    return tasks
 
 
 def optimize_task_schedule(tasks: list, deadline: datetime) -> list:
     """
     Оптимизирует расписание задач с учетом возможности параллельного выполнения
     """
-    # Создаем граф зависимостей
-    dependency_graph = {}
-    for task in tasks:
-        task_id = task['title']
-        dependency_graph[task_id] = {
-            'dependencies': task['dependencies'],
-            'duration': task['duration'],
-            'can_parallel': task['can_parallel']
-        }
-    
-    # Находим критический путь
-    critical_path = find_critical_path(dependency_graph)
-    
-    # Распределяем задачи по времени
-    schedule = []
-    current_date = datetime.now()
-    
-    for task in tasks:
-        if task['title'] in critical_path:
-            # Задачи критического пути выполняются последовательно
-            task['start_date'] = current_date
-            task['end_date'] = current_date + timedelta(days=task['duration'])
-            current_date = task['end_date']
-        elif task['can_parallel']:
-            # Параллельные задачи можно начать раньше
-            task['start_date'] = find_earliest_start(task, schedule)
-            task['end_date'] = task['start_date'] + timedelta(days=task['duration'])
-        
-        schedule.append(task)
-    
-    return schedule
+    return schedule_plan(tasks, deadline)
 
 def find_critical_path(graph: dict) -> list:
     """
     Находит критический путь в графе зависимостей задач
     """
-    # Реализация алгоритма поиска критического пути
-    # Возвращает список задач, которые должны выполняться последовательно
-    pass
+    tasks = [{'title': title, **node} for title, node in graph.items()]
+    timings = critical_path_analysis(tasks)
+    critical = [i for i, timing in enumerate(timings) if timing.is_critical]
+    critical.sort(key=lambda i: timings[i].earliest_start)
+    return [tasks[i]['title'] for i in critical]
 
 def find_earliest_start(task: dict, schedule: list) -> datetime:
     """
     Находит самое раннее возможное время начала задачи с учетом зависимостей
     """
-    # Реализация поиска раннего старта
-    # Учитывает зависимости и возможность параллельного выполнения
-    pass
+    dependencies = {str(title).strip().lower() for title in task.get('dependencies') or []}
+    finishes = [
+        scheduled['end_date'] for scheduled in schedule
+        if str(scheduled.get('title', '')).strip().lower() in dependencies
+    ]
+    return max(finishes, default=datetime.now())
 
 def get_tasks_for_milestone(schedule: list, milestone_date: str) -> list:
     """
@@ -59,6 +310,6 @@ def get_tasks_for_milestone(schedule: list, milestone_date: str) -> list:
     """
     milestone_datetime = datetime.fromisoformat(milestone_date)
     return [
-        task['title'] for task in schedule 
+        task['title'] for task in schedule
         if task['end_date'] <= milestone_datetime
     ]
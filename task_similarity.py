@@ -0,0 +1,304 @@
+# task_similarity.py
+
+"""
+Поиск похожих выполненных задач пользователя.
+
+Текст задачи разбивается на слова, стоп-слова отбрасываются, остальные
+приводятся к основе (стеммер Портера для русского языка, алгоритм Snowball).
+Основы выполненных задач хранятся в таблице task_keywords и дописываются при
+выполнении задачи; задачи, выполненные до появления таблицы (в том числе уже
+перенесенные в архив completed_tasks), индексируются при первой загрузке
+индекса пользователя. При архивации задачи ее основы остаются, так что поиск
+идет по всей истории пользователя.
+
+В памяти для пользователя держится обратный индекс основа -> задачи, так что
+поиск похожих задач затрагивает только задачи с общими словами, а не всю
+историю. Сходство - коэффициент Жаккара по множествам основ.
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache_utils import TTLCache
+from config import SIMILARITY_CACHE_SIZE, SIMILARITY_CACHE_TTL
+from database import get_db
+from models import CompletedTask, Task, TaskKeywords
+import heapq
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = {
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она',
+    'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее',
+    'мне', 'было', 'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему'
+}
+
+SIMILARITY_THRESHOLD = 0.3
+
+_WORD = re.compile(r'[а-яa-z0-9]+')
+
+# --- Стеммер ---
+
+_VOWELS = set('аеиоуыэюя')
+
+_PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+_ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+                   'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+_PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+_REFLEXIVE = ((), ('ся', 'сь'))
+_VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть',
+          'ешь', 'нно'),
+         ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им',
+          'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть',
+          'ишь', 'ую', 'ю'))
+_NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей',
+              'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях',
+              'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'))
+_SUPERLATIVE = ('ейше', 'ейш')
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _remove_ending(rv: str, groups: Tuple[Tuple[str, ...], Tuple[str, ...]]) -> Optional[str]:
+    """
+    Удаляет самое длинное окончание из groups; окончания первой группы должны
+    стоять после 'а' или 'я'. None, если окончания нет
+    """
+    after_a, plain = groups
+    best = None
+    for ending in after_a:
+        if rv.endswith(ending) and rv[:-len(ending)][-1:] in ('а', 'я'):
+            if best is None or len(ending) > len(best):
+                best = ending
+    for ending in plain:
+        if rv.endswith(ending) and (best is None or len(ending) > len(best)):
+            best = ending
+    return rv[:-len(best)] if best is not None else None
+
+
+def _regions(word: str) -> Tuple[int, int]:
+    """Начала областей RV и R2 алгоритма Snowball"""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def stem(word: str) -> str:
+    """Основа русского слова: 'позвонила' -> 'позвон', 'отчетов' -> 'отчет'"""
+    word = word.lower().replace('ё', 'е')
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1: деепричастие, иначе возвратная частица и прилагательное/глагол/существительное
+    result = _remove_ending(rv, _PERFECTIVE_GERUND)
+    if result is None:
+        result = _remove_ending(rv, _REFLEXIVE)
+        if result is not None:
+            rv = result
+        result = _remove_ending(rv, _ADJECTIVE)
+        if result is not None:
+            participle = _remove_ending(result, _PARTICIPLE)
+            result = participle if participle is not None else result
+        else:
+            result = _remove_ending(rv, _VERB)
+            if result is None:
+                result = _remove_ending(rv, _NOUN)
+    if result is not None:
+        rv = result
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательный суффикс в R2
+    for ending in _DERIVATIONAL:
+        if rv.endswith(ending) and len(prefix) + len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4: превосходная степень, двойное н, мягкий знак
+    for ending in _SUPERLATIVE:
+        if rv.endswith(ending):
+            rv = rv[:-len(ending)]
+            break
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif rv.endswith('ь'):
+        rv = rv[:-1]
+
+    return prefix + rv
+
+
+def keywords(text: str) -> List[str]:
+    """Отсортированные уникальные основы значимых слов текста"""
+    words = _WORD.findall((text or '').lower().replace('ё', 'е'))
+    return sorted({stem(word) for word in words if word not in STOP_WORDS and len(word) > 1})
+
+
+def task_text(task: Task) -> str:
+    return f"{task.title or ''} {task.description or ''}"
+
+
+# --- Индекс ---
+
+class SimilarityIndex:
+    """Обратный индекс основа -> задачи для одного пользователя"""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._docs: Dict[int, FrozenSet[str]] = {}
+
+    @classmethod
+    def from_tasks(cls, tasks: Iterable[Task]) -> 'SimilarityIndex':
+        index = cls()
+        for task in tasks:
+            index.add(task.id, keywords(task_text(task)))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, task_id: int, task_keywords: Iterable[str]):
+        self.remove(task_id)
+        terms = frozenset(task_keywords)
+        self._docs[task_id] = terms
+        for term in terms:
+            self._postings[term].add(task_id)
+
+    def remove(self, task_id: int):
+        for term in self._docs.pop(task_id, ()):
+            postings = self._postings[term]
+            postings.discard(task_id)
+            if not postings:
+                del self._postings[term]
+
+    def query(self, query_keywords: Iterable[str], k: int = 3,
+              threshold: float = SIMILARITY_THRESHOLD,
+              exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Топ-k задач по Жаккару не ниже threshold: [(task_id, сходство)]"""
+        terms = set(query_keywords)
+        if not terms:
+            return []
+        overlap: Counter = Counter()
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings:
+                overlap.update(postings)
+        overlap.pop(exclude, None)
+
+        scored = []
+        for task_id, common in overlap.items():
+            similarity = common / (len(terms) + len(self._docs[task_id]) - common)
+            if similarity >= threshold:
+                scored.append((similarity, task_id))
+        return [(task_id, similarity) for similarity, task_id in heapq.nlargest(k, scored)]
+
+
+# user_id -> SimilarityIndex
+_indexes = TTLCache(maxsize=SIMILARITY_CACHE_SIZE, ttl=SIMILARITY_CACHE_TTL)
+
+
+async def load_index(user_id: int) -> SimilarityIndex:
+    """Индекс пользователя из кэша или из task_keywords (с дозаписью старых задач)"""
+    index = _indexes.get(user_id)
+    if index is not None:
+        return index
+
+    async with get_db() as session:
+        rows = (await session.execute(
+            select(TaskKeywords.task_id, TaskKeywords.keywords).where(TaskKeywords.user_id == user_id)
+        )).all()
+
+        # Выполненные задачи (текущие и архивные), которых еще нет в task_keywords
+        missing = (await session.execute(
+            select(Task.id, Task.title, Task.description)
+            .outerjoin(TaskKeywords, TaskKeywords.task_id == Task.id)
+            .where(Task.user_id == user_id, Task.is_completed == True, TaskKeywords.task_id.is_(None))
+        )).all()
+        missing += (await session.execute(
+            select(CompletedTask.id, CompletedTask.title, CompletedTask.description)
+            .outerjoin(TaskKeywords, TaskKeywords.task_id == CompletedTask.id)
+            .where(
+                CompletedTask.user_id == user_id,
+                CompletedTask.is_cancelled == False,
+                TaskKeywords.task_id.is_(None)
+            )
+        )).all()
+        if missing:
+            backfill = [
+                {'task_id': row.id, 'user_id': user_id,
+                 'keywords': keywords(f"{row.title or ''} {row.description or ''}")}
+                for row in missing
+            ]
+            await session.execute(insert(TaskKeywords).values(backfill).on_conflict_do_nothing())
+            await session.commit()
+            rows.extend((row['task_id'], row['keywords']) for row in backfill)
+
+    index = SimilarityIndex()
+    for task_id, task_keywords in rows:
+        index.add(task_id, task_keywords)
+    _indexes.set(user_id, index)
+    return index
+
+
+async def index_completed_task(session: AsyncSession, task: Task):
+    """
+    Сохраняет основы выполненной задачи в той же транзакции (без commit) и
+    дополняет индекс пользователя, если он загружен
+    """
+    task_keywords = keywords(task_text(task))
+    stmt = insert(TaskKeywords).values(task_id=task.id, user_id=task.user_id, keywords=task_keywords)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[TaskKeywords.task_id],
+        set_={'keywords': stmt.excluded.keywords}
+    ))
+    index = _indexes.get(task.user_id)
+    if index is not None:
+        index.add(task.id, task_keywords)
+
+
+async def find_similar(user_id: int, text: str, k: int = 3,
+                       threshold: float = SIMILARITY_THRESHOLD,
+                       exclude_task_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Похожие выполненные задачи пользователя: [(task_id, сходство)]"""
+    index = await load_index(user_id)
+    return index.query(keywords(text), k=k, threshold=threshold, exclude=exclude_task_id)
+
+
+async def find_similar_tasks(user_id: int, text: str, k: int = 3,
+                             threshold: float = SIMILARITY_THRESHOLD,
+                             exclude_task_id: Optional[int] = None) -> List[Tuple[Union[Task, CompletedTask], float]]:
+    """
+    Похожие выполненные задачи пользователя вместе с самими задачами:
+    [(Task или архивная CompletedTask, сходство)] по убыванию сходства. Задачи
+    загружаются по id из результата поиска; кандидатов берется с запасом на
+    удаленные задачи
+    """
+    matches = await find_similar(user_id, text, k=k * 2, threshold=threshold, exclude_task_id=exclude_task_id)
+    if not matches:
+        return []
+    task_ids = [task_id for task_id, _ in matches]
+    async with get_db() as session:
+        tasks = (await session.execute(select(Task).where(Task.id.in_(task_ids)))).scalars().all()
+        tasks_by_id = {task.id: task for task in tasks}
+        archived_ids = [task_id for task_id in task_ids if task_id not in tasks_by_id]
+        if archived_ids:
+            archived = (await session.execute(
+                select(CompletedTask).where(CompletedTask.id.in_(archived_ids))
+            )).scalars().all()
+            tasks_by_id.update((task.id, task) for task in archived)
+    return [(tasks_by_id[task_id], similarity) for task_id, similarity in matches if task_id in tasks_by_id][:k]
@@ -0,0 +1,306 @@
+# telegram_sender.py
+
+"""
+Очередь исходящих сообщений Telegram.
+
+Сообщения ставятся в очередь и отправляются ограниченным числом воркеров с
+учетом общего лимита бота (~30 сообщений/с) и лимита на один чат (~1 сообщение/с).
+Ответ 429 (retry_after) приостанавливает все отправки на указанное время,
+после чего сообщение отправляется повторно.
+
+У каждого чата своя очередь сообщений, а воркеры берут из общей очереди
+готовых чатов: чат, которому по лимиту еще рано, откладывается таймером и не
+занимает воркера. Пачка сообщений одному пользователю не снижает скорость
+отправки остальным. Чат находится в очереди готовых не больше одного раза,
+поэтому порядок сообщений одному пользователю сохраняется.
+"""
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError
+from config import (
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_PER_CHAT_RATE,
+    TELEGRAM_SEND_WORKERS,
+    TELEGRAM_SEND_QUEUE_SIZE
+)
+from collections import deque
+from typing import Deque, Optional, Dict, List, Tuple
+import asyncio
+import logging
+import metrics
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_SEND_ATTEMPTS = 3
+# Сколько чатов держать в памяти, прежде чем убирать простаивающие
+MAX_TRACKED_CHATS = 10000
+
+
+class TokenBucket:
+    """Ограничитель скорости по алгоритму token bucket"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_idle(self) -> bool:
+        """Корзина полна - ограничитель можно забыть без потери точности"""
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+    def try_acquire(self) -> float:
+        """Забирает токен без ожидания; иначе возвращает, через сколько секунд он появится"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """Запрещает выдачу токенов на указанное время"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class JobStats:
+    """Статистика отправки сообщений одной задачей планировщика"""
+
+    def __init__(self, job: str):
+        self.job = job
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.started = time.monotonic()
+        self.futures: List[asyncio.Future] = []
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+# Сообщение в очереди чата: текст, параметры send_message, статистика задачи, future, номер попытки
+_Job = Tuple[str, dict, JobStats, asyncio.Future, int]
+
+
+class _ChatState:
+    def __init__(self, rate: float):
+        self.bucket = TokenBucket(rate, capacity=1)
+        self.jobs: Deque[_Job] = deque()
+        # Чат в очереди готовых, у воркера или ждет таймера
+        self.scheduled = False
+
+
+class MessageSender:
+    """Очередь исходящих сообщений с ограничением скорости и параллельными воркерами"""
+
+    def __init__(self, bot,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 per_chat_rate: float = TELEGRAM_PER_CHAT_RATE,
+                 workers: int = TELEGRAM_SEND_WORKERS,
+                 max_queue: int = TELEGRAM_SEND_QUEUE_SIZE):
+        self.bot = bot
+        self.per_chat_rate = per_chat_rate
+        self.global_bucket = TokenBucket(global_rate)
+        # Чаты, которым можно отправлять; сами сообщения - в очередях чатов
+        self.ready: asyncio.Queue = asyncio.Queue()
+        # Ограничение числа неотправленных сообщений: send ждет свободного места
+        self._slots = asyncio.Semaphore(max_queue)
+        self._unfinished = 0
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+        self.workers_count = workers
+        self._workers: List[asyncio.Task] = []
+        self._chats: Dict[int, _ChatState] = {}
+        self._jobs: Dict[str, JobStats] = {}
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+            logger.info(f"Очередь сообщений запущена: {self.workers_count} воркеров")
+
+    def pending(self) -> int:
+        """Сообщений в очереди и в отправке"""
+        return self._unfinished
+
+    async def stop(self):
+        """Дожидается отправки оставшихся сообщений и останавливает воркеров"""
+        await self._all_done.wait()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def send(self, chat_id: int, text: str, job: str = 'default', **kwargs) -> asyncio.Future:
+        """
+        Ставит сообщение в очередь. Если очередь заполнена, ждет освобождения места.
+        Возвращает future с результатом bot.send_message.
+        """
+        self.start()
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        stats = self._jobs.setdefault(job, JobStats(job))
+        stats.enqueued += 1
+        stats.futures.append(future)
+        self._unfinished += 1
+        self._all_done.clear()
+        chat = self._chat_state(chat_id)
+        chat.jobs.append((text, kwargs, stats, future, 1))
+        if not chat.scheduled:
+            chat.scheduled = True
+            self.ready.put_nowait(chat_id)
+        return future
+
+    async def finish_job(self, job: str) -> Optional[JobStats]:
+        """Дожидается отправки всех сообщений задачи и пишет в лог ее пропускную способность"""
+        stats = self._jobs.pop(job, None)
+        if not stats:
+            return None
+        await asyncio.gather(*stats.futures, return_exceptions=True)
+        stats.futures = []
+        logger.info(
+            f"Задача {job}: отправлено {stats.sent} из {stats.enqueued} сообщений, "
+            f"ошибок {stats.failed}, повторов {stats.retried}, "
+            f"{stats.elapsed:.1f} с, {stats.throughput:.1f} сообщ./с"
+        )
+        return stats
+
+    def _chat_state(self, chat_id: int) -> _ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            if len(self._chats) >= MAX_TRACKED_CHATS:
+                self._chats = {
+                    key: value for key, value in self._chats.items()
+                    if value.scheduled or value.jobs or not value.bucket.is_idle()
+                }
+            state = self._chats[chat_id] = _ChatState(self.per_chat_rate)
+        return state
+
+    def _defer(self, chat_id: int, delay: float):
+        """Возвращает чат в очередь готовых через delay секунд, не занимая воркера"""
+        asyncio.get_running_loop().call_later(delay, self.ready.put_nowait, chat_id)
+
+    def _finish(self, stats: JobStats, future: asyncio.Future, result=None, error: Exception = None):
+        if error is None:
+            stats.sent += 1
+            metrics.TELEGRAM_MESSAGES.inc(job=stats.job, result='sent')
+            if not future.done():
+                future.set_result(result)
+        else:
+            stats.failed += 1
+            metrics.TELEGRAM_MESSAGES.inc(job=stats.job, result='failed')
+            if not future.done():
+                future.set_exception(error)
+        self._slots.release()
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._all_done.set()
+
+    async def _worker(self):
+        while True:
+            chat_id = await self.ready.get()
+            chat = self._chats[chat_id]
+            try:
+                await self._process(chat_id, chat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка очереди сообщений чата {chat_id}: {e}", exc_info=True)
+                if chat.jobs:
+                    self._defer(chat_id, 1)
+                else:
+                    chat.scheduled = False
+
+    async def _process(self, chat_id: int, chat: _ChatState):
+        """Отправляет одно сообщение чата, если позволяет его лимит, и решает, когда вернуться к чату"""
+        wait = chat.bucket.try_acquire()
+        if wait > 0:
+            self._defer(chat_id, wait)
+            return
+
+        text, kwargs, stats, future, attempt = chat.jobs.popleft()
+        await self.global_bucket.acquire()
+        retry_delay = None
+        try:
+            with metrics.TELEGRAM_SEND_DURATION.time(job=stats.job):
+                result = await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            self._finish(stats, future, result)
+        except TelegramRetryAfter as e:
+            metrics.TELEGRAM_RETRY_AFTER.inc()
+            if attempt == MAX_SEND_ATTEMPTS:
+                self._fail(chat_id, stats, future, e)
+            else:
+                logger.warning(f"Telegram просит подождать {e.retry_after} с (чат {chat_id})")
+                self.global_bucket.pause(e.retry_after)
+                stats.retried += 1
+                chat.jobs.appendleft((text, kwargs, stats, future, attempt + 1))
+        except TelegramNetworkError as e:
+            if attempt == MAX_SEND_ATTEMPTS:
+                self._fail(chat_id, stats, future, e)
+            else:
+                stats.retried += 1
+                chat.jobs.appendleft((text, kwargs, stats, future, attempt + 1))
+                retry_delay = 2 ** attempt
+        except Exception as e:
+            self._fail(chat_id, stats, future, e)
+
+        if not chat.jobs:
+            chat.scheduled = False
+        elif retry_delay is not None:
+            self._defer(chat_id, retry_delay)
+        else:
+            self.ready.put_nowait(chat_id)
+
+    def _fail(self, chat_id: int, stats: JobStats, future: asyncio.Future, error: Exception):
+        logger.error(f"Не удалось отправить сообщение пользователю {chat_id}: {error}")
+        self._finish(stats, future, error=error)
+
+
+_sender: Optional[MessageSender] = None
+
+
+def get_sender(bot) -> MessageSender:
+    """Возвращает общую очередь сообщений для бота"""
+    global _sender
+    if _sender is None or _sender.bot is not bot:
+        _sender = MessageSender(bot)
+    return _sender
+
+
+async def _collect_metrics():
+    metrics.TELEGRAM_QUEUE_SIZE.set(_sender.pending() if _sender is not None else 0)
+
+
+metrics.register_collector(_collect_metrics)
+
+
+async def close():
+    """Отправляет оставшиеся сообщения и останавливает очередь"""
+    if _sender is not None:
+        await _sender.stop()
@@ -0,0 +1,48 @@
+# tests/test_quick_parser.py
+
+"""Даты и время в быстром разборе задач quick_parser"""
+
+from datetime import datetime
+import pytest
+from config import QUICK_PARSE_THRESHOLD
+from quick_parser import quick_parse
+
+NOW = datetime(2026, 10, 16, 12, 0)
+
+
+@pytest.mark.parametrize('text, title, due_date', [
+    # "N.MM" с месяцем после предлога - дата, а не время
+    ('сдать отчёт до 05.11', 'Сдать отчёт', '2026-11-05T09:00:00'),
+    ('оплатить интернет до 10.11', 'Оплатить интернет', '2026-11-10T09:00:00'),
+    ('купить подарок к 08.03', 'Купить подарок', '2027-03-08T09:00:00'),
+    ('написать отчёт к 10.12', 'Написать отчёт', '2026-12-10T09:00:00'),
+    ('сдать отчёт 05.11', 'Сдать отчёт', '2026-11-05T09:00:00'),
+    ('сдать отчёт до 05.11 в 10:00', 'Сдать отчёт', '2026-11-05T10:00:00'),
+    # Минуты больше 12, двоеточие или часть суток - время
+    ('позвонить клиенту в 10.30', 'Позвонить клиенту', '2026-10-17T10:30:00'),
+    ('позвонить клиенту в 10:11', 'Позвонить клиенту', '2026-10-17T10:11:00'),
+    ('позвонить маме в 10.05 утра', 'Позвонить маме', '2026-10-17T10:05:00'),
+])
+def test_task_due_date(text, title, due_date):
+    result = quick_parse(text, NOW)
+    assert result['type'] == 'task'
+    assert result['data']['title'] == title
+    assert result['data']['due_date'] == due_date
+
+
+@pytest.mark.parametrize('text, confident', [
+    # Число может относиться к следующему слову - разбор отдается LLM
+    ('сходить в 10 класс завтра', False),
+    ('купить молоко к 10 упаковкам', False),
+    # Конец фразы, "ч"/"час", часть суток или день после часа
+    ('купить молоко в 10', True),
+    ('купить молоко в 10 завтра', True),
+    ('позвонить клиенту в 10 часов', True),
+    ('позвонить клиенту в 10 вечера', True),
+    ('позвонить клиенту в 10 утром', True),
+    ('купить молоко завтра в 10', True),
+])
+def test_bare_hour_confidence(text, confident):
+    result = quick_parse(text, NOW)
+    assert result['type'] == 'task'
+    assert (result['confidence'] >= QUICK_PARSE_THRESHOLD) == confident
@@ -0,0 +1,82 @@
+# tests/test_regular_payments.py
+
+"""Календарная арифметика регулярных платежей: add_months и plan_payment"""
+
+from datetime import date, datetime
+import pytest
+from date_utils import add_months
+from regular_payments import plan_payment
+
+UNTIL = datetime(2026, 10, 17)
+
+
+@pytest.mark.parametrize('moment, months, day, expected', [
+    (date(2026, 1, 15), 1, None, date(2026, 2, 15)),
+    # Конец месяца прижимается к последнему дню
+    (date(2026, 1, 31), 1, None, date(2026, 2, 28)),
+    (date(2026, 3, 31), 1, None, date(2026, 4, 30)),
+    # Високосный год
+    (date(2028, 1, 31), 1, None, date(2028, 2, 29)),
+    (date(2028, 2, 29), 12, None, date(2029, 2, 28)),
+    (date(2028, 2, 29), 48, None, date(2032, 2, 29)),
+    # Переход через год и отрицательный сдвиг
+    (date(2026, 11, 30), 3, None, date(2027, 2, 28)),
+    (date(2026, 3, 31), -1, None, date(2026, 2, 28)),
+    # Исходный день возвращается после прижатого месяца
+    (date(2026, 2, 28), 1, 31, date(2026, 3, 31)),
+    (date(2026, 2, 28), 2, 31, date(2026, 4, 30)),
+    (datetime(2026, 2, 28, 10, 30), 1, 31, datetime(2026, 3, 31, 10, 30)),
+])
+def test_add_months(moment, months, day, expected):
+    assert add_months(moment, months, day=day) == expected
+
+
+@pytest.mark.parametrize('next_payment_date, frequency, end_date, start_date, until, charges, next_date, is_active', [
+    # Срок еще не наступил
+    (datetime(2026, 10, 20), 'monthly', None, None, UNTIL, [], datetime(2026, 10, 20), True),
+    # Одно списание
+    (datetime(2026, 10, 16), 'monthly', None, None, UNTIL,
+     [datetime(2026, 10, 16)], datetime(2026, 11, 16), True),
+    # Пропущенные периоды списываются за один запуск
+    (datetime(2026, 7, 31), 'monthly', None, None, UNTIL,
+     [datetime(2026, 7, 31), datetime(2026, 8, 31), datetime(2026, 9, 30)], datetime(2026, 10, 31), True),
+    (datetime(2026, 1, 15), 'quarterly', None, None, UNTIL,
+     [datetime(2026, 1, 15), datetime(2026, 4, 15), datetime(2026, 7, 15), datetime(2026, 10, 15)],
+     datetime(2027, 1, 15), True),
+    # Между запусками 31-е число не сползает: 31.01 -> 28.02 -> 31.03
+    (datetime(2026, 1, 31), 'monthly', None, datetime(2026, 1, 31), datetime(2026, 2, 1),
+     [datetime(2026, 1, 31)], datetime(2026, 2, 28), True),
+    (datetime(2026, 2, 28), 'monthly', None, datetime(2026, 1, 31), datetime(2026, 3, 1),
+     [datetime(2026, 2, 28)], datetime(2026, 3, 31), True),
+    (datetime(2026, 4, 30), 'monthly', None, datetime(2026, 1, 31), datetime(2026, 5, 1),
+     [datetime(2026, 4, 30)], datetime(2026, 5, 31), True),
+    # Високосный год
+    (datetime(2028, 1, 31), 'monthly', None, datetime(2028, 1, 31), datetime(2028, 2, 1),
+     [datetime(2028, 1, 31)], datetime(2028, 2, 29), True),
+    (datetime(2028, 2, 29), 'annually', None, datetime(2028, 2, 29), datetime(2028, 3, 1),
+     [datetime(2028, 2, 29)], datetime(2029, 2, 28), True),
+    # start_date старой записи (дата создания) не сдвигает день платежа
+    (datetime(2026, 10, 5), 'monthly', None, datetime(2026, 9, 20), UNTIL,
+     [datetime(2026, 10, 5)], datetime(2026, 11, 5), True),
+    # end_date ограничивает списания и отключает платеж
+    (datetime(2026, 8, 10), 'monthly', datetime(2026, 9, 10), None, UNTIL,
+     [datetime(2026, 8, 10), datetime(2026, 9, 10)], datetime(2026, 10, 10), False),
+    (datetime(2026, 8, 10), 'monthly', datetime(2026, 8, 31), None, UNTIL,
+     [datetime(2026, 8, 10)], datetime(2026, 9, 10), False),
+    (datetime(2026, 10, 10), 'monthly', datetime(2026, 11, 10), None, UNTIL,
+     [datetime(2026, 10, 10)], datetime(2026, 11, 10), True),
+])
+def test_plan_payment(next_payment_date, frequency, end_date, start_date, until, charges, next_date, is_active):
+    plan = plan_payment(next_payment_date, frequency, end_date, until, start_date)
+    assert plan.charges == charges
+    assert plan.next_payment_date == next_date
+    assert plan.is_active == is_active
+
+
+@pytest.mark.parametrize('next_payment_date, frequency', [
+    (datetime(2026, 10, 1), 'weekly'),
+    (None, 'monthly'),
+])
+def test_plan_payment_invalid(next_payment_date, frequency):
+    with pytest.raises(ValueError):
+        plan_payment(next_payment_date, frequency, None, UNTIL)
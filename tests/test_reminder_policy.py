@@ -0,0 +1,60 @@
+# tests/test_reminder_policy.py
+
+"""Таблица ожидаемых интервалов и типов напоминаний reminder_policy"""
+
+from datetime import datetime, timedelta
+import pytest
+from reminder_policy import DEFAULT_INTERVAL, Effectiveness, adjust_reminder_type, next_interval
+
+NOW = datetime(2026, 10, 16, 12, 0)
+
+
+def minutes(value: float) -> timedelta:
+    return timedelta(minutes=value)
+
+
+@pytest.mark.parametrize('completion_rate, hours_until_due, reminder_count, expected', [
+    # Эффективность: реже для ответственных, чаще для остальных
+    (0.2, 24, 1, minutes(15)),
+    (0.3, 24, 1, minutes(30)),
+    (0.5, 24, 1, minutes(30)),
+    (0.7, 24, 1, minutes(30)),
+    (0.8, 24, 1, minutes(60)),
+    # Срочность: до дедлайна меньше 3 часов, меньше часа, уже просрочено
+    (0.8, 2, 1, minutes(20)),
+    (0.2, 2, 1, minutes(15)),
+    (0.8, 0.5, 1, minutes(10)),
+    (0.2, 0.5, 1, minutes(10)),
+    (0.8, -2, 1, minutes(10)),
+    # История: после третьего напоминания интервал растет в 1.5 раза
+    (0.5, 24, None, minutes(30)),
+    (0.5, 24, 3, minutes(30)),
+    (0.5, 24, 4, minutes(45)),
+    (0.8, 24, 5, minutes(90)),
+    (0.2, 24, 4, minutes(22.5)),
+    (0.8, 0.5, 4, minutes(15)),
+])
+def test_next_interval(completion_rate, hours_until_due, reminder_count, expected):
+    effectiveness = Effectiveness(completion_rate=completion_rate)
+    due_date = NOW + timedelta(hours=hours_until_due)
+    assert next_interval(effectiveness, due_date, reminder_count, NOW) == expected
+
+
+@pytest.mark.parametrize('effectiveness', [None, Effectiveness(completion_rate=None)])
+def test_next_interval_without_statistics(effectiveness):
+    # Без статистики - интервал по умолчанию даже у близкого дедлайна
+    assert next_interval(effectiveness, NOW + timedelta(minutes=30), 10, NOW) == DEFAULT_INTERVAL
+
+
+@pytest.mark.parametrize('effectiveness, reminder_type, expected', [
+    (None, 'regular', 'regular'),
+    (Effectiveness(completion_rate=None), 'overdue', 'overdue'),
+    (Effectiveness(completion_rate=0.2), 'regular', 'urgent'),
+    (Effectiveness(completion_rate=0.2, average_completion_time=timedelta(days=2)), 'regular', 'urgent'),
+    (Effectiveness(completion_rate=0.5, average_completion_time=timedelta(days=2)), 'regular', 'motivational'),
+    (Effectiveness(completion_rate=0.5, average_completion_time=timedelta(days=1)), 'regular', 'regular'),
+    (Effectiveness(completion_rate=0.5, average_completion_time=timedelta(hours=1)), 'overdue', 'overdue'),
+    (Effectiveness(completion_rate=0.9), 'urgent', 'urgent'),
+])
+def test_adjust_reminder_type(effectiveness, reminder_type, expected):
+    assert adjust_reminder_type(effectiveness, reminder_type) == expected
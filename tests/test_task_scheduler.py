@@ -0,0 +1,127 @@
+# tests/test_task_scheduler.py
+
+"""Критический путь, упаковка по потокам и сроки плана цели (task_scheduler)"""
+
+from datetime import datetime, timedelta
+import pytest
+from task_scheduler import (
+    CycleError, critical_path_analysis, find_critical_path, pack_schedule, packed_slack, schedule_plan,
+    topological_order
+)
+
+START = datetime(2026, 10, 16, 9, 0)
+
+
+def diamond(can_parallel: bool = True) -> list:
+    """A -> B, C -> D; C длиннее B на 2 дня"""
+    return [
+        {'title': 'A', 'duration': 1, 'can_parallel': can_parallel, 'dependencies': []},
+        {'title': 'B', 'duration': 1, 'can_parallel': can_parallel, 'dependencies': ['A']},
+        {'title': 'C', 'duration': 3, 'can_parallel': can_parallel, 'dependencies': ['A']},
+        {'title': 'D', 'duration': 1, 'can_parallel': can_parallel, 'dependencies': ['B', 'C']},
+    ]
+
+
+@pytest.mark.parametrize('title, earliest_start, latest_start, slack, is_critical', [
+    ('A', 0, 0, 0, True),
+    ('B', 1, 3, 2, False),
+    ('C', 1, 1, 0, True),
+    ('D', 4, 4, 0, True),
+])
+def test_critical_path_diamond(title, earliest_start, latest_start, slack, is_critical):
+    tasks = diamond()
+    timing = critical_path_analysis(tasks)[[task['title'] for task in tasks].index(title)]
+    assert timing.earliest_start == earliest_start
+    assert timing.latest_start == latest_start
+    assert timing.slack == slack
+    assert timing.is_critical == is_critical
+
+
+def test_find_critical_path_diamond():
+    graph = {task.pop('title'): task for task in diamond()}
+    assert find_critical_path(graph) == ['A', 'C', 'D']
+
+
+@pytest.mark.parametrize('predecessors, expected', [
+    ([[], [0], [0], [1, 2]], [0, 1, 2, 3]),
+    ([[1], [2], []], [2, 1, 0]),
+    ([[], [], []], [0, 1, 2]),
+])
+def test_topological_order(predecessors, expected):
+    assert topological_order(predecessors) == expected
+
+
+@pytest.mark.parametrize('tasks, stuck', [
+    ([{'title': 'A', 'dependencies': ['B']}, {'title': 'B', 'dependencies': ['A']}], ['A', 'B']),
+    # Задачи вне цикла в ошибку не попадают
+    ([{'title': 'A', 'dependencies': []}, {'title': 'B', 'dependencies': ['A', 'C']},
+      {'title': 'C', 'dependencies': ['B']}], ['B', 'C']),
+])
+def test_cycle_error_lists_titles(tasks, stuck):
+    with pytest.raises(CycleError) as error:
+        critical_path_analysis(tasks)
+    assert error.value.titles == stuck
+    for title in stuck:
+        assert title in str(error.value)
+
+
+@pytest.mark.parametrize('can_parallel, lanes, expected', [
+    # Два потока: B и C идут одновременно
+    (True, 2, [0, 1, 1, 4]),
+    # Один поток: первой идет C - у нее меньше резерв
+    (True, 1, [0, 4, 1, 5]),
+    # Задачи без can_parallel идут по одной при любом числе потоков
+    (False, 2, [0, 4, 1, 5]),
+])
+def test_pack_schedule(can_parallel, lanes, expected):
+    tasks = diamond(can_parallel)
+    assert pack_schedule(tasks, critical_path_analysis(tasks), lanes) == expected
+
+
+@pytest.mark.parametrize('deadline_days, expected_end_days', [
+    # Дедлайн позже конца плана - сроки не меняются
+    (None, 5),
+    (10, 5),
+    # План на 5 дней сжимается до 2.5 дней
+    (2.5, 2.5),
+])
+def test_schedule_plan_deadline(deadline_days, expected_end_days):
+    deadline = START + timedelta(days=deadline_days) if deadline_days is not None else None
+    tasks = schedule_plan(diamond(), deadline, available_time='10', start=START)
+    assert max(task['end_date'] for task in tasks) == START + timedelta(days=expected_end_days)
+    by_title = {task['title']: task for task in tasks}
+    # Сжатие пропорционально: порядок и зависимости сохраняются
+    assert by_title['D']['start_date'] >= by_title['C']['end_date']
+    assert by_title['A']['start_date'] == START
+
+
+@pytest.mark.parametrize('can_parallel, lanes, expected', [
+    # Два потока - резерв совпадает с методом критического пути
+    (True, 2, [0, 2, 0, 0]),
+    # Один поток: B идет после C, отложить ее нельзя
+    (True, 1, [0, 0, 0, 0]),
+    (False, 2, [0, 0, 0, 0]),
+])
+def test_packed_slack(can_parallel, lanes, expected):
+    tasks = diamond(can_parallel)
+    starts = pack_schedule(tasks, critical_path_analysis(tasks), lanes)
+    assert packed_slack(tasks, starts, lanes) == expected
+
+
+@pytest.mark.parametrize('available_time, slack_b, critical', [
+    ('10', 2, {'A', 'C', 'D'}),
+    ('5', 0, {'A', 'B', 'C', 'D'}),
+])
+def test_schedule_plan_slack_matches_dates(available_time, slack_b, critical):
+    tasks = schedule_plan(diamond(), available_time=available_time, start=START)
+    by_title = {task['title']: task for task in tasks}
+    assert by_title['B']['slack_days'] == slack_b
+    assert {task['title'] for task in tasks if task['is_critical']} == critical
+    # Отложенная на весь резерв задача не задевает следующих за ней
+    assert by_title['B']['end_date'] + timedelta(days=slack_b) <= by_title['D']['start_date']
+
+
+def test_schedule_plan_slack_is_compressed():
+    deadline = START + timedelta(days=2.5)
+    by_title = {task['title']: task for task in schedule_plan(diamond(), deadline, '10', start=START)}
+    assert by_title['B']['slack_days'] == 1
@@ -0,0 +1,38 @@
+# tests/test_workload_warnings.py
+
+"""Выбор предупреждений о нагрузке в check_tasks"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from scheduler import workload_warnings
+
+NOW = datetime(2026, 10, 16, 12, 0)
+USER = SimpleNamespace(user_id=1)
+OTHER_USER = SimpleNamespace(user_id=2)
+
+
+def row(minutes: int, tasks_count: int, reminded: bool = False, user=USER):
+    task = SimpleNamespace(user_id=user.user_id, due_date=NOW + timedelta(minutes=minutes),
+                           last_reminder=NOW - timedelta(hours=1) if reminded else None)
+    return task, user, tasks_count
+
+
+@pytest.mark.parametrize('rows, expected', [
+    # Нет плотных периодов
+    ([row(30, 1), row(100, 1)], []),
+    # Одно предупреждение на пользователя - по самому плотному периоду
+    ([row(10, 2), row(20, 3), row(30, 2)], [(1, 20, 3)]),
+    # О плотном периоде уже предупреждали: все его задачи уже напоминались
+    ([row(10, 3, reminded=True), row(20, 3, reminded=True)], []),
+    # Новая задача в другом, менее плотном периоде не открывает старый
+    ([row(0, 3, reminded=True), row(10, 3, reminded=True), row(110, 2)], []),
+    # Новая задача в пределах часа от самого плотного периода
+    ([row(0, 3, reminded=True), row(50, 2)], [(1, 0, 3)]),
+    # Пользователи независимы
+    ([row(10, 2), row(20, 2), row(30, 4, user=OTHER_USER)], [(1, 10, 2), (2, 30, 4)]),
+])
+def test_workload_warnings(rows, expected):
+    warnings = [(user.user_id, int((due - NOW).total_seconds() // 60), count)
+                for user, due, count in workload_warnings(rows)]
+    assert warnings == expected
@@ -9,6 +9,8 @@ tone_styles = {
         'error': "{message}",
         'task_added': "Отлично! Я добавил новую задачу:\n{details}",
         'finance_added': "Записал {type}: {amount} {currency} в категории {category}.",
+        'regular_payment': "Записал регулярные платежи:\n{details}",
+        'payment_upcoming': "Скоро регулярные платежи:\n{details}",
         'tone_updated': "Тон общения обновлен на нейтральный."
     },
     'friendly': {
@@ -19,6 +21,8 @@ tone_styles = {
         'error': "{message} 😔",
         'task_added': "Супер! 🎉 Я добавил новую задачу:\n{details}",
         'finance_added': "Отлично! 👍 Записал {type}: {amount} {currency} в категории {category}.",
+        'regular_payment': "Готово! 👍 Записал регулярные платежи:\n{details}",
+        'payment_upcoming': "Привет! 😊 Скоро регулярные платежи, не забудьте пополнить счет:\n{details}",
         'tone_updated': "Прекрасно! 🌟 Теперь мы будем общаться по-дружески!"
     },
     'strict': {
@@ -29,6 +33,8 @@ tone_styles = {
         'error': "{message}",
         'task_added': "Задача добавлена в систему:\n{details}",
         'finance_added': "Зарегистрирована операция: {type} {amount} {currency}, категория {category}.",
+        'regular_payment': "Зарегистрированы регулярные платежи:\n{details}",
+        'payment_upcoming': "Предстоящие регулярные платежи. Обеспечьте наличие средств:\n{details}",
         'tone_updated': "Тон коммуникации установлен на формальный."
     },
     'sarcastic': {
@@ -39,6 +45,8 @@ tone_styles = {
         'error': "Упс! {message} Но вы же справитесь, правда? 😏",
         'task_added': "О, какая честь! Новая задача в моей коллекции:\n{details}\nНадеюсь, эта хотя бы будет выполнена... 😏",
         'finance_added': "Ого! {type}: {amount} {currency} в категории {category}. Прям по-взрослому! 💸",
+        'regular_payment': "Деньги сами себя не потратят! Записал регулярные платежи:\n{details}\nКошелек плачет 💸",
+        'payment_upcoming': "Спойлер: скоро снова платить 🙃\n{details}",
         'tone_updated': "Ну наконец-то кто-то оценил мой искрометный юмор! 🎭"
     },
     'loving_mom': {
@@ -49,6 +57,8 @@ tone_styles = {
         'error': "Не переживай, сладкий! {message} Всё будет хорошо! 🤗",
         'task_added': "Умничка! Записала твою задачку:\n{details}\nНе забудь покушать как следует! 🍲",
         'finance_added': "Золотце моё, записала твои {type}: {amount} {currency} (категория {category}). Ты у меня такой хозяйственный! 💖",
+        'regular_payment': "Солнышко, записала твои регулярные платежи:\n{details}\nТы у меня такой ответственный! 💖",
+        'payment_upcoming': "Родной мой, скоро платежи, не забудь! ❤️\n{details}",
         'tone_updated': "Теперь буду заботиться о тебе ещё больше, мой хороший! ❤️"
     },
     'buddy': {
@@ -59,6 +69,8 @@ tone_styles = {
         'error': "Слышь, {message} Ничего, прорвёмся.",
         'task_added': "Записал твоё дело:\n{details}\nДавай, решим этот вопрос.",
         'finance_added': "По деньгам записал: {type} {amount} {currency} ({category}). Порядок.",
+        'regular_payment': "Записал регулярные платежи, брат:\n{details}\nВсё по плану.",
+        'payment_upcoming': "Слышь, скоро платить, готовь деньги:\n{details}",
         'tone_updated': "Ну всё, теперь я твой личный братан. Поддержу и подскажу."
     }
 }
@@ -1,11 +1,15 @@
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, NamedTuple
 from database import get_db
-from sqlalchemy import select
+from sqlalchemy import select, func, cast, String, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from cache_utils import TTLCache
+from config import USER_CONTEXT_TTL, USER_CONTEXT_CACHE_SIZE
 from models import (
-    User, 
-    Task, 
+    User,
+    Task,
     UserInteractionMetrics,
+    DialogSession,
     DialogEmotionalState,
     EmotionalState
 )
@@ -13,97 +17,157 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-async def get_user_context(user_id: int) -> Dict[str, Any]:
-    """Получает полный контекст пользователя"""
-    async with get_db() as session:
-        user = await session.get(User, user_id)
-        if not user:
-            return {}
-            
-        # Получаем последние метрики
-        latest_metrics = await session.execute(
-            select(UserInteractionMetrics)
-            .where(UserInteractionMetrics.user_id == user_id)
-            .order_by(UserInteractionMetrics.date.desc())
-            .limit(1)
+# Снимки контекста по user_id. Записи о задачах и эмоциональных состояниях
+# сбрасывают снимок через invalidate_user_context
+_context_cache = TTLCache(maxsize=USER_CONTEXT_CACHE_SIZE, ttl=USER_CONTEXT_TTL)
+
+
+class ActiveTask(NamedTuple):
+    """Активная задача в снимке контекста"""
+    title: str
+    due_date: datetime
+
+
+def invalidate_user_context(user_id: int):
+    """Сбрасывает закэшированный контекст пользователя после изменения его данных"""
+    _context_cache.pop(user_id)
+
+
+def _context_query(user_id: int):
+    """Один запрос: пользователь, последние метрики, 5 последних эмоций и активные задачи"""
+    metrics = (
+        select(
+            UserInteractionMetrics.task_completion_rate,
+            UserInteractionMetrics.most_productive_hours,
+            UserInteractionMetrics.preferred_interaction_style
+        )
+        .where(UserInteractionMetrics.user_id == user_id)
+        .order_by(UserInteractionMetrics.date.desc())
+        .limit(1)
+        .subquery()
+    )
+
+    recent_states = (
+        select(
+            cast(DialogEmotionalState.state, String).label('state'),
+            DialogEmotionalState.timestamp
         )
-        metrics = latest_metrics.scalar_one_or_none()
-        
-        # Получаем последние эмоциональные состояния
-        recent_states = await session.execute(
-            select(DialogEmotionalState)
-            .join(DialogEmotionalState.session)
-            .where(DialogEmotionalState.session.has(user_id=user_id))
-            .order_by(DialogEmotionalState.timestamp.desc())
-            .limit(5)
+        .join(DialogSession, DialogSession.id == DialogEmotionalState.session_id)
+        .where(DialogSession.user_id == user_id)
+        .order_by(DialogEmotionalState.timestamp.desc())
+        .limit(5)
+        .subquery()
+    )
+    states = (
+        select(func.array_agg(aggregate_order_by(recent_states.c.state, recent_states.c.timestamp.desc())))
+        .scalar_subquery()
+    )
+
+    tasks = (
+        select(
+            func.array_agg(aggregate_order_by(Task.title, Task.due_date, Task.id)).label('titles'),
+            func.array_agg(aggregate_order_by(Task.due_date, Task.due_date, Task.id)).label('due_dates')
         )
-        emotional_states = recent_states.scalars().all()
-        
-        # Получаем активные задачи
-        active_tasks = await session.execute(
-            select(Task)
-            .where(
-                Task.user_id == user_id,
-                Task.is_completed == False,
-                Task.is_cancelled == False
-            )
-            .order_by(Task.due_date)
+        .where(
+            Task.user_id == user_id,
+            Task.is_completed == False,
+            Task.is_cancelled == False
         )
-        tasks = active_tasks.scalars().all()
-        
-        return {
-            "user_preferences": user.interaction_preferences,
-            "productivity_patterns": user.productivity_patterns,
-            "stress_indicators": user.stress_indicators,
-            "achievement_history": user.achievement_history,
-            "current_challenges": user.current_challenges,
-            "metrics": {
-                "task_completion_rate": metrics.task_completion_rate if metrics else None,
-                "preferred_hours": metrics.most_productive_hours if metrics else [],
-                "interaction_style": metrics.preferred_interaction_style if metrics else None
-            },
-            "emotional_context": {
-                "current_state": emotional_states[0].state if emotional_states else None,
-                "recent_states": [state.state for state in emotional_states[1:]] if emotional_states else [],
-                "stress_level": analyze_stress_level(emotional_states) if emotional_states else "normal"
-            },
-            "task_context": {
-                "active_tasks": len(tasks),
-                "overdue_tasks": sum(1 for task in tasks if task.is_overdue()),
-                "upcoming_deadlines": [
-                    {"title": task.title, "due_date": task.due_date}
-                    for task in tasks if (task.due_date - datetime.now()).days <= 3
-                ],
-                "workload_level": calculate_workload_level(tasks)
-            }
+        .subquery()
+    )
+
+    return (
+        select(
+            User.interaction_preferences,
+            User.productivity_patterns,
+            User.stress_indicators,
+            User.achievement_history,
+            User.current_challenges,
+            metrics.c.task_completion_rate,
+            metrics.c.most_productive_hours,
+            metrics.c.preferred_interaction_style,
+            states.label('states'),
+            tasks.c.titles,
+            tasks.c.due_dates
+        )
+        .select_from(User)
+        .outerjoin(metrics, true())
+        .join(tasks, true())
+        .where(User.user_id == user_id)
+    )
+
+
+async def get_user_context(user_id: int) -> Dict[str, Any]:
+    """Получает полный контекст пользователя"""
+    context = _context_cache.get(user_id)
+    if context is not None:
+        return context
+
+    async with get_db() as session:
+        result = await session.execute(_context_query(user_id))
+        row = result.one_or_none()
+    if row is None:
+        return {}
+
+    emotional_states = [EmotionalState[state] for state in row.states or []]
+    tasks = [ActiveTask(title, due_date) for title, due_date in zip(row.titles or [], row.due_dates or [])]
+    now = datetime.now()
+
+    context = {
+        "user_preferences": row.interaction_preferences,
+        "productivity_patterns": row.productivity_patterns,
+        "stress_indicators": row.stress_indicators,
+        "achievement_history": row.achievement_history,
+        "current_challenges": row.current_challenges,
+        "metrics": {
+            "task_completion_rate": row.task_completion_rate,
+            "preferred_hours": row.most_productive_hours or [],
+            "interaction_style": row.preferred_interaction_style
+        },
+        "emotional_context": {
+            "current_state": emotional_states[0] if emotional_states else None,
+            "recent_states": emotional_states[1:],
+            "stress_level": analyze_stress_level(emotional_states)
+        },
+        "task_context": {
+            "active_tasks": len(tasks),
+            "overdue_tasks": sum(1 for task in tasks if task.due_date < now),
+            "upcoming_deadlines": [
+                {"title": task.title, "due_date": task.due_date}
+                for task in tasks if (task.due_date - now).days <= 3
+            ],
+            "workload_level": calculate_workload_level(tasks)
         }
+    }
+    _context_cache.set(user_id, context)
+    return context
 
-def analyze_stress_level(emotional_states: List[DialogEmotionalState]) -> str:
+def analyze_stress_level(emotional_states: List[EmotionalState]) -> str:
     """Анализирует уровень стресса на основе истории эмоциональных состояний"""
     if not emotional_states:
         return "normal"
-        
+
     stress_indicators = sum(
-        1 for state in emotional_states 
-        if state.state in [EmotionalState.STRESSED, EmotionalState.OVERWHELMED]
+        1 for state in emotional_states
+        if state in [EmotionalState.STRESSED, EmotionalState.OVERWHELMED]
     )
-    
+
     if stress_indicators >= 3:
         return "high"
     elif stress_indicators >= 1:
         return "moderate"
     return "normal"
 
-def calculate_workload_level(tasks: List[Task]) -> str:
+def calculate_workload_level(tasks: List[ActiveTask]) -> str:
     """Оценивает уровень загрузки пользователя"""
     if not tasks:
         return "low"
-        
+
     urgent_tasks = sum(1 for task in tasks if (task.due_date - datetime.now()).days <= 1)
     upcoming_tasks = sum(1 for task in tasks if 1 < (task.due_date - datetime.now()).days <= 7)
-    
+
     if urgent_tasks >= 3 or (urgent_tasks >= 2 and upcoming_tasks >= 4):
         return "high"
     elif urgent_tasks >= 1 or upcoming_tasks >= 3:
         return "moderate"
-    return "low"
\ No newline at end of file
+    return "low"
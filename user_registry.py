@@ -0,0 +1,85 @@
+# user_registry.py
+
+"""
+Получение пользователя по user_id с созданием при первом обращении.
+
+Пользователь создается одним запросом INSERT ... ON CONFLICT DO NOTHING, так что
+два одновременных обновления от нового пользователя не падают на дубликате
+ключа. Известные пользователи и их тон хранятся в ограниченном LRU-кэше
+процесса: для уже знакомого пользователя запросов к базе нет совсем.
+"""
+
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from cache_utils import TTLCache
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from database import get_db
+from models import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TONE = 'neutral'
+
+# user_id -> тон общения
+_known_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+async def ensure_user(user_id: int) -> str:
+    """Создает пользователя, если его еще нет, и возвращает его тон общения"""
+    tone = _known_users.get(user_id)
+    if tone is not None:
+        return tone
+
+    # Один запрос: вставка нового пользователя либо тон существующего
+    inserted = (
+        insert(User)
+        .values(user_id=user_id, tone=DEFAULT_TONE)
+        .on_conflict_do_nothing(index_elements=[User.user_id])
+        .returning(User.tone)
+        .cte('inserted')
+    )
+    query = (
+        select(inserted.c.tone)
+        .union_all(select(User.tone).where(User.user_id == user_id))
+        .limit(1)
+    )
+    async with get_db() as session:
+        tone = (await session.execute(query)).scalar()
+        await session.commit()
+
+    tone = tone or DEFAULT_TONE
+    _known_users.set(user_id, tone)
+    return tone
+
+
+async def get_tone(user_id: int) -> Optional[str]:
+    """Тон общения пользователя без создания; None, если пользователя нет"""
+    tone = _known_users.get(user_id)
+    if tone is not None:
+        return tone
+
+    async with get_db() as session:
+        row = (await session.execute(select(User.tone).where(User.user_id == user_id))).one_or_none()
+    if row is None:
+        return None
+    tone = row.tone or DEFAULT_TONE
+    _known_users.set(user_id, tone)
+    return tone
+
+
+async def set_tone(user_id: int, tone: str):
+    """Сохраняет тон общения, создавая пользователя при необходимости"""
+    async with get_db() as session:
+        await session.execute(
+            insert(User)
+            .values(user_id=user_id, tone=tone)
+            .on_conflict_do_update(
+                index_elements=[User.user_id],
+                set_={'tone': tone, 'updated_at': datetime.now()}
+            )
+        )
+        await session.commit()
+    _known_users.set(user_id, tone)
@@ -0,0 +1,159 @@
+# webhook.py
+
+"""
+Прием обновлений Telegram через webhook (альтернатива start_polling).
+
+Обновления принимает aiohttp-сервер и раскладывает их по WEBHOOK_WORKERS
+очередям по пользователю: обновления одного пользователя обрабатываются
+строго по порядку одним воркером, разные пользователи - параллельно.
+
+Обратное давление: очереди ограничены, и если очередь пользователя заполнена
+(или шлюз LLM занят полностью, а в очереди уже есть работа), сервер отвечает
+503 - Telegram повторит доставку позже, вместо того чтобы бот копил обновления
+в памяти.
+
+Порядок сообщений одного пользователя гарантируется в пределах процесса. При
+нескольких репликах за балансировщиком каждая получает свою долю обновлений.
+"""
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from contextlib import suppress
+from typing import List, Optional
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_MAX_CONNECTIONS
+)
+import asyncio
+import llm_gateway
+import logging
+import signal
+
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений может ждать в очереди воркера, пока шлюз LLM занят полностью
+SATURATED_QUEUE_LIMIT = 2
+
+
+def update_shard_key(update: Update) -> int:
+    """Пользователь (или чат), к которому относится обновление"""
+    event = update.event
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, 'chat', None)
+    if chat is not None:
+        return chat.id
+    return update.update_id
+
+
+class WebhookServer:
+    """aiohttp-сервер webhook с пулом воркеров, разделенным по пользователям"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot,
+                 workers: int = WEBHOOK_WORKERS, queue_size: int = WEBHOOK_QUEUE_SIZE):
+        self.dp = dp
+        self.bot = bot
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._workers: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+        self.rejected = 0
+
+    def _queue_for(self, update: Update) -> asyncio.Queue:
+        return self.queues[update_shard_key(update) % len(self.queues)]
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            return web.Response(status=401)
+
+        update = Update.model_validate(await request.json(), context={'bot': self.bot})
+        queue = self._queue_for(update)
+        if llm_gateway.is_saturated() and queue.qsize() >= SATURATED_QUEUE_LIMIT:
+            self.rejected += 1
+            logger.warning(f"Шлюз LLM перегружен, обновление {update.update_id} отложено")
+            return web.Response(status=503)
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Очередь обновлений заполнена, обновление {update.update_id} отложено")
+            return web.Response(status=503)
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'queued': sum(queue.qsize() for queue in self.queues),
+            'workers': len(self._workers),
+            'llm_in_flight': llm_gateway.in_flight(),
+            'rejected': self.rejected
+        })
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке обновления {update.update_id}: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+    async def start(self):
+        self._workers = [asyncio.create_task(self._worker(queue)) for queue in self.queues]
+
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self.handle_update)
+        app.router.add_get('/healthz', self.health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+        await self.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=self.dp.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        logger.info(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}, "
+                    f"воркеров: {len(self._workers)}")
+
+    async def stop(self):
+        """Перестает принимать обновления, дорабатывает принятые и останавливает воркеров"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        await asyncio.gather(*(queue.join() for queue in self.queues))
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Запускает бота в режиме webhook и работает до сигнала остановки (Ctrl+C, SIGTERM)"""
+    server = WebhookServer(dp, bot)
+    # Как и в polling: SIGTERM/SIGINT завершают работу штатно, с дообработкой очередей
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(sig, stop_event.set)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, bots=[bot], **dp.workflow_data)
+    await server.start()
+    try:
+        await stop_event.wait()
+        logger.info("Получен сигнал остановки, webhook завершает работу")
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+        await server.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, bots=[bot], **dp.workflow_data)